@@ -0,0 +1,133 @@
+# app/core/activations.py
+
+import os
+import json
+from fnmatch import fnmatch
+from collections import namedtuple
+
+import numpy as np
+
+from config.yolo_config import (
+    ACTIVATION_LAYERS, ACTIVATION_LAYER_TYPES, ACTIVATION_MAX_CHANNELS, ACTIVATION_SIZE
+)
+
+# What a forward hook keeps of a layer output, all reduced on the model's device before transfer:
+#   layers       qualified module names or fnmatch patterns ('model.2*'); None = every layer_types module
+#   channels     first N channels (int), explicit channel indices (tuple), or None for all
+#   size         longest side of the area-downsampled map; None keeps the full resolution
+#   normalize    per-channel min/max scaling to [0, 1]
+#   dtype        'float16', 'float32' or 'uint8' (uint8 implies normalize)
+#   mode         'map' keeps (C, H, W) maps, 'summary' keeps (C, 3) mean/std/max per channel
+ActivationSpec = namedtuple('ActivationSpec',
+                            ['layers', 'channels', 'size', 'normalize', 'dtype', 'mode', 'layer_types'])
+
+DEFAULT_SPEC = ActivationSpec(
+    layers=tuple(ACTIVATION_LAYERS) if ACTIVATION_LAYERS else None,
+    channels=ACTIVATION_MAX_CHANNELS,
+    size=ACTIVATION_SIZE,
+    normalize=True,
+    dtype='float16',
+    mode='map',
+    layer_types=tuple(ACTIVATION_LAYER_TYPES),
+)
+SUMMARY_FIELDS = ('mean', 'std', 'max')
+
+
+def select_layers(module, spec):
+    """(qualified name, module) pairs of module's submodules selected by spec."""
+    selected = []
+    for name, m in module.named_modules():
+        if not name:
+            continue
+        if spec.layers is None:
+            match = type(m).__name__ in spec.layer_types
+        else:
+            match = any(fnmatch(name, pattern) for pattern in spec.layers)
+        if match:
+            selected.append((name, m))
+    return selected
+
+
+def reduce_activation(output, spec):
+    """Reduce the first image of a (N, C, H, W) layer output as spec asks, then copy it to NumPy."""
+    import torch
+    import torch.nn.functional as F
+
+    x = output[0].detach()
+    if isinstance(spec.channels, int):
+        x = x[:spec.channels]
+    elif spec.channels is not None:
+        x = x[torch.as_tensor(spec.channels, device=x.device)]
+    x = x.float()
+
+    if spec.mode == 'summary':
+        flat = x.flatten(1)
+        return torch.stack([flat.mean(1), flat.std(1), flat.amax(1)], 1).cpu().numpy()
+
+    h, w = x.shape[-2:]
+    if spec.size and max(h, w) > spec.size:
+        scale = spec.size / max(h, w)
+        x = F.adaptive_avg_pool2d(x, (max(1, round(h * scale)), max(1, round(w * scale))))
+    if spec.normalize or spec.dtype == 'uint8':
+        lo = x.amin(dim=(-2, -1), keepdim=True)
+        hi = x.amax(dim=(-2, -1), keepdim=True)
+        x = (x - lo) / (hi - lo + 1e-5)
+    if spec.dtype == 'uint8':
+        x = (x * 255).round().to(torch.uint8)
+    else:
+        x = x.to(getattr(torch, spec.dtype))
+    return x.cpu().numpy()
+
+
+class ActivationRecorder:
+    """Appends per-frame activations to one .npy memmap per layer under a directory.
+
+    index.json lists the layers, the spec and, per recorded frame, its source frame index
+    and timestamp; load_recording() maps it back without running the model.
+    """
+
+    def __init__(self, path, spec, capacity):
+        self.path = path
+        self.spec = spec
+        self.capacity = capacity
+        self.frames = []
+        self.layers = {}
+        self._arrays = {}
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, activations, frame_index, timestamp):
+        if len(self.frames) >= self.capacity:
+            return False
+        if not self._arrays:
+            for name, value in activations.items():
+                self._arrays[name] = np.lib.format.open_memmap(
+                    os.path.join(self.path, f"{name}.npy"), mode='w+',
+                    dtype=value.dtype, shape=(self.capacity,) + value.shape)
+        row = len(self.frames)
+        for name, array in self._arrays.items():
+            array[row] = activations[name]
+        self.frames.append({'frame_index': frame_index, 'timestamp': timestamp})
+        return True
+
+    def close(self):
+        for array in self._arrays.values():
+            array.flush()
+        self.layers.update({name: list(array.shape[1:]) for name, array in self._arrays.items()})
+        self._arrays = {}
+        with open(os.path.join(self.path, 'index.json'), 'w') as f:
+            json.dump({
+                'spec': self.spec._asdict(),
+                'layers': self.layers,
+                'summary_fields': SUMMARY_FIELDS if self.spec.mode == 'summary' else None,
+                'count': len(self.frames),
+                'frames': self.frames,
+            }, f, indent=2)
+
+
+def load_recording(path):
+    """(index, {layer: read-only memmap of the recorded rows}) for an ActivationRecorder directory."""
+    with open(os.path.join(path, 'index.json')) as f:
+        index = json.load(f)
+    arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')[:index['count']]
+              for name in index['layers']}
+    return index, arrays
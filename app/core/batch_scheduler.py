@@ -0,0 +1,125 @@
+# app/core/batch_scheduler.py
+
+import time
+import threading
+from queue import Queue
+
+from app.core.tiling import plan_regions, crop_regions, merge_results
+from app.core.metrics import INFERENCE_SECONDS, DETECTION_ERRORS
+
+
+class BatchScheduler:
+    """Gathers the latest frame from each camera into one batched model call.
+
+    A batch is dispatched as soon as every idle camera has submitted, max_batch_size
+    frames are pending, or max_wait_ms has passed since the first pending frame.
+    Each camera has at most one frame pending or in flight, like the single-camera
+    frame_queue(maxsize=1), and gets its boxes back on its own queue. A camera with an
+    ROI or tiling contributes its crops to the same model call. Results are (captured_at,
+    boxes) with the boxes stamped at the frame's capture time. Submitted frames may be
+    read-only views of pooled buffers; each is handed back with release_frame once its
+    batch has run. With a control block, its classes, max_boxes and conf apply from the
+    next batch on.
+    """
+
+    def __init__(self, model, target_classes, max_batch_size=8, max_wait_ms=20, max_boxes=5,
+                 tile_size=None, release_frame=None, control=None):
+        self.model = model
+        self.control = control
+        self.release_frame = release_frame
+        self.target_classes = target_classes
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_boxes = max_boxes
+        self.tile_size = tile_size
+        self.batches_run = 0
+        self.frames_inferred = 0
+
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._in_flight = set()
+        self._first_pending_at = 0.0
+        self._box_queues = {}
+        self._rois = {}
+
+    def register(self, camera_id, roi=None):
+        box_queue = Queue()
+        with self._cond:
+            self._box_queues[camera_id] = box_queue
+            self._rois[camera_id] = roi
+        return box_queue
+
+    def is_idle(self, camera_id):
+        return camera_id not in self._pending and camera_id not in self._in_flight
+
+    def submit(self, camera_id, frame, captured_at=None):
+        with self._cond:
+            if not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending[camera_id] = (frame, time.time() if captured_at is None else captured_at)
+            self._cond.notify()
+
+    def _batch_ready(self):
+        waiting_for = len(self._box_queues) - len(self._in_flight)
+        return len(self._pending) >= min(self.max_batch_size, waiting_for)
+
+    def _take_batch(self, stop_event):
+        with self._cond:
+            while not self._pending:
+                if stop_event.is_set():
+                    return []
+                self._cond.wait(timeout=0.5)
+
+            deadline = self._first_pending_at + self.max_wait
+            while not self._batch_ready() and not stop_event.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+            batch = list(self._pending.items())[:self.max_batch_size]
+            for camera_id, _ in batch:
+                del self._pending[camera_id]
+                self._in_flight.add(camera_id)
+            if self._pending:
+                self._first_pending_at = time.monotonic()
+            return batch
+
+    def run(self, stop_event):
+        while not stop_event.is_set():
+            batch = self._take_batch(stop_event)
+            if not batch:
+                continue
+
+            camera_ids = [camera_id for camera_id, _ in batch]
+            try:
+                crops, plans = [], []
+                for camera_id, (frame, captured_at) in batch:
+                    regions = plan_regions(frame.shape, self._rois[camera_id], self.tile_size)
+                    plans.append((camera_id, captured_at, len(crops), regions))
+                    crops.extend(crop_regions(frame, regions))
+
+                target_classes, max_boxes, options = self.target_classes, self.max_boxes, {}
+                if self.control is not None:
+                    settings = self.control.settings()
+                    target_classes, max_boxes = settings.classes, settings.max_boxes
+                    options['conf'] = settings.conf
+
+                started = time.perf_counter()
+                results = self.model(crops, verbose=False, **options)
+                INFERENCE_SECONDS.labels('batch').observe(time.perf_counter() - started)
+                for camera_id, captured_at, start, regions in plans:
+                    boxes = merge_results(results[start:start + len(regions)], regions,
+                                          target_classes, max_boxes, captured_at)
+                    self._box_queues[camera_id].put((captured_at, boxes))
+                self.batches_run += 1
+                self.frames_inferred += len(batch)
+            except Exception as e:
+                DETECTION_ERRORS.labels('batch').inc()
+                print(f"Batch detection error: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight.difference_update(camera_ids)
+                if self.release_frame is not None:
+                    for _, (frame, _) in batch:
+                        self.release_frame(frame)
@@ -0,0 +1,86 @@
+# app/core/boxes.py
+
+import numpy as np
+
+# One row per detection; consumers (overlay, process pool pipe) take this array as-is
+BOX_DTYPE = np.dtype([
+    ('x1', '<i4'), ('y1', '<i4'), ('x2', '<i4'), ('y2', '<i4'),
+    ('conf', '<f4'), ('class_id', '<i2'), ('timestamp', '<f8'),
+])
+EMPTY_BOXES = np.empty(0, dtype=BOX_DTYPE)
+COORDS = ('x1', 'y1', 'x2', 'y2')
+NMS_IOU = 0.5
+
+def top_boxes(boxes, max_boxes):
+    # Highest-confidence rows first, selected without sorting everything
+    if len(boxes) > max_boxes:
+        boxes = boxes[np.argpartition(-boxes['conf'], max_boxes - 1)[:max_boxes]]
+    return boxes[np.argsort(-boxes['conf'], kind='stable')]
+
+def extract_boxes(result, target_classes, max_boxes, timestamp):
+    if result.boxes is None or len(result.boxes) == 0:
+        return EMPTY_BOXES
+
+    # A single device->host transfer of the (n, 6) xyxy/conf/cls tensor
+    data = result.boxes.data
+    data = data.cpu().numpy() if hasattr(data, 'cpu') else np.asarray(data)
+    data = data[np.isin(data[:, -1].astype(np.int64), np.fromiter(target_classes, dtype=np.int64))]
+
+    # Top-k by confidence before anything per-box is built
+    if len(data) > max_boxes:
+        data = data[np.argpartition(-data[:, -2], max_boxes - 1)[:max_boxes]]
+    data = data[np.argsort(-data[:, -2], kind='stable')]
+
+    boxes = np.empty(len(data), dtype=BOX_DTYPE)
+    boxes['x1'], boxes['y1'], boxes['x2'], boxes['y2'] = data[:, :4].astype(np.int32).T
+    boxes['conf'] = data[:, -2]
+    boxes['class_id'] = data[:, -1]
+    boxes['timestamp'] = timestamp
+    return boxes
+
+def scale_boxes(boxes, scale_x, scale_y):
+    # Copy of boxes with coordinates mapped to a frame resized by (scale_x, scale_y)
+    boxes = boxes.copy()
+    if scale_x != 1.0 or scale_y != 1.0:
+        for field, scale in (('x1', scale_x), ('y1', scale_y), ('x2', scale_x), ('y2', scale_y)):
+            boxes[field] = (boxes[field] * scale).astype(np.int32)
+    return boxes
+
+def iou_matrix(a, b):
+    """Pairwise IoU of two BOX_DTYPE arrays."""
+    ax1, ay1, ax2, ay2 = (a[f][:, None].astype(np.float32) for f in COORDS)
+    bx1, by1, bx2, by2 = (b[f][None, :].astype(np.float32) for f in COORDS)
+    iw = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    ih = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = iw * ih
+    union = (ax2 - ax1) * (ay2 - ay1) + (bx2 - bx1) * (by2 - by1) - inter
+    return inter / np.maximum(union, 1e-6)
+
+def match_boxes(pred, ref, iou_threshold=0.5):
+    """Greedy same-class matching of two BOX_DTYPE arrays; returns (pred_index, ref_index, iou) triples."""
+    if len(pred) == 0 or len(ref) == 0:
+        return []
+    iou = iou_matrix(pred, ref)
+    iou[pred['class_id'][:, None] != ref['class_id'][None, :]] = 0
+    matches = []
+    while iou.max() >= iou_threshold:
+        p, r = np.unravel_index(np.argmax(iou), iou.shape)
+        matches.append((int(p), int(r), float(iou[p, r])))
+        iou[p, :] = 0
+        iou[:, r] = 0
+    return matches
+
+def nms(boxes, iou_threshold=NMS_IOU):
+    """Class-aware greedy NMS over a BOX_DTYPE array, highest confidence first."""
+    if len(boxes) < 2:
+        return boxes
+    boxes = boxes[np.argsort(-boxes['conf'], kind='stable')]
+    iou = iou_matrix(boxes, boxes)
+    iou[boxes['class_id'][:, None] != boxes['class_id'][None, :]] = 0
+    keep = np.ones(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if keep[i]:
+            suppressed = iou[i] > iou_threshold
+            suppressed[:i + 1] = False
+            keep &= ~suppressed
+    return boxes[keep]
@@ -0,0 +1,204 @@
+# app/core/capture.py
+
+import time
+import threading
+from collections import namedtuple
+
+import cv2
+
+from app.core.frame_pool import FramePool
+from app.core.metrics import FRAMES_CAPTURED, CAPTURE_FAILURES, CAPTURE_RECONNECTS, CAPTURE_OVERWRITTEN, CAPTURE_UP
+
+# grabbed_at is taken when the frame arrives, before decoding: the start of glass-to-glass latency
+CapturedFrame = namedtuple('CapturedFrame', ['seq', 'grabbed_at', 'decoded_at', 'frame'])
+
+# Reader states reported by health()
+CONNECTING = 'connecting'
+STREAMING = 'streaming'
+STALLED = 'stalled'
+RECONNECTING = 'reconnecting'
+STOPPED = 'stopped'
+
+# Every started reader by name, for the health endpoint
+CAPTURE_READERS = {}
+
+
+class CaptureReader:
+    """Reads a cv2.VideoCapture source on its own thread and keeps only the newest frame.
+
+    A frame nobody took before the next one arrived is dropped (drop-oldest, depth 1), so a
+    slow consumer never works through a backlog. Open and read failures reconnect with
+    exponential backoff. A source that blocks inside grab(), or inside opening it, for
+    stall_timeout is abandoned to its thread and reopened on a fresh one, so a hung HTTP
+    stream can't freeze the pipeline.
+
+    Frames are decoded straight into buffers from pool; whoever read()s a frame owns that
+    reference and hands it back with pool.release() when done with it.
+    """
+
+    def __init__(self, source, name=None, stall_timeout=3.0, backoff_min=0.5, backoff_max=30.0, pool=None):
+        self.source = source
+        self.name = name or str(source)
+        self.pool = pool or FramePool()
+        self.stall_timeout = stall_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+
+        self.state = CONNECTING
+        self.frames = 0
+        self.overwritten = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.last_frame_at = 0.0
+
+        self._cond = threading.Condition()
+        self._latest = None
+        self._taken_seq = -1
+        self._generation = 0
+        self._last_activity = time.time()
+        self._opening_since = None  # set while a cv2.VideoCapture() call is in progress
+
+        self._frames_captured = FRAMES_CAPTURED.labels(self.name)
+        self._capture_failures = CAPTURE_FAILURES.labels(self.name)
+        self._reconnects = CAPTURE_RECONNECTS.labels(self.name)
+        self._overwritten = CAPTURE_OVERWRITTEN.labels(self.name)
+        self._up = CAPTURE_UP.labels(self.name)
+
+    def start(self, stop_event):
+        self._stop_event = stop_event
+        CAPTURE_READERS[self.name] = self
+        self._spawn()
+        threading.Thread(target=self._watchdog, name=f"capture-watchdog-{self.name}", daemon=True).start()
+        return self
+
+    def read(self, timeout=None):
+        """The newest frame not yet returned, waiting up to timeout; None if nothing new arrived."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest is not None and self._latest.seq > self._taken_seq
+                                or self._stop_event.is_set(), timeout)
+            latest = self._latest
+            if latest is None or latest.seq <= self._taken_seq:
+                return None
+            self._taken_seq = latest.seq
+            return latest
+
+    def health(self):
+        now = time.time()
+        return {
+            'state': self.state,
+            'frames': self.frames,
+            'overwritten': self.overwritten,
+            'reconnects': self.reconnects,
+            'last_frame_age': now - self.last_frame_at if self.last_frame_at else None,
+            'last_error': self.last_error,
+        }
+
+    def _spawn(self):
+        with self._cond:
+            self._generation += 1
+            generation = self._generation
+            self._last_activity = time.time()
+        threading.Thread(target=self._run, args=(generation,), name=f"capture-{self.name}", daemon=True).start()
+
+    def _current(self, generation):
+        return generation == self._generation and not self._stop_event.is_set()
+
+    def _set_state(self, state, generation):
+        if generation == self._generation:
+            self.state = state
+            self._up.set(1 if state == STREAMING else 0)
+
+    def _run(self, generation):
+        backoff = self.backoff_min
+        while self._current(generation):
+            self._opening_since = time.time()
+            cap = cv2.VideoCapture(self.source)
+            if generation == self._generation:
+                self._opening_since = None
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if not cap.isOpened():
+                cap.release()
+                self._fail(generation, f"could not open {self.source}", backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+                continue
+
+            shape = None
+            try:
+                while self._current(generation):
+                    self._last_activity = time.time()
+                    if not cap.grab():
+                        break
+                    grabbed_at = time.time()
+                    # Decode into a pooled buffer once the frame size is known
+                    buffer = self.pool.acquire(shape) if shape is not None else None
+                    ret, frame = cap.retrieve(buffer)
+                    if not ret or frame is not buffer:
+                        self.pool.release(buffer)
+                    if not ret:
+                        break
+                    if frame is not buffer:
+                        self.pool.adopt(frame)  # first frame, or the decoder changed size
+                    shape = frame.shape
+                    self._publish(generation, grabbed_at, frame)
+                    backoff = self.backoff_min
+            finally:
+                cap.release()
+
+            if self._current(generation):
+                self._fail(generation, "read failed", backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+
+        if self._stop_event.is_set():
+            self._set_state(STOPPED, generation)
+            with self._cond:
+                self._cond.notify_all()
+
+    def _publish(self, generation, grabbed_at, frame):
+        with self._cond:
+            if generation != self._generation:
+                self.pool.release(frame)
+                return  # a reader that was given up on came back to life; its frames are stale
+            if self._latest is not None and self._latest.seq > self._taken_seq:
+                self.pool.release(self._latest.frame)
+                self.overwritten += 1
+                self._overwritten.inc()
+            seq = self._latest.seq + 1 if self._latest is not None else 0
+            self._latest = CapturedFrame(seq, grabbed_at, time.time(), frame)
+            self.frames += 1
+            self.last_frame_at = grabbed_at
+            self._cond.notify_all()
+        self._frames_captured.inc()
+        if self.state != STREAMING:
+            self._set_state(STREAMING, generation)
+
+    def _fail(self, generation, error, backoff):
+        self.last_error = error
+        self._capture_failures.inc()
+        self._set_state(RECONNECTING, generation)
+        self.reconnects += 1
+        self._reconnects.inc()
+        print(f"⚠️ Capture {self.name}: {error}, reconnecting in {backoff:g}s")
+        self._stop_event.wait(backoff)
+
+    def _watchdog(self):
+        while not self._stop_event.wait(self.stall_timeout / 4):
+            now = time.time()
+            opening_since = self._opening_since
+            if opening_since is not None and now - opening_since > self.stall_timeout:
+                self._abandon(f"open did not return within {self.stall_timeout:g}s")
+            elif self.state == STREAMING and now - self._last_activity > self.stall_timeout:
+                self._abandon(f"no frame for {self.stall_timeout:g}s")
+
+    def _abandon(self, error):
+        # The blocked thread is left behind; its generation is stale, so whatever it returns is dropped
+        self.last_error = error
+        self._set_state(STALLED, self._generation)
+        print(f"⚠️ Capture {self.name} stalled ({error}), reopening the source")
+        self.reconnects += 1
+        self._reconnects.inc()
+        self._opening_since = None
+        self._spawn()
+
+
+def capture_health():
+    return {name: reader.health() for name, reader in CAPTURE_READERS.items()}
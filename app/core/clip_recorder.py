@@ -0,0 +1,204 @@
+# app/core/clip_recorder.py
+
+import os
+import json
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+from collections import deque
+
+import cv2
+import numpy as np
+
+from app.core.frame_encoder import FrameEncoder
+from app.core.metrics import CLIPS_RECORDED, CLIP_FRAMES_DROPPED, CLIP_PRE_ROLL_BYTES
+
+WAIT_TIMEOUT = 0.5
+# Frames in flight to the writer process; beyond this the recorder drops frames rather than block
+WRITER_QUEUE_SIZE = 256
+
+
+def _writer_main(jobs, output_dir, fourcc, fps):
+    # Runs in its own process: decodes the JPEG pre-roll/live frames and encodes the clip.
+    # Frames are placed by timestamp, so gaps from dropped or slow frames keep their real duration.
+    clips = {}
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        kind, clip_id = job[0], job[1]
+        if kind == 'start':
+            clips[clip_id] = {'info': job[2], 'writer': None, 'written': 0, 'last': None}
+        elif kind == 'frame':
+            clip = clips.get(clip_id)
+            if clip is None:
+                continue
+            frame = cv2.imdecode(np.frombuffer(job[2], dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                continue
+            if clip['writer'] is None:
+                # Written under a partial_ name (the extension picks the container) and renamed when done
+                clip['path'] = os.path.join(output_dir, 'partial_' + clip['info']['name'])
+                clip['writer'] = cv2.VideoWriter(clip['path'], cv2.VideoWriter_fourcc(*fourcc), fps,
+                                                 (frame.shape[1], frame.shape[0]))
+                clip['started'] = job[3]
+            elif frame.shape[:2] != clip['last'].shape[:2]:
+                frame = cv2.resize(frame, (clip['last'].shape[1], clip['last'].shape[0]))
+            due = int(round((job[3] - clip['started']) * fps)) + 1
+            while clip['written'] < due:
+                clip['writer'].write(frame)
+                clip['written'] += 1
+            clip['last'] = frame
+        elif kind == 'end':
+            clip = clips.pop(clip_id, None)
+            if clip is None or clip['writer'] is None:
+                continue
+            clip['writer'].release()
+            info = dict(clip['info'], end=job[2], classes=job[3], frames=clip['written'])
+            final = os.path.join(output_dir, clip['info']['name'])
+            os.replace(clip['path'], final)
+            with open(os.path.splitext(final)[0] + '.json', 'w') as f:
+                json.dump(info, f)
+            print(f"🎬 Saved clip {os.path.basename(final)} ({clip['written']} frames)")
+
+    for clip in clips.values():
+        if clip['writer'] is not None:
+            clip['writer'].release()
+
+
+class ClipRecorder:
+    """Saves pre_roll seconds before a detection and post_roll seconds after it as a video clip.
+
+    One thread per camera follows the annotated SharedFrameBuffer through a FrameEncoder
+    (pass the stream servers' encoders so viewers and the recorder share the JPEG encode) and keeps the
+    last pre_roll seconds of JPEG frames, sampled at fps, in a bounded ring. Every JPEG is a
+    keyframe, so a clip can start on any frame of the ring. trigger() only updates a deadline;
+    decoding and video encoding run in a separate writer process, off the capture and detect
+    path. A detection during a clip extends it, up to max_clip seconds per file.
+    """
+
+    def __init__(self, buffers, output_dir, pre_roll=5.0, post_roll=10.0, fps=10.0,
+                 fourcc='mp4v', extension='.mp4', max_clip=120.0, trigger_classes=None, encoders=()):
+        self.output_dir = output_dir
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.fps = fps
+        self.fourcc = fourcc
+        self.extension = extension
+        self.max_clip = max_clip
+        self.trigger_classes = None if trigger_classes is None else np.asarray(list(trigger_classes))
+        existing = {id(e.shared_buffer): e for e in encoders}
+        self.encoders = {camera_id: existing.get(id(buffer)) or FrameEncoder(buffer)
+                         for camera_id, buffer in buffers.items()}
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._until = {camera_id: 0.0 for camera_id in buffers}      # record frames up to this time
+        self._classes = {camera_id: set() for camera_id in buffers}  # classes seen in the current clip
+        self._clip_ids = itertools.count()
+        self._jobs = None
+        self._writer = None
+
+    def trigger(self, camera_id, boxes):
+        """Called with each detector result; cheap enough for the capture loop."""
+        if len(boxes) == 0 or camera_id not in self._until:
+            return
+        if self.trigger_classes is not None:
+            boxes = boxes[np.isin(boxes['class_id'], self.trigger_classes)]
+            if len(boxes) == 0:
+                return
+        until = float(boxes['timestamp'].max()) + self.post_roll
+        with self._lock:
+            self._until[camera_id] = max(self._until[camera_id], until)
+            self._classes[camera_id].update(int(c) for c in np.unique(boxes['class_id']))
+
+    def run(self, stop_event):
+        # A spawned writer re-imports the launching script as __mp_main__; that script must create
+        # its shared-memory segments under its __main__ guard (bootstrap/start.py does, in main())
+        ctx = mp.get_context('spawn')
+        self._jobs = ctx.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self._writer = ctx.Process(target=_writer_main, name='clip-writer', daemon=True,
+                                   args=(self._jobs, self.output_dir, self.fourcc, self.fps))
+        self._writer.start()
+
+        threads = [threading.Thread(target=self._follow, args=(camera_id, stop_event),
+                                    name=f"clip-recorder-{camera_id}", daemon=True)
+                   for camera_id in self.encoders]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self._jobs.put(None)
+        self._writer.join(timeout=10)
+
+    def _follow(self, camera_id, stop_event):
+        encoder = self.encoders[camera_id]
+        ring = deque(maxlen=max(1, int(self.pre_roll * self.fps) + 1))
+        interval = 1.0 / self.fps
+        ring_bytes = CLIP_PRE_ROLL_BYTES.labels(camera_id)
+        frames_dropped = CLIP_FRAMES_DROPPED.labels(camera_id)
+        last_frame_id = -1
+        last_kept = 0.0
+        clip = None  # (clip_id, started) while recording
+
+        while not stop_event.is_set():
+            # Sample at fps before encoding, which is also what bounds the ring
+            remaining = interval - (time.time() - last_kept)
+            if remaining > 0 and stop_event.wait(remaining):
+                break
+            encoded = encoder.wait_next(last_frame_id, timeout=WAIT_TIMEOUT)
+            with self._lock:
+                until = self._until[camera_id]
+            if encoded is None:
+                if clip is not None and time.time() > until:
+                    clip = self._end(camera_id, clip, until)
+                continue
+            last_frame_id = encoded.frame_id
+            last_kept = time.time()
+
+            if clip is not None and (encoded.timestamp > until or encoded.timestamp - clip[1] > self.max_clip):
+                clip = self._end(camera_id, clip, min(until, encoded.timestamp))
+
+            if clip is None and encoded.timestamp <= until:
+                # A detection is pending: open a clip and send the pre-roll first
+                clip = self._start(camera_id, ring, encoded.timestamp)
+
+            if clip is not None:
+                if not self._send(('frame', clip[0], encoded.jpeg, encoded.timestamp)):
+                    frames_dropped.inc()
+                ring.clear()
+            else:
+                ring.append(encoded)
+            ring_bytes.set(sum(len(e.jpeg) for e in ring))
+
+        if clip is not None:
+            self._end(camera_id, clip, time.time())
+
+    def _start(self, camera_id, ring, now):
+        pre_roll = [e for e in ring if e.timestamp >= now - self.pre_roll]
+        started = pre_roll[0].timestamp if pre_roll else now
+        clip_id = next(self._clip_ids)
+        name = f"{camera_id}_{time.strftime('%Y%m%d-%H%M%S', time.localtime(started))}_{clip_id}{self.extension}"
+        self._jobs.put(('start', clip_id, {'camera': camera_id, 'name': name, 'start': started, 'trigger': now}))
+        for e in pre_roll:
+            if not self._send(('frame', clip_id, e.jpeg, e.timestamp)):
+                CLIP_FRAMES_DROPPED.labels(camera_id).inc()
+        return clip_id, started
+
+    def _end(self, camera_id, clip, end):
+        with self._lock:
+            classes = sorted(self._classes[camera_id])
+            if self._until[camera_id] <= end:
+                self._classes[camera_id] = set()
+        self._jobs.put(('end', clip[0], end, classes))
+        CLIPS_RECORDED.labels(camera_id).inc()
+        return None
+
+    def _send(self, job):
+        try:
+            self._jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            return False
@@ -0,0 +1,200 @@
+# app/core/control_block.py
+
+import time
+import threading
+from collections import namedtuple
+
+import numpy as np
+from multiprocessing import shared_memory
+
+from app.core.metrics import CONTROL_VERSION
+from app.core.memory_buffer import attach_shared_memory
+from config.yolo_config import (
+    TARGET_CLASSES, CONTROL_BLOCK_NAME, STREAM_FPS, DETECT_CONF, MAX_BOXES, INFERENCE_INTERVAL,
+    FRESH_WINDOW, VIEWER_DELAY
+)
+
+# One record, guarded by a seqlock like the frame ring: seq is odd while the writer is
+# updating it. version counts updates, so a reader checks one integer per frame and only
+# re-reads the record when it moved.
+MAGIC = 0x59435442  # "YCTB"
+MAX_CLASS_ID = 256
+CONTROL_DTYPE = np.dtype([
+    ('magic', '<u8'),
+    ('seq', '<u8'),
+    ('version', '<u8'),
+    ('stream_fps', '<f8'),
+    ('conf', '<f8'),
+    ('max_boxes', '<i8'),
+    ('inference_interval', '<f8'),
+    ('fresh_window', '<f8'),
+    ('viewer_delay', '<f8'),
+    ('classes', 'u1', (MAX_CLASS_ID,)),  # 1 = class id is active
+])
+READ_RETRIES = 8
+# Attached processes can't be signalled by the writer, they poll the version
+ATTACHED_POLL_INTERVAL = 0.05
+
+ControlSettings = namedtuple('ControlSettings', [
+    'version', 'stream_fps', 'conf', 'max_boxes', 'inference_interval', 'fresh_window', 'viewer_delay',
+    'classes',
+])
+SETTINGS = ControlSettings._fields[1:]
+
+# What the pipeline runs with when no control block is attached
+DEFAULT_SETTINGS = ControlSettings(0, STREAM_FPS, DETECT_CONF, MAX_BOXES, INFERENCE_INTERVAL, FRESH_WINDOW,
+                                   VIEWER_DELAY, tuple(TARGET_CLASSES))
+
+
+def current_settings(control):
+    return DEFAULT_SETTINGS if control is None else control.settings()
+
+
+def _validate(name, value):
+    if name == 'classes':
+        classes = tuple(sorted({int(c) for c in value}))
+        if any(c < 0 or c >= MAX_CLASS_ID for c in classes):
+            raise ValueError(f"class ids must be in 0..{MAX_CLASS_ID - 1}")
+        return classes
+    if name == 'max_boxes':
+        value = int(value)
+        if value < 1:
+            raise ValueError("max_boxes must be at least 1")
+        return value
+    value = float(value)
+    if name == 'conf' and not 0.0 <= value <= 1.0:
+        raise ValueError("conf must be in 0..1")
+    if name == 'stream_fps' and value <= 0:
+        raise ValueError("stream_fps must be positive")
+    if value < 0:
+        raise ValueError(f"{name} can't be negative")
+    return value
+
+
+def parse_setting(name, text, class_names=TARGET_CLASSES):
+    """Value of a setting from text, as typed at the start.py prompt; classes take names or ids."""
+    if name not in SETTINGS:
+        raise ValueError(f"unknown setting '{name}', one of: {', '.join(SETTINGS)}")
+    if name == 'classes':
+        ids = {class_name: class_id for class_id, class_name in class_names.items()}
+        return _validate(name, [ids[c] if c in ids else int(c) for c in text.replace(',', ' ').split()])
+    return _validate(name, text)
+
+
+class ControlBlock:
+    """Live pipeline settings in shared memory, written by start.py and read by every process.
+
+    Readers call settings() as often as they like, typically once per frame: it costs one
+    integer read unless an update happened since the last call.
+    """
+
+    def __init__(self, name=CONTROL_BLOCK_NAME, create=False, defaults=DEFAULT_SETTINGS):
+        self.name = name
+        self.create = create
+        if create:
+            try:
+                self.shm = shared_memory.SharedMemory(create=True, size=CONTROL_DTYPE.itemsize, name=name)
+            except FileExistsError:
+                print(f"⚠️ Shared memory '{name}' exists. Attempting to unlink and recreate...")
+                existing = shared_memory.SharedMemory(name=name)
+                existing.close()
+                existing.unlink()
+                self.shm = shared_memory.SharedMemory(create=True, size=CONTROL_DTYPE.itemsize, name=name)
+        else:
+            self.shm = attach_shared_memory(name)
+        self.record = np.ndarray((1,), dtype=CONTROL_DTYPE, buffer=self.shm.buf)
+
+        if create:
+            self.record[0] = 0
+            self._write(defaults._asdict())
+            self.record['magic'] = MAGIC
+        elif int(self.record['magic'][0]) != MAGIC:
+            raise ValueError(f"Shared memory '{name}' is not a control block")
+        self._lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._settings = None
+
+    def _write(self, values):
+        record = self.record
+        record['seq'] += 1  # odd: update in progress
+        for name, value in values.items():
+            if name == 'classes':
+                record['classes'][0] = 0
+                record['classes'][0][list(value)] = 1
+            elif name in SETTINGS:
+                record[name] = value
+        record['version'] += 1
+        record['seq'] += 1  # even: published
+
+    def update(self, **values):
+        """Change some settings at once; returns the new version. Only the creating process writes."""
+        if not self.create:
+            raise RuntimeError("Only the process that created the control block updates it")
+        unknown = set(values) - set(SETTINGS)
+        if unknown:
+            raise ValueError(f"unknown settings {sorted(unknown)}, expected some of: {', '.join(SETTINGS)}")
+        values = {name: parse_setting(name, value) if isinstance(value, str) else _validate(name, value)
+                  for name, value in values.items()}
+        with self._lock:
+            self._write(values)
+            version = int(self.record['version'][0])
+        CONTROL_VERSION.set(version)
+        with self._changed:
+            self._changed.notify_all()
+        return version
+
+    def version(self):
+        return int(self.record['version'][0])
+
+    def _read(self):
+        for _ in range(READ_RETRIES):
+            seq = int(self.record['seq'][0])
+            if seq & 1:
+                time.sleep(0)
+                continue
+            copy = self.record[0].copy()
+            if int(self.record['seq'][0]) == seq:
+                return ControlSettings(int(copy['version']), float(copy['stream_fps']), float(copy['conf']),
+                                       int(copy['max_boxes']), float(copy['inference_interval']),
+                                       float(copy['fresh_window']), float(copy['viewer_delay']),
+                                       tuple(int(c) for c in np.flatnonzero(copy['classes'])))
+        return None
+
+    def settings(self):
+        """Current ControlSettings, re-read only when the version changed."""
+        cached = self._settings
+        if cached is None or cached.version != self.version():
+            # A read racing a writer keeps the previous settings until the next call
+            self._settings = self._read() or cached or DEFAULT_SETTINGS
+        return self._settings
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the version moves past version or timeout passes; returns the current settings."""
+        if self.create:
+            with self._changed:
+                self._changed.wait_for(lambda: self.version() != version, timeout)
+        else:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.version() == version:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                time.sleep(ATTACHED_POLL_INTERVAL)
+        return self.settings()
+
+    def close(self):
+        self.record = None
+        self.shm.close()
+        if not self.create:
+            return
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def attach_control(name=CONTROL_BLOCK_NAME):
+    """The running pipeline's control block, or None when start.py isn't running."""
+    try:
+        return ControlBlock(name, create=False)
+    except FileNotFoundError:
+        return None
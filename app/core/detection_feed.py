@@ -0,0 +1,76 @@
+# app/core/detection_feed.py
+
+import struct
+import threading
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Binary WebSocket messages, little endian, first byte is the message type:
+#   frame:      B type=1, q frame_id, d timestamp, then the JPEG bytes
+#   detections: B type=2, q frame_id, d timestamp, H width, H height, H count,
+#               then count * WIRE_BOX_DTYPE (11 bytes per box)
+MSG_FRAME = 1
+MSG_DETECTIONS = 2
+FRAME_HEADER = struct.Struct('<Bqd')
+DETECTIONS_HEADER = struct.Struct('<BqdHHH')
+WIRE_BOX_DTYPE = np.dtype([
+    ('x1', '<u2'), ('y1', '<u2'), ('x2', '<u2'), ('y2', '<u2'),
+    ('conf', '<f2'), ('class_id', 'u1'),
+])
+
+Detections = namedtuple('Detections', ['frame_id', 'timestamp', 'width', 'height', 'boxes'])
+
+
+def pack_frame(encoded):
+    return FRAME_HEADER.pack(MSG_FRAME, encoded.frame_id, encoded.timestamp) + encoded.jpeg
+
+
+def pack_detections(detections):
+    boxes = detections.boxes
+    wire = np.empty(len(boxes), dtype=WIRE_BOX_DTYPE)
+    for column in ('x1', 'y1', 'x2', 'y2'):
+        wire[column] = np.clip(boxes[column], 0, 0xFFFF)
+    wire['conf'] = boxes['conf']
+    wire['class_id'] = boxes['class_id']
+    header = DETECTIONS_HEADER.pack(MSG_DETECTIONS, detections.frame_id, detections.timestamp,
+                                    detections.width, detections.height, len(boxes))
+    return header + wire.tobytes()
+
+
+class DetectionFeed:
+    """The boxes camera_loop drew on its latest frame, for clients that draw overlays themselves.
+
+    With a raw_buffer the un-annotated frame is also published there (one extra copy per
+    frame) and the detections carry its frame id, so a client can pair every clean frame
+    with its boxes. Without one, frame ids refer to the annotated buffer.
+    """
+
+    def __init__(self, raw_buffer=None):
+        self.raw_buffer = raw_buffer
+        self._cond = threading.Condition()
+        self._latest = None
+
+    def publish(self, frame, boxes, frame_id, timestamp, shape):
+        """frame is the clean capture; boxes are in the coordinates of the shared buffer, of the given shape."""
+        if self.raw_buffer is not None:
+            slot = self.raw_buffer.begin_write()
+            if frame.shape == slot.shape:
+                np.copyto(slot, frame)
+            else:
+                cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot)
+            frame_id = self.raw_buffer.end_write(timestamp=timestamp)
+        height, width = shape[:2]
+        with self._cond:
+            self._latest = Detections(frame_id, timestamp, width, height, boxes)
+            self._cond.notify_all()
+
+    def latest(self):
+        return self._latest
+
+    def wait_next(self, after_frame_id, timeout=None):
+        with self._cond:
+            self._cond.wait_for(lambda: self._latest is not None and self._latest.frame_id > after_frame_id, timeout)
+            latest = self._latest
+        return latest if latest is not None and latest.frame_id > after_frame_id else None
@@ -1,28 +1,41 @@
 import time
 
-def detection_worker(frame_queue, box_queue, model, stop_event, target_classes, max_boxes=5):
+from app.core.tiling import detect
+from app.core.metrics import INFERENCE_SECONDS, DETECTION_ERRORS
+
+def detection_worker(frame_queue, box_queue, model, stop_event, target_classes, max_boxes=5,
+                     roi=None, tile_size=None, on_result=None, release_frame=None, control=None):
+    # frame_queue carries (frame_id, frame, captured_at); on_result(frame_id, boxes) sees every result
+    # first, box_queue gets (captured_at, boxes) with the boxes stamped at the frame's capture time.
+    # The frame may be a read-only view of a pooled buffer, handed back with release_frame.
+    # With a control block, its classes, max_boxes and conf replace the arguments from the next frame on.
+    inference_seconds = INFERENCE_SECONDS.labels('thread')
     while not stop_event.is_set():
         try:
-            frame = frame_queue.get(timeout=0.5)
+            item = frame_queue.get(timeout=0.5)
         except:
             continue
-        if frame is None:
+        if item is None:
             break
+        frame_id, frame, captured_at = item
 
         try:
-            results = model(frame, verbose=False)
-            current_time = time.time()
-            new_boxes = []
-
-            for result in results:
-                for box in result.boxes:
-                    class_id = int(box.cls)
-                    if class_id in target_classes:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        conf = float(box.conf)
-                        timestamp = current_time
-                        new_boxes.append((x1, y1, x2, y2, conf, class_id, timestamp))
-
-            box_queue.put(new_boxes[:max_boxes])
+            # The ROI crop (or its tiles) goes through the model as one batch
+            started = time.perf_counter()
+            if control is not None:
+                settings = control.settings()
+                boxes = detect(model, frame, settings.classes, settings.max_boxes, timestamp=captured_at, roi=roi,
+                               tile_size=tile_size, conf=settings.conf)
+            else:
+                boxes = detect(model, frame, target_classes, max_boxes, timestamp=captured_at, roi=roi,
+                               tile_size=tile_size)
+            inference_seconds.observe(time.perf_counter() - started)
+            if on_result is not None:
+                on_result(frame_id, boxes)
+            box_queue.put((captured_at, boxes))
         except Exception as e:
+            DETECTION_ERRORS.labels('thread').inc()
             print(f"Detection error: {e}")
+        finally:
+            if release_frame is not None:
+                release_frame(frame)
@@ -0,0 +1,295 @@
+# app/core/event_store.py
+
+import os
+import json
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from app.core.metrics import EVENTS_WRITTEN, EVENT_FLUSH_SECONDS
+
+# One row per detection. Coordinates fit int16 up to 4K frames; camera is an index into cameras.json
+EVENT_DTYPE = np.dtype([
+    ('timestamp', '<f8'),
+    ('camera', '<u2'),
+    ('class_id', '<i2'),
+    ('conf', '<f4'),
+    ('x1', '<i2'), ('y1', '<i2'), ('x2', '<i2'), ('y2', '<i2'),
+])
+COLUMNS = EVENT_DTYPE.names
+EMPTY_EVENTS = np.empty(0, dtype=EVENT_DTYPE)
+
+
+def _column_path(segment_dir, column):
+    return os.path.join(segment_dir, f"{column}.bin")
+
+
+def _read_columns(segment_dir, rows, columns=COLUMNS):
+    return {c: np.memmap(_column_path(segment_dir, c), dtype=EVENT_DTYPE[c], mode='r', shape=(rows,))
+            if rows else np.empty(0, dtype=EVENT_DTYPE[c]) for c in columns}
+
+
+class EventStore:
+    """Append-only columnar log of detections with time and class indexed queries.
+
+    append() only queues the boxes; run() flushes them every flush_interval on its own
+    thread, appending to one raw file per column of the active segment. A segment is
+    sealed after segment_rows rows or segment_seconds: its rows are rewritten sorted by
+    (class_id, timestamp) and index.json records each class's row range, so a range or
+    count query is a binary search per class instead of a scan. Only the active segment
+    is scanned, and it is bounded by the rotation limits.
+    """
+
+    def __init__(self, path, flush_interval=1.0, segment_rows=500_000, segment_seconds=600.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        os.makedirs(path, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._cameras = self._load_cameras()
+        self._sealed = []          # [(segment_dir, index)] oldest first
+        self._columns_cache = {}   # sealed segment_dir -> column memmaps
+        self._active_dir = None
+        self._active_rows = 0
+        self._active_started = 0.0
+        self._active_range = (np.inf, -np.inf)
+        self._open_segments()
+
+    # --- writing -------------------------------------------------------------------------
+
+    def append(self, camera_id, boxes):
+        """Queue BOX_DTYPE detections of one camera; never touches the disk."""
+        if len(boxes) == 0:
+            return
+        with self._lock:
+            camera = self._camera_index(camera_id)
+            self._pending.append((camera, boxes))
+
+    def run(self, stop_event):
+        while not stop_event.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        started = time.perf_counter()
+        rows = np.empty(sum(len(boxes) for _, boxes in pending), dtype=EVENT_DTYPE)
+        offset = 0
+        for camera, boxes in pending:
+            chunk = rows[offset:offset + len(boxes)]
+            chunk['camera'] = camera
+            for column in ('timestamp', 'class_id', 'conf', 'x1', 'y1', 'x2', 'y2'):
+                chunk[column] = boxes[column]
+            offset += len(boxes)
+        rows = rows[np.argsort(rows['timestamp'], kind='stable')]
+
+        if self._active_dir is None:
+            self._start_segment(float(rows['timestamp'][0]))
+        for column in COLUMNS:
+            with open(_column_path(self._active_dir, column), 'ab') as f:
+                f.write(np.ascontiguousarray(rows[column]).tobytes())
+        with self._lock:
+            self._active_rows += len(rows)
+            lo, hi = self._active_range
+            self._active_range = (min(lo, float(rows['timestamp'][0])), max(hi, float(rows['timestamp'][-1])))
+
+        EVENTS_WRITTEN.inc(len(rows))
+        if (self._active_rows >= self.segment_rows
+                or time.time() - self._active_started >= self.segment_seconds):
+            self._seal_active()
+        EVENT_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        return len(rows)
+
+    # --- queries -------------------------------------------------------------------------
+
+    def cameras(self):
+        return list(self._cameras)
+
+    def count(self, start=None, end=None, class_id=None, camera_id=None):
+        camera = self.camera_index(camera_id)
+        if camera_id is not None and camera is None:
+            return 0
+        total = 0
+        for columns, ranges in self._candidates(start, end, class_id, camera):
+            for lo, hi in ranges:
+                if camera is None:
+                    total += hi - lo
+                else:
+                    total += int(np.count_nonzero(columns['camera'][lo:hi] == camera))
+        return total
+
+    def query(self, start=None, end=None, class_id=None, camera_id=None, limit=1000):
+        """The newest `limit` events in [start, end], newest first, as an EVENT_DTYPE array."""
+        camera = self.camera_index(camera_id)
+        if camera_id is not None and camera is None:
+            return EMPTY_EVENTS
+        picked = []
+        for columns, ranges in self._candidates(start, end, class_id, camera):
+            for lo, hi in ranges:
+                index = np.arange(lo, hi)
+                if camera is not None:
+                    index = index[columns['camera'][lo:hi] == camera]
+                index = index[-limit:]  # each range is time sorted, older rows can't make the cut
+                if len(index):
+                    chunk = np.empty(len(index), dtype=EVENT_DTYPE)
+                    for column in COLUMNS:
+                        chunk[column] = columns[column][index]
+                    picked.append(chunk)
+        if not picked:
+            return EMPTY_EVENTS
+        events = np.concatenate(picked)
+        return events[np.argsort(-events['timestamp'], kind='stable')[:limit]]
+
+    def last_seen(self, class_id, camera_id=None, before=None):
+        events = self.query(end=before, class_id=class_id, camera_id=camera_id, limit=1)
+        return events[0] if len(events) else None
+
+    def camera_index(self, camera_id):
+        """Index of camera_id in stored rows, or None if it never logged anything."""
+        if camera_id is None or camera_id not in self._cameras:
+            return None
+        return self._cameras.index(camera_id)
+
+    def to_dicts(self, events, class_names=None):
+        return [{
+            'timestamp': float(e['timestamp']),
+            'camera': self._cameras[e['camera']],
+            'class_id': int(e['class_id']),
+            'class': (class_names or {}).get(int(e['class_id'])),
+            'conf': round(float(e['conf']), 4),
+            'box': [int(e['x1']), int(e['y1']), int(e['x2']), int(e['y2'])],
+        } for e in events]
+
+    def _candidates(self, start, end, class_id, camera):
+        # (columns, [(lo, hi) row ranges sorted by time]) per segment that may hold matches
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        with self._lock:
+            sealed = list(self._sealed)
+            active = (self._active_dir, self._active_rows, self._active_range)
+
+        for segment_dir, index in sealed:
+            if index['t_max'] < start or index['t_min'] > end:
+                continue
+            columns = self._sealed_columns(segment_dir, index['rows'])
+            ranges = []
+            for cls, (lo, hi) in index['classes'].items():
+                if class_id is not None and int(cls) != class_id:
+                    continue
+                timestamps = columns['timestamp'][lo:hi]
+                a = lo + int(np.searchsorted(timestamps, start, 'left'))
+                b = lo + int(np.searchsorted(timestamps, end, 'right'))
+                if b > a:
+                    ranges.append((a, b))
+            if ranges:
+                yield columns, ranges
+
+        active_dir, rows, (t_min, t_max) = active
+        if active_dir is None or rows == 0 or t_max < start or t_min > end:
+            return
+        try:
+            columns = _read_columns(active_dir, rows)
+        except FileNotFoundError:
+            return  # sealed and removed since the snapshot; those rows are in the next query
+        mask = (columns['timestamp'] >= start) & (columns['timestamp'] <= end)
+        if class_id is not None:
+            mask &= columns['class_id'] == class_id
+        # Active rows are only sorted per flush; materialise the matches in time order
+        index = np.flatnonzero(mask)
+        index = index[np.argsort(columns['timestamp'][index], kind='stable')]
+        matched = {c: np.asarray(columns[c])[index] for c in COLUMNS}
+        yield matched, [(0, len(index))]
+
+    # --- segments ------------------------------------------------------------------------
+
+    def _sealed_columns(self, segment_dir, rows):
+        columns = self._columns_cache.get(segment_dir)
+        if columns is None:
+            columns = self._columns_cache[segment_dir] = _read_columns(segment_dir, rows)
+        return columns
+
+    def _start_segment(self, first_timestamp):
+        name = f"active_{int(first_timestamp * 1000):015d}"
+        self._active_dir = os.path.join(self.path, name)
+        os.makedirs(self._active_dir, exist_ok=True)
+        self._active_started = time.time()
+
+    def _seal_active(self):
+        active_dir = self._active_dir
+        with self._lock:
+            rows = self._active_rows
+        segment_dir, index = self._seal(active_dir, rows)
+        with self._lock:
+            self._sealed.append((segment_dir, index))
+            self._active_dir = None
+            self._active_rows = 0
+            self._active_range = (np.inf, -np.inf)
+        shutil.rmtree(active_dir, ignore_errors=True)
+
+    def _seal(self, active_dir, rows):
+        columns = _read_columns(active_dir, rows)
+        order = np.lexsort((columns['timestamp'], columns['class_id']))
+        segment_dir = os.path.join(self.path, 'seg_' + os.path.basename(active_dir)[len('active_'):])
+        os.makedirs(segment_dir, exist_ok=True)
+        for column in COLUMNS:
+            np.ascontiguousarray(np.asarray(columns[column])[order]).tofile(_column_path(segment_dir, column))
+
+        class_ids = np.asarray(columns['class_id'])[order]
+        classes, starts = np.unique(class_ids, return_index=True)
+        ends = list(starts[1:]) + [rows]
+        index = {
+            'rows': int(rows),
+            't_min': float(columns['timestamp'].min()) if rows else 0.0,
+            't_max': float(columns['timestamp'].max()) if rows else 0.0,
+            'classes': {str(int(c)): [int(s), int(e)] for c, s, e in zip(classes, starts, ends)},
+        }
+        # index.json last: a segment directory without one is an interrupted seal
+        with open(os.path.join(segment_dir, 'index.json'), 'w') as f:
+            json.dump(index, f)
+        return segment_dir, index
+
+    def _open_segments(self):
+        for name in sorted(os.listdir(self.path)):
+            segment_dir = os.path.join(self.path, name)
+            if name.startswith('seg_'):
+                index_path = os.path.join(segment_dir, 'index.json')
+                if not os.path.exists(index_path):
+                    shutil.rmtree(segment_dir, ignore_errors=True)
+                    continue
+                with open(index_path) as f:
+                    self._sealed.append((segment_dir, json.load(f)))
+
+        # Whatever was active when the process stopped is sealed now, up to the last whole row
+        for name in sorted(os.listdir(self.path)):
+            if name.startswith('active_'):
+                active_dir = os.path.join(self.path, name)
+                rows = min(os.path.getsize(_column_path(active_dir, c)) // EVENT_DTYPE[c].itemsize
+                           if os.path.exists(_column_path(active_dir, c)) else 0 for c in COLUMNS)
+                if rows:
+                    self._sealed.append(self._seal(active_dir, rows))
+                shutil.rmtree(active_dir, ignore_errors=True)
+        self._sealed.sort(key=lambda item: item[1]['t_min'])
+
+    def _load_cameras(self):
+        try:
+            with open(os.path.join(self.path, 'cameras.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _camera_index(self, camera_id):
+        # Called with the lock held; new cameras are persisted before their first row is written
+        if camera_id not in self._cameras:
+            self._cameras.append(camera_id)
+            with open(os.path.join(self.path, 'cameras.json'), 'w') as f:
+                json.dump(self._cameras, f)
+        return self._cameras.index(camera_id)
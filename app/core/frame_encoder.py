@@ -0,0 +1,73 @@
+# app/core/frame_encoder.py
+
+import time
+import threading
+from collections import namedtuple
+
+import cv2
+
+from app.core.metrics import JPEG_ENCODE_SECONDS
+
+EncodedFrame = namedtuple('EncodedFrame', ['frame_id', 'timestamp', 'jpeg'])
+
+# (scale, JPEG quality) per level, from full size down to what still reads on a poor link;
+# level 0 uses the encoder's own quality
+QUALITY_LEVELS = ((1.0, 80), (1.0, 60), (0.75, 50), (0.5, 45), (0.35, 40))
+
+
+class FrameEncoder:
+    """Encodes each frame of a SharedFrameBuffer to JPEG once and shares the bytes.
+
+    All stream clients call latest(); the first one to see a new frame id encodes it,
+    everybody else gets the cached bytes, so encode cost does not grow with viewers.
+    Congested clients ask for a lower level (see QUALITY_LEVELS); each level is cached
+    the same way, so the cost is one encode per frame per level in use.
+    """
+
+    def __init__(self, shared_buffer, quality=80, levels=QUALITY_LEVELS):
+        self.shared_buffer = shared_buffer
+        self.levels = ((levels[0][0], quality),) + tuple(levels[1:])
+        self.frames_encoded = 0
+        self._locks = [threading.Lock() for _ in self.levels]
+        self._latest = [None] * len(self.levels)
+
+    def latest(self, level=0):
+        frame_id = self.shared_buffer.latest_frame_id()
+        cached = self._latest[level]
+        if frame_id < 0:
+            return None
+        if cached is not None and cached.frame_id == frame_id:
+            return cached
+
+        with self._locks[level]:
+            # Another client may have encoded this frame while we waited for the lock
+            cached = self._latest[level]
+            if cached is not None and cached.frame_id >= frame_id:
+                return cached
+
+            snapshot = self.shared_buffer.read_latest()
+            if snapshot is None:
+                return cached
+
+            started = time.perf_counter()
+            scale, quality = self.levels[level]
+            frame = snapshot.frame
+            if scale < 1.0:
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            JPEG_ENCODE_SECONDS.observe(time.perf_counter() - started)
+            if not ret or not self.shared_buffer.is_current(snapshot.frame_id):
+                return cached
+
+            self._latest[level] = EncodedFrame(snapshot.frame_id, snapshot.timestamp, buffer.tobytes())
+            self.frames_encoded += 1
+            return self._latest[level]
+
+    def wait_next(self, after_frame_id, timeout=None, level=0):
+        # Wakes on the buffer's publish notification instead of polling, never returns a repeat
+        if self.shared_buffer.wait_for_frame(after_frame_id, timeout) < 0:
+            return None
+        encoded = self.latest(level)
+        if encoded is None or encoded.frame_id <= after_frame_id:
+            return None
+        return encoded
@@ -0,0 +1,82 @@
+# app/core/frame_pool.py
+
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """Reference-counted frame buffers reused across captures instead of allocated per frame.
+
+    acquire() hands out a free buffer of the requested shape (allocating only when none is
+    free) with one reference. Every stage that keeps the frame past the current loop
+    iteration retain()s it and release()s it when done; at zero references the buffer goes
+    back on the free list. retain/release accept views of a pooled buffer too, so a stage
+    can be given a read-only view and still return it.
+    """
+
+    def __init__(self, max_free=8, dtype=np.uint8):
+        self.max_free = max_free
+        self.dtype = dtype
+        self.allocations = 0
+        self.acquires = 0
+        self._lock = threading.Lock()
+        self._free = {}   # shape -> [buffers]
+        self._refs = {}   # id(buffer) -> [buffer, refcount]
+
+    def acquire(self, shape):
+        shape = tuple(shape)
+        with self._lock:
+            self.acquires += 1
+            free = self._free.get(shape)
+            buffer = free.pop() if free else None
+            if buffer is None:
+                self.allocations += 1
+                buffer = np.empty(shape, dtype=self.dtype)
+            self._refs[id(buffer)] = [buffer, 1]
+            return buffer
+
+    def adopt(self, buffer):
+        """Take over an array allocated elsewhere (e.g. by a decoder that ignored our buffer)."""
+        with self._lock:
+            self.allocations += 1
+            self._refs[id(buffer)] = [buffer, 1]
+        return buffer
+
+    def retain(self, frame):
+        with self._lock:
+            entry = self._entry(frame)
+            if entry is not None:
+                entry[1] += 1
+
+    def release(self, frame):
+        with self._lock:
+            entry = self._entry(frame)
+            if entry is None:
+                return
+            entry[1] -= 1
+            if entry[1] > 0:
+                return
+            buffer = entry[0]
+            del self._refs[id(buffer)]
+            free = self._free.setdefault(buffer.shape, [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'allocations': self.allocations,
+                'acquires': self.acquires,
+                'in_use': len(self._refs),
+                'free': sum(len(free) for free in self._free.values()),
+            }
+
+    def _entry(self, frame):
+        # Walk a view back to the pooled array it was taken from
+        while frame is not None:
+            entry = self._refs.get(id(frame))
+            if entry is not None and entry[0] is frame:
+                return entry
+            frame = frame.base if isinstance(frame, np.ndarray) else None
+        return None
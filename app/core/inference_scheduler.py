@@ -0,0 +1,57 @@
+# app/core/inference_scheduler.py
+
+EMA_ALPHA = 0.2
+STALL_TIMEOUT = 5.0  # give up on a submitted frame whose result never came back
+
+
+class AdaptiveScheduler:
+    """Decides which captured frames get a full detector pass.
+
+    The detector may be busy for at most cpu_budget of wall time, so the shortest
+    interval between runs is the measured inference time / cpu_budget. In a still
+    scene the interval stretches towards max_interval; as tracked boxes move faster
+    (motion in box-sizes per second) it shrinks back to the budget limit. A scene change
+    seen outside the tracked boxes (changed, e.g. from the motion gate) drops it to the
+    budget limit at once, so an object entering an empty scene isn't left for max_interval.
+    """
+
+    def __init__(self, cpu_budget=0.5, min_interval=0.0, max_interval=1.0, motion_gain=4.0):
+        self.cpu_budget = cpu_budget
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.motion_gain = motion_gain
+        self.inference_time = 0.0
+        self.frames_seen = 0
+        self.frames_inferred = 0
+        self._last_run = 0.0
+        self._submitted_at = None
+
+    def interval(self, motion, changed=False):
+        budget_interval = self.inference_time / self.cpu_budget
+        motion_interval = 0.0 if changed else self.max_interval / (1.0 + self.motion_gain * motion)
+        return max(self.min_interval, budget_interval, motion_interval)
+
+    def should_run(self, now, motion, changed=False):
+        self.frames_seen += 1
+        if self._submitted_at is not None:
+            if now - self._submitted_at < STALL_TIMEOUT:
+                return False
+            self._submitted_at = None
+        return now - self._last_run >= self.interval(motion, changed)
+
+    def submitted(self, now):
+        self._submitted_at = now
+        self._last_run = now
+        self.frames_inferred += 1
+
+    def skipped(self, now):
+        # The frame was due but something else (e.g. the motion gate) vetoed it
+        self._last_run = now
+
+    def completed(self, now):
+        if self._submitted_at is None:
+            return
+        elapsed = now - self._submitted_at
+        self.inference_time = elapsed if self.frames_inferred == 1 else (
+            (1 - EMA_ALPHA) * self.inference_time + EMA_ALPHA * elapsed)
+        self._submitted_at = None
@@ -0,0 +1,164 @@
+# app/core/loss_landscape.py
+
+import os
+import json
+import hashlib
+
+import cv2
+import numpy as np
+
+from app.core.model_backend import file_digest
+from config.yolo_config import MODEL_PATH, MODEL_CACHE_DIR
+
+LABEL_CONF = 0.25   # the unperturbed model's own detections above this are the targets
+IMGSZ = 320
+
+
+def grid_points(level, span=1.0):
+    """(alpha, beta) of a (2^level + 1)^2 grid over [-span, span]^2; every level contains the coarser ones."""
+    steps = 2 ** level
+    axis = [round(span * (2 * i / steps - 1), 6) for i in range(steps + 1)]
+    return [(a, b) for b in axis for a in axis]
+
+
+def load_images(paths, imgsz=IMGSZ):
+    # Square resize, not letterbox: normalised label coordinates mean the same in input and prediction
+    images = []
+    for path in paths:
+        image = cv2.imread(path)
+        if image is None:
+            raise FileNotFoundError(f"Could not read image {path}")
+        images.append(cv2.resize(image, (imgsz, imgsz)))
+    return images
+
+
+def cache_dir(image_paths, seed, span, imgsz=IMGSZ, model_path=MODEL_PATH):
+    """Directory of the incremental cell cache for this model, image set and directions."""
+    images = hashlib.sha1(''.join(sorted(file_digest(p) for p in image_paths)).encode()).hexdigest()[:12]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    model = file_digest(model_path) if os.path.exists(model_path) else 'unhashed'
+    return os.path.join(MODEL_CACHE_DIR, f"landscape-{stem}-{model}-{images}-s{seed}-r{span:g}-{imgsz}")
+
+
+class CellCache:
+    """Append-only log of evaluated (alpha, beta, loss) cells; a run resumes from whatever is in it."""
+
+    def __init__(self, path, meta):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        self.cells = {}
+        cells_path = os.path.join(path, 'cells.jsonl')
+        if os.path.exists(cells_path):
+            with open(cells_path) as f:
+                for line in f:
+                    try:
+                        a, b, loss = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    self.cells[(a, b)] = loss
+        self._file = open(cells_path, 'a')
+
+    def add(self, results):
+        for a, b, loss in results:
+            self.cells[(a, b)] = loss
+            self._file.write(json.dumps([a, b, loss]) + '\n')
+        self._file.flush()
+
+    def missing(self, points):
+        return [p for p in points if p not in self.cells]
+
+    def surface(self, level, span=1.0):
+        """(alpha axis, beta axis, Z) of a fully evaluated level, or None while cells are missing."""
+        points = grid_points(level, span)
+        if self.missing(points):
+            return None
+        n = 2 ** level + 1
+        axis = np.array([a for a, _ in points[:n]])
+        z = np.array([self.cells[p] for p in points]).reshape(n, n)
+        return axis, axis, z
+
+    def close(self):
+        self._file.close()
+
+
+class LandscapeEvaluator:
+    """Detection loss of the model moved to w + alpha * d1 + beta * d2.
+
+    d1 and d2 are filter-normalised random directions (Li et al., "Visualizing the Loss
+    Landscape of Neural Nets"): every filter of a direction is scaled to the norm of the
+    matching filter in the weights, biases and norm parameters are left at zero. They are
+    drawn from seed, so each pool worker rebuilds the same ones instead of receiving them.
+    Targets are the unperturbed model's own detections on the images, so no labels are needed.
+    """
+
+    def __init__(self, model_path, seed, images, label_conf=LABEL_CONF):
+        import torch
+        from ultralytics import YOLO
+        from ultralytics.cfg import get_cfg
+
+        self.torch = torch
+        # Predicting fuses a model's conv/bn in place, so labels come from a separate copy
+        labeler = YOLO(model_path)
+        results = labeler.predict(images, imgsz=images[0].shape[0], conf=label_conf, verbose=False)
+        batch_idx, cls, bboxes = [], [], []
+        for i, result in enumerate(results):
+            boxes = result.boxes
+            batch_idx.append(torch.full((len(boxes),), i, dtype=torch.float32))
+            cls.append(boxes.cls.float().cpu().view(-1, 1))
+            bboxes.append(boxes.xywhn.float().cpu())
+        rgb = np.stack([image[:, :, ::-1] for image in images]).transpose(0, 3, 1, 2)
+        self.batch = {
+            'img': torch.from_numpy(np.ascontiguousarray(rgb)).float() / 255.0,
+            'batch_idx': torch.cat(batch_idx),
+            'cls': torch.cat(cls),
+            'bboxes': torch.cat(bboxes),
+        }
+
+        self.net = YOLO(model_path).model
+        self.net.args = get_cfg()  # loss gains (box, cls, dfl) the criterion reads from the model
+        self.net.eval()            # BN running stats stay fixed while the weights move
+        self.params = [p for p in self.net.parameters()]
+        self.base = [p.detach().clone() for p in self.params]
+
+        generator = torch.Generator().manual_seed(seed)
+        self.directions = [self._direction(generator), self._direction(generator)]
+
+    def _direction(self, generator):
+        torch = self.torch
+        direction = []
+        for w in self.base:
+            d = torch.randn(w.shape, generator=generator)
+            if w.dim() <= 1:
+                d.zero_()
+            else:
+                flat_d, flat_w = d.view(d.shape[0], -1), w.view(w.shape[0], -1)
+                flat_d.mul_(flat_w.norm(dim=1, keepdim=True) / (flat_d.norm(dim=1, keepdim=True) + 1e-10))
+            direction.append(d)
+        return direction
+
+    def loss_at(self, alpha, beta):
+        torch = self.torch
+        with torch.no_grad():
+            for p, w, d1, d2 in zip(self.params, self.base, *self.directions):
+                p.copy_(w + alpha * d1 + beta * d2)
+            # One forward pass over the whole image set
+            preds = self.net(self.batch['img'])
+            _, items = self.net.loss(self.batch, preds)
+        return float(items.sum())
+
+
+_evaluator = None
+
+
+def init_worker(model_path, seed, image_paths, imgsz, threads):
+    # ProcessPoolExecutor initializer: one model and one pair of directions per worker
+    global _evaluator
+    import torch
+    torch.set_num_threads(threads)
+    _evaluator = LandscapeEvaluator(model_path, seed, load_images(image_paths, imgsz))
+
+
+def evaluate_cells(cells):
+    return [(a, b, _evaluator.loss_at(a, b)) for a, b in cells]
@@ -1,43 +1,203 @@
 # app/core/memory_buffer.py
 
+import sys
+import time
+import threading
+from collections import namedtuple
+
 import numpy as np
 import cv2
-from multiprocessing import shared_memory, Lock
+from multiprocessing import shared_memory, resource_tracker
+
+from app.core.metrics import SHM_WRITE_SECONDS, SHM_READ_SECONDS
+
+# Segment layout (all offsets in bytes):
+#   [0, 64)                      header: magic, version, slots, height, width, channels, latest frame id
+#   [64, 64 + 32 * slots)        per-slot seqlock records: seq, frame_id, timestamp, reserved
+#   [data_offset, ...)           slots * frame
+# Seq is odd while the writer is filling a slot and even once it is published, so
+# readers in any process can detect a torn frame without taking a lock.
+MAGIC = 0x59424652  # "YBFR"
+VERSION = 1
+HEADER_SIZE = 64
+SLOT_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('frame_id', '<i8'),
+    ('timestamp', '<f8'),
+    ('reserved', '<u8'),
+])
+READ_RETRIES = 8
+# Attached readers have no way to be signalled by a writer in another process, they poll the header
+ATTACHED_POLL_INTERVAL = 0.002
+
+FrameSnapshot = namedtuple('FrameSnapshot', ['frame_id', 'timestamp', 'frame'])
+
+# Spawned children (detection workers) report to the tracker of the process that started them,
+# which is also the one the segments' creator registered with
+_INHERITED_TRACKER = getattr(resource_tracker._resource_tracker, '_fd', None) is not None
+
+
+def attach_shared_memory(name):
+    """Open an existing segment without handing it to this process's resource tracker.
+
+    Before 3.13 attaching registers the segment like creating it does, so a debug script's
+    tracker would unlink the pipeline's segment when the script exits. Only the creator unlinks.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if not _INHERITED_TRACKER:
+        # A shared tracker holds the creator's registration under the same name, leave it be
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _segment_layout(shape, slots):
+    frame_nbytes = int(np.prod(shape))
+    meta_nbytes = SLOT_DTYPE.itemsize * slots
+    data_offset = HEADER_SIZE + meta_nbytes
+    data_offset = (data_offset + 63) // 64 * 64
+    return frame_nbytes, data_offset, data_offset + frame_nbytes * slots
+
 
 class SharedFrameBuffer:
-    def __init__(self, name=None, shape=(480, 640, 3), create=False):
+    def __init__(self, name=None, shape=(480, 640, 3), create=False, slots=3):
         self.name = name
-        self.shape = shape
         self.dtype = np.uint8
-        self.nbytes = int(np.prod(self.shape) * np.dtype(self.dtype).itemsize)
-        self.lock = Lock()
+        self.create = create
 
         if create:
+            _, _, size = _segment_layout(shape, slots)
             try:
-                self.shm = shared_memory.SharedMemory(create=True, size=self.nbytes, name=name)
+                self.shm = shared_memory.SharedMemory(create=True, size=size, name=name)
             except FileExistsError:
                 print(f"⚠️ Shared memory '{name}' exists. Attempting to unlink and recreate...")
                 existing = shared_memory.SharedMemory(name=name)
                 existing.close()
                 existing.unlink()
-                self.shm = shared_memory.SharedMemory(create=True, size=self.nbytes, name=name)
+                self.shm = shared_memory.SharedMemory(create=True, size=size, name=name)
+            self.header = np.ndarray((8,), dtype='<i8', buffer=self.shm.buf, offset=0)
+            self.header[:] = (MAGIC, VERSION, slots, shape[0], shape[1], shape[2], -1, 0)
+        else:
+            self.shm = attach_shared_memory(name)
+            self.header = np.ndarray((8,), dtype='<i8', buffer=self.shm.buf, offset=0)
+            if self.header[0] != MAGIC or self.header[1] != VERSION:
+                raise ValueError(f"Shared memory '{name}' is not a v{VERSION} frame ring")
+            # Attaching processes take the geometry from the segment, not from their arguments
+            slots = int(self.header[2])
+            shape = tuple(int(v) for v in self.header[3:6])
+
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.frame_nbytes, data_offset, _ = _segment_layout(self.shape, slots)
+        self.nbytes = self.frame_nbytes
+        self.meta = np.ndarray((slots,), dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=self.dtype,
+                                 buffer=self.shm.buf, offset=data_offset)
+        self._next_frame_id = int(self.header[6]) + 1
+        self._new_frame = threading.Condition()
+
+    def write(self, frame, timestamp=None):
+        slot = self.begin_write()
+        if frame.shape != self.shape:
+            cv2.resize(frame, (self.shape[1], self.shape[0]), dst=slot)
         else:
-            self.shm = shared_memory.SharedMemory(name=name)
+            np.copyto(slot, frame)
+        return self.end_write(timestamp)
+
+    def begin_write(self):
+        """Writable view of the next slot, for rendering a frame in place; publish it with end_write().
+
+        Single writer: the slot being filled is never the one readers see as latest.
+        """
+        self._write_started = time.perf_counter()
+        slot = self._next_frame_id % self.slots
+        self.meta[slot]['seq'] += 1  # odd: write in progress
+        return self.frames[slot]
+
+    def end_write(self, timestamp=None):
+        frame_id = self._next_frame_id
+        meta = self.meta[frame_id % self.slots]
+        meta['frame_id'] = frame_id
+        meta['timestamp'] = time.time() if timestamp is None else timestamp
+        meta['seq'] += 1  # even: published
+
+        self.header[6] = frame_id
+        self._next_frame_id = frame_id + 1
+        with self._new_frame:
+            self._new_frame.notify_all()
+        SHM_WRITE_SECONDS.observe(time.perf_counter() - self._write_started)
+        return frame_id
+
+    def latest_frame_id(self):
+        return int(self.header[6])
+
+    def next_frame_id(self):
+        # Id the next write() will publish; only meaningful to the (single) writer
+        return self._next_frame_id
+
+    def wait_for_frame(self, after_id, timeout=None):
+        """Block until a frame newer than after_id is published; return its id, or -1 on timeout."""
+        if self.create:
+            with self._new_frame:
+                self._new_frame.wait_for(lambda: self.header[6] > after_id, timeout)
+        else:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self.header[6] <= after_id:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                time.sleep(ATTACHED_POLL_INTERVAL)
+
+        frame_id = int(self.header[6])
+        return frame_id if frame_id > after_id else -1
+
+    def read_latest(self, copy=False):
+        """Return a consistent FrameSnapshot of the newest frame, or None if nothing was written.
+
+        Never blocks the writer. With copy=False the frame is a read-only view into the
+        ring; it stays valid until the writer wraps around to that slot (see is_current).
+        """
+        started = time.perf_counter()
+        for _ in range(READ_RETRIES):
+            frame_id = int(self.header[6])
+            if frame_id < 0:
+                return None
+
+            slot = frame_id % self.slots
+            meta = self.meta[slot]
+            seq = int(meta['seq'])
+            if seq & 1:
+                continue
+
+            if copy:
+                frame = self.frames[slot].copy()
+            else:
+                frame = self.frames[slot].view()
+                frame.flags.writeable = False
+            timestamp = float(meta['timestamp'])
 
-        self.buffer = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+            if int(meta['seq']) == seq and int(meta['frame_id']) == frame_id:
+                SHM_READ_SECONDS.observe(time.perf_counter() - started)
+                return FrameSnapshot(frame_id, timestamp, frame)
+        return None
 
-    def write(self, frame):
-        with self.lock:
-            if frame.shape != self.shape:
-                frame = cv2.resize(frame, (self.shape[1], self.shape[0]))
-            np.copyto(self.buffer, frame)
+    def is_current(self, frame_id):
+        # True while the slot holding frame_id has not been reused by the writer
+        meta = self.meta[frame_id % self.slots]
+        return int(meta['frame_id']) == frame_id and not int(meta['seq']) & 1
 
     def read(self):
-        with self.lock:
-            return self.buffer.copy()
+        snapshot = self.read_latest(copy=True)
+        if snapshot is None:
+            return np.zeros(self.shape, dtype=self.dtype)
+        return snapshot.frame
 
     def close(self):
+        # Drop our own views first, SharedMemory refuses to close while they are exported
+        self.header = self.meta = self.frames = None
         self.shm.close()
+        if not self.create:
+            return
         try:
             self.shm.unlink()  # Only the creator should call this
         except FileNotFoundError:
@@ -0,0 +1,204 @@
+# app/core/metrics.py
+
+import bisect
+import threading
+
+# Seconds; spans a 1 ms shm copy up to a multi-second stalled inference
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+REGISTRY = []
+
+
+def _format_value(value):
+    # Full float precision: with :g a counter past 999999 would export as 1.23457e+06
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    inner = ','.join(f'{k}="{v}"' for k, v in pairs)
+    return '{' + inner + '}'
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default()  # export a zero sample before the first update
+        REGISTRY.append(self)
+
+    def labels(self, *values, **kwargs):
+        """Child metric for one label combination; cache it in hot loops."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        # Unlabelled metrics use a single child keyed by the empty tuple
+        return self.labels()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, values):
+        return [f'{name}{_format_labels(labelnames, values)} {_format_value(self.value)}']
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value):
+        self.value = value
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (what histogram_quantile approximates)."""
+        target = q * self.count
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            if running >= target and count:
+                return bound
+        return 0.0
+
+    def render(self, name, labelnames, values):
+        lines = []
+        running = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            running += count
+            le = '+Inf' if bound == float('inf') else f'{bound:g}'
+            lines.append(f'{name}_bucket{_format_labels(labelnames, values, [("le", le)])} {running}')
+        lines.append(f'{name}_sum{_format_labels(labelnames, values)} {_format_value(self.sum)}')
+        lines.append(f'{name}_count{_format_labels(labelnames, values)} {self.count}')
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+
+def render_prometheus():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Pipeline metrics, shared by capture, detection, shared memory and streaming
+STARTUP_PHASE_SECONDS = Gauge('yolo_startup_phase_seconds', 'Duration of each startup phase', ['phase'])
+SERVICE_READY = Gauge('yolo_ready', '1 once the model is warm and frames are being processed')
+CONTROL_VERSION = Gauge('yolo_control_version', 'Updates applied to the shared control block')
+FRAMES_CAPTURED = Counter('yolo_frames_captured_total', 'Frames read from the camera', ['camera'])
+CAPTURE_FAILURES = Counter('yolo_capture_failures_total', 'Failed camera reads', ['camera'])
+CAPTURE_RECONNECTS = Counter('yolo_capture_reconnects_total', 'Times a camera source was reopened', ['camera'])
+CAPTURE_OVERWRITTEN = Counter('yolo_capture_overwritten_total', 'Decoded frames replaced by a newer one before the pipeline took them', ['camera'])
+CAPTURE_UP = Gauge('yolo_capture_up', '1 while the camera source is delivering frames', ['camera'])
+FRAMES_STALE = Counter('yolo_frames_stale_total', 'Frames discarded for exceeding CAPTURE_MAX_FRAME_AGE', ['camera'])
+FRAME_AGE_SECONDS = Histogram('yolo_frame_age_seconds', 'Time from frame arrival to the pipeline picking it up', ['camera'])
+FRAMES_DROPPED = Counter('yolo_frames_dropped_total', 'Frames due for detection but dropped because the detector was busy', ['camera'])
+INFERENCES_SKIPPED = Counter('yolo_inferences_skipped_total', 'Detector runs skipped by the motion gate', ['camera'])
+BOX_QUEUE_DEPTH = Gauge('yolo_box_queue_depth', 'Detection results waiting to be drawn', ['camera'])
+INFERENCE_SECONDS = Histogram('yolo_inference_seconds', 'Detector latency per frame or batch', ['backend'])
+DETECTION_ERRORS = Counter('yolo_detection_errors_total', 'Exceptions raised by the detector', ['backend'])
+SHM_WRITE_SECONDS = Histogram('yolo_shm_write_seconds', 'SharedFrameBuffer.write duration')
+SHM_READ_SECONDS = Histogram('yolo_shm_read_seconds', 'SharedFrameBuffer.read_latest duration')
+JPEG_ENCODE_SECONDS = Histogram('yolo_jpeg_encode_seconds', 'JPEG encode duration per frame')
+EVENTS_WRITTEN = Counter('yolo_events_written_total', 'Detections appended to the event store')
+EVENT_FLUSH_SECONDS = Histogram('yolo_event_flush_seconds', 'Event store batch write duration')
+CLIPS_RECORDED = Counter('yolo_clips_recorded_total', 'Detection clips handed to the writer process', ['camera'])
+CLIP_FRAMES_DROPPED = Counter('yolo_clip_frames_dropped_total', 'Clip frames dropped because the writer process fell behind', ['camera'])
+CLIP_PRE_ROLL_BYTES = Gauge('yolo_clip_pre_roll_bytes', 'JPEG bytes held in the pre-roll ring', ['camera'])
+STREAM_CLIENTS = Gauge('yolo_stream_clients', 'Connected MJPEG stream clients')
+STREAM_FRAMES_SENT = Counter('yolo_stream_frames_sent_total', 'Frames written to stream clients')
+STREAM_BYTES_SENT = Counter('yolo_stream_bytes_sent_total', 'Bytes written to stream clients')
+STREAM_LATENCY_SECONDS = Histogram('yolo_stream_latency_seconds', 'Capture-to-wire latency of streamed frames')
+STREAM_LEVEL_FRAMES = Counter('yolo_stream_level_frames_total', 'Frames streamed per adaptive quality level', ['level'])
+STREAM_LEVEL_CHANGES = Counter('yolo_stream_level_changes_total', 'Adaptive quality level changes of stream clients', ['direction'])
+MOSAIC_TILES_RENDERED = Counter('yolo_mosaic_tiles_rendered_total', 'Mosaic tiles redrawn from a new camera frame', ['camera'])
+MOSAIC_COMPOSE_SECONDS = Histogram('yolo_mosaic_compose_seconds', 'Mosaic composite duration')
+WS_CLIENTS = Gauge('yolo_ws_clients', 'Connected WebSocket clients')
+WS_MESSAGES_SENT = Counter('yolo_ws_messages_sent_total', 'WebSocket messages sent', ['kind'])
+WS_BYTES_SENT = Counter('yolo_ws_bytes_sent_total', 'WebSocket bytes sent', ['kind'])
@@ -0,0 +1,98 @@
+# app/core/model_backend.py
+
+import os
+import hashlib
+import shutil
+import logging
+
+import cv2
+import numpy as np
+
+from config.yolo_config import MODEL_PATH, MODEL_BACKEND, MODEL_INT8, MODEL_CACHE_DIR, WARMUP_RUNS
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'openvino')
+EXPORT_IMGSZ = 640
+WARMUP_IMAGE = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../test_frame.jpg'))
+
+
+def file_digest(path, length=12):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def cached_artifact_path(model_path, backend, int8):
+    """Where the exported model lives; keyed by the source weights' hash so retrained weights re-export."""
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    suffix = '-int8' if int8 else ''
+    name = f"{stem}-{file_digest(model_path)}-{backend}{suffix}"
+    return os.path.join(MODEL_CACHE_DIR, name + ('.onnx' if backend == 'onnx' else '_openvino_model'))
+
+
+def _export(model_path, backend, int8, target):
+    from ultralytics import YOLO
+
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    model = YOLO(model_path)
+    if backend == 'onnx':
+        # dynamic axes so batched/tiled inference can send more than one image per call
+        exported = model.export(format='onnx', imgsz=EXPORT_IMGSZ, dynamic=True)
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            os.remove(exported)
+            return target
+    else:
+        # OpenVINO INT8 is post-training static quantization calibrated by ultralytics
+        exported = model.export(format='openvino', imgsz=EXPORT_IMGSZ, dynamic=True, int8=int8)
+
+    shutil.move(exported, target)
+    return target
+
+
+def load_model(backend=MODEL_BACKEND, model_path=MODEL_PATH, int8=MODEL_INT8):
+    """A YOLO model for the configured backend, producing the same Results/boxes as the .pt model.
+
+    Non-torch backends are exported once and reused from MODEL_CACHE_DIR afterwards.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{backend}', expected one of {BACKENDS}")
+
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        return YOLO(model_path)
+
+    target = cached_artifact_path(model_path, backend, int8)
+    if not os.path.exists(target):
+        logger.info(f"📦 Exporting {model_path} to {backend}{' int8' if int8 else ''}...")
+        print(f"📦 Exporting {model_path} to {backend}{' int8' if int8 else ''} (one-time)...")
+        _export(model_path, backend, int8, target)
+    return YOLO(target, task='detect')
+
+
+def checkpoint_state_dict(model_path=MODEL_PATH):
+    """The .pt checkpoint's weights as saved, conv and batch-norm unfused, without building a YOLO model."""
+    import torch
+
+    checkpoint = torch.load(model_path, map_location='cpu', weights_only=False)
+    model = checkpoint.get('ema') or checkpoint['model']
+    return model.float().state_dict()
+
+
+def warmup_model(model, runs=WARMUP_RUNS, batch_size=1, image_path=WARMUP_IMAGE):
+    """Run the first, slow inferences (predictor setup, fusing, kernel selection) on a test image.
+
+    With batch_size > 1 a batched call is warmed too, as the multi-camera scheduler makes them.
+    """
+    frame = cv2.imread(image_path)
+    if frame is None:
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    for _ in range(runs):
+        model(frame, verbose=False)
+    if batch_size > 1:
+        model([frame] * batch_size, verbose=False)
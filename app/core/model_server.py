@@ -0,0 +1,433 @@
+# app/core/model_server.py
+
+import os
+import time
+import threading
+import functools
+from collections import OrderedDict
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from app.core.tiling import detect
+from app.core.model_backend import load_model, checkpoint_state_dict
+from app.core.activations import DEFAULT_SPEC, select_layers, reduce_activation
+from config.yolo_config import (
+    TARGET_CLASSES, MODEL_BACKEND, MODEL_PATH, MODEL_SERVER_ADDRESS, ACTIVATION_CACHE_SIZE
+)
+
+# Hooks stay installed this long after the last activations request, then the detector runs bare
+ACTIVATION_IDLE = 10.0
+# Cached activations younger than this are good enough for a "latest frame" request
+ACTIVATION_MAX_AGE = 1.0
+CONNECT_TIMEOUT = 2.0
+# How often an idle activation stream re-arms the hooks and checks its client is still there
+STREAM_POLL_INTERVAL = 1.0
+AUTHKEY_BYTES = 32
+
+
+def _key_path(address):
+    return f"{address}.key"
+
+
+def _create_authkey(address):
+    # A fresh key per server run, in a file only this user can read. Requests are pickled,
+    # so a client that can't prove it knows the key never gets to send one
+    path = _key_path(address)
+    if os.path.lexists(path):
+        os.unlink(path)
+    key = os.urandom(AUTHKEY_BYTES)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_NOFOLLOW, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _read_authkey(address):
+    # The key file vouches for the server too, so it must be this user's and private
+    path = _key_path(address)
+    with os.fdopen(os.open(path, os.O_RDONLY | os.O_NOFOLLOW), 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise PermissionError(f"{path} must belong to this user and not be readable by others")
+        return f.read()
+
+
+def select_weights(state_dict, substring='conv'):
+    return {k: v.detach().cpu().numpy().copy() for k, v in state_dict.items()
+            if substring in k and 'weight' in k}
+
+
+class HostedModel:
+    """A YOLO model shared by the detector and the model server.
+
+    Calls are serialised by a lock, so the server's requests can't interleave with a
+    detection. While activations are wanted, forward hooks reduce the layers selected by
+    the current ActivationSpec on the model's device; last_activations() returns the
+    (spec, {qualified name: array}) the calling thread's previous call recorded.
+    """
+
+    def __init__(self, model, spec=DEFAULT_SPEC):
+        self.model = model
+        self.spec = spec
+        # Exported backends have no module graph to hook
+        self.hookable = hasattr(getattr(model, 'model', None), 'named_modules')
+        self._lock = threading.Lock()
+        self._hooks = []
+        self._hooked_spec = None
+        self._captured = None
+        self._wanted_until = 0.0
+        self._local = threading.local()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self._update_hooks()
+            self._captured = {} if self._hooks else None
+            try:
+                return self.model(*args, **kwargs)
+            finally:
+                self._local.activations = (self._hooked_spec, self._captured) if self._captured else None
+                self._captured = None
+
+    def want_activations(self, spec=None):
+        # The most recent request's spec wins; it takes effect from the next call
+        if spec is not None:
+            self.spec = spec
+        self._wanted_until = time.time() + ACTIVATION_IDLE
+
+    def last_activations(self):
+        return getattr(self._local, 'activations', None)
+
+    def weights(self, substring='conv'):
+        with self._lock:
+            return select_weights(self.model.model.state_dict(), substring)
+
+    def _update_hooks(self):
+        wanted = self.hookable and time.time() < self._wanted_until
+        if self._hooks and (not wanted or self._hooked_spec != self.spec):
+            for hook in self._hooks:
+                hook.remove()
+            self._hooks = []
+            self._hooked_spec = None
+        if wanted and not self._hooks:
+            spec = self.spec
+            for name, module in select_layers(self.model.model, spec):
+                self._hooks.append(module.register_forward_hook(functools.partial(self._record, name, spec)))
+            self._hooked_spec = spec
+
+    def _record(self, name, spec, module, inputs, output):
+        # Only tensor outputs with a channel axis; the Detect head returns lists
+        if self._captured is not None and getattr(output, 'ndim', 0) == 4:
+            self._captured[name] = reduce_activation(output, spec)
+
+
+class ModelServer:
+    """Serves detections, activations and weights of one hosted model over a Unix socket.
+
+    The detector records its own results with record(frame_id, boxes); requests for those
+    frames are answered from an LRU cache instead of running the model again. Requests for
+    the latest frame of the shared buffer that the detector skipped run the model once and
+    are cached too. Clients use ModelClient, which exposes the same methods.
+
+    The server may start listening with model=None while the model is still loading;
+    requests then wait until set_model() installs it. With lazy=True (connect()'s in-process
+    stand-in) the PyTorch model is instead loaded by the first call that needs it.
+    """
+
+    def __init__(self, model=None, shared_buffer=None, address=MODEL_SERVER_ADDRESS,
+                 target_classes=TARGET_CLASSES, cache_size=ACTIVATION_CACHE_SIZE, lazy=False):
+        self.model = None
+        self.lazy = lazy
+        self.shared_buffer = shared_buffer
+        self.address = address
+        self.target_classes = target_classes
+        self.cache_size = cache_size
+        self.requests = 0
+        self.cache_hits = 0
+
+        self._introspection = None
+        self._introspection_lock = threading.Lock()
+        self._cache = OrderedDict()  # frame_id -> {'timestamp', 'boxes', 'activations': (spec, arrays)}
+        self._cache_lock = threading.Condition()
+        self._weights = {}
+        self._ready = threading.Event()
+        if model is not None:
+            self.set_model(model)
+
+    def set_model(self, model):
+        """Install the (loaded, warmed) model and release the requests waiting for it."""
+        self.model = model if isinstance(model, HostedModel) else HostedModel(model)
+        self._introspection = self.model if self.model.hookable else None
+        self._ready.set()
+
+    def record(self, frame_id, boxes):
+        """detection_worker's on_result callback: keep the detector's output for frame_id."""
+        if frame_id is not None:
+            self._store(frame_id, boxes, self.model.last_activations())
+
+    def info(self):
+        with self._cache_lock:
+            cached = list(self._cache)
+        return {
+            'backend': MODEL_BACKEND,
+            'model_path': MODEL_PATH,
+            'hookable': self._hosted_model().hookable,
+            'buffer': self.shared_buffer.name if self.shared_buffer is not None else None,
+            'cached_frames': cached,
+            'requests': self.requests,
+            'cache_hits': self.cache_hits,
+        }
+
+    def detect(self, frame_id=None):
+        """(frame_id, BOX_DTYPE boxes) for frame_id, or for the latest frame if None."""
+        entry = self._lookup(frame_id, 'boxes')
+        if entry is not None:
+            return entry
+        frame_id, boxes, _ = self._run(self._hosted_model(), frame_id)
+        return frame_id, boxes
+
+    def activations(self, frame_id=None, spec=None):
+        """(frame_id, {layer: array}) reduced per spec, for frame_id or for a recent frame if None."""
+        hosted = self._introspection_model()
+        spec = spec or hosted.spec
+        hosted.want_activations(spec)
+        entry = self._lookup(frame_id, 'activations', ACTIVATION_MAX_AGE if frame_id is None else None, spec)
+        if entry is not None:
+            return entry[0], entry[1][1]
+        frame_id, _, activations = self._run(hosted, frame_id)
+        if activations is None or activations[0] != spec:
+            raise LookupError("model has no hookable layers for this spec")
+        return frame_id, activations[1]
+
+    def stream_activations(self, spec=None, stop_event=None, heartbeat=False):
+        """Yield (frame_id, {layer: array}) for every frame the model runs on from now on."""
+        hosted = self._introspection_model()
+        spec = spec or hosted.spec
+        last_sent = self.shared_buffer.latest_frame_id() if self.shared_buffer is not None else -1
+        while stop_event is None or not stop_event.is_set():
+            hosted.want_activations(spec)
+            with self._cache_lock:
+                self._cache_lock.wait_for(lambda: self._newer(last_sent, spec) is not None, STREAM_POLL_INTERVAL)
+                newer = self._newer(last_sent, spec)
+            if newer is None:
+                # Nothing from the detector (gated, or no detector in this process): run the newest frame once
+                if self.shared_buffer is not None and self.shared_buffer.latest_frame_id() > last_sent:
+                    try:
+                        frame_id, _, activations = self._run(hosted, None)
+                        if activations is not None and activations[0] == spec:
+                            last_sent = frame_id
+                            yield frame_id, activations[1]
+                            continue
+                    except LookupError:
+                        pass
+                if heartbeat:
+                    yield None  # lets the server notice a client that hung up
+                continue
+            last_sent, activations = newer
+            yield last_sent, activations
+
+    def weights(self, substring='conv'):
+        # Read from the checkpoint file: predict() fuses conv/bn in place, so the hosted model's
+        # weights would depend on whether it had run yet
+        with self._introspection_lock:
+            if substring not in self._weights:
+                self._weights[substring] = select_weights(checkpoint_state_dict(MODEL_PATH), substring)
+            return self._weights[substring]
+
+    def serve(self, stop_event):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        authkey = _create_authkey(self.address)
+        listener = Listener(self.address, family='AF_UNIX', authkey=authkey)
+        threading.Thread(target=self._wake_on_stop, args=(stop_event, authkey), daemon=True).start()
+        print(f"🧠 Model server listening on {self.address}")
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    conn = listener.accept()
+                except AuthenticationError:
+                    print("⚠️ Model server refused a client without the key")
+                    continue
+                except OSError:
+                    break
+                threading.Thread(target=self._handle, args=(conn, stop_event), daemon=True).start()
+        finally:
+            listener.close()
+            for path in (self.address, _key_path(self.address)):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+    def _wake_on_stop(self, stop_event, authkey):
+        # accept() does not return on close, a throwaway connection unblocks it
+        stop_event.wait()
+        try:
+            Client(self.address, family='AF_UNIX', authkey=authkey).close()
+        except (OSError, AuthenticationError):
+            pass
+
+    def _handle(self, conn, stop_event):
+        handlers = {'info': self.info, 'detect': self.detect,
+                    'activations': self.activations, 'weights': self.weights}
+        with conn:
+            while not stop_event.is_set():
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    break
+                self.requests += 1
+                # Clients that connected during startup wait here instead of loading a model of their own
+                while not self._ready.wait(STREAM_POLL_INTERVAL):
+                    if stop_event.is_set():
+                        return
+                if op == 'stream':
+                    # The connection belongs to the stream until the client hangs up
+                    try:
+                        for item in self.stream_activations(*args, stop_event=stop_event, heartbeat=True):
+                            conn.send((True, item))
+                    except OSError:
+                        pass
+                    break
+                try:
+                    reply = (True, handlers[op](*args))
+                except Exception as e:
+                    reply = (False, f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except OSError:
+                    break
+
+    def _hosted_model(self):
+        if self.model is None and self.lazy:
+            with self._introspection_lock:
+                if self.model is None:
+                    self.set_model(load_model('torch'))
+        return self.model
+
+    def _introspection_model(self):
+        # Hooks need the PyTorch graph; with an exported detector load it once, here
+        self._hosted_model()
+        with self._introspection_lock:
+            if self._introspection is None:
+                print("📦 Loading the PyTorch model for activations requests...")
+                self._introspection = HostedModel(load_model('torch'))
+            return self._introspection
+
+    def _lookup(self, frame_id, field, max_age=None, spec=None):
+        def usable(entry):
+            value = entry.get(field)
+            return value is not None and (spec is None or value[0] == spec)
+
+        with self._cache_lock:
+            if frame_id is None:
+                candidates = [(fid, e) for fid, e in self._cache.items() if usable(e)]
+                if not candidates:
+                    return None
+                frame_id, entry = max(candidates, key=lambda item: item[0])
+                if max_age is not None and time.time() - entry['timestamp'] > max_age:
+                    return None
+            else:
+                entry = self._cache.get(frame_id)
+                if entry is None or not usable(entry):
+                    return None
+            self.cache_hits += 1
+            return frame_id, entry[field]
+
+    def _newer(self, after_id, spec):
+        # Oldest cached activations newer than after_id, so a stream never skips a cached frame
+        for frame_id in sorted(self._cache):
+            activations = self._cache[frame_id]['activations']
+            if frame_id > after_id and activations is not None and activations[0] == spec:
+                return frame_id, activations[1]
+        return None
+
+    def _run(self, hosted, frame_id):
+        if self.shared_buffer is None:
+            raise LookupError("no shared buffer attached to read frames from")
+        snapshot = self.shared_buffer.read_latest(copy=True)
+        if snapshot is None:
+            raise LookupError("no frame published yet")
+        if frame_id is not None and snapshot.frame_id != frame_id:
+            raise LookupError(f"frame {frame_id} is not cached and no longer the latest frame")
+
+        boxes = detect(hosted, snapshot.frame, self.target_classes, max_boxes=5, timestamp=snapshot.timestamp)
+        activations = hosted.last_activations()
+        self._store(snapshot.frame_id, boxes, activations)
+        return snapshot.frame_id, boxes, activations
+
+    def _store(self, frame_id, boxes, activations):
+        with self._cache_lock:
+            entry = self._cache.setdefault(frame_id, {'boxes': None, 'activations': None})
+            entry['timestamp'] = time.time()
+            if boxes is not None:
+                entry['boxes'] = boxes
+            if activations is not None:
+                entry['activations'] = activations
+            self._cache.move_to_end(frame_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            self._cache_lock.notify_all()
+
+
+class ModelClient:
+    """Connection to a running ModelServer, with the same detect/activations/weights/info methods."""
+
+    def __init__(self, address=MODEL_SERVER_ADDRESS, timeout=CONNECT_TIMEOUT):
+        self.address = address
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._conn = Client(address, family='AF_UNIX', authkey=_read_authkey(address))
+                break
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                if time.monotonic() >= deadline:
+                    raise ConnectionError(f"no model server at {address}") from e
+                time.sleep(0.2)
+        self._lock = threading.Lock()
+
+    def _call(self, op, *args):
+        with self._lock:
+            self._conn.send((op, args))
+            ok, value = self._conn.recv()
+        if not ok:
+            raise RuntimeError(value)
+        return value
+
+    def info(self):
+        return self._call('info')
+
+    def detect(self, frame_id=None):
+        return self._call('detect', frame_id)
+
+    def activations(self, frame_id=None, spec=None):
+        return self._call('activations', frame_id, spec)
+
+    def stream_activations(self, spec=None, stop_event=None):
+        # Streams get their own connection so this client stays usable for other requests
+        conn = Client(self.address, family='AF_UNIX', authkey=_read_authkey(self.address))
+        try:
+            conn.send(('stream', (spec,)))
+            while stop_event is None or not stop_event.is_set():
+                ok, item = conn.recv()
+                if not ok:
+                    raise RuntimeError(item)
+                if item is not None:
+                    yield item
+        finally:
+            conn.close()
+
+    def weights(self, substring='conv'):
+        return self._call('weights', substring)
+
+    def close(self):
+        self._conn.close()
+
+
+def connect(shared_buffer=None, address=MODEL_SERVER_ADDRESS, timeout=CONNECT_TIMEOUT):
+    """ModelClient for the running server, or an in-process ModelServer when none is up."""
+    try:
+        client = ModelClient(address, timeout)
+        print(f"🔌 Connected to model server at {address}")
+        return client
+    except ConnectionError:
+        print(f"⚠️ No model server at {address}, the model is loaded in this process if needed")
+        return ModelServer(None, shared_buffer, address, lazy=True)
@@ -0,0 +1,97 @@
+# app/core/mosaic.py
+
+import time
+
+import cv2
+import numpy as np
+
+from app.core.memory_buffer import SharedFrameBuffer
+from app.core.metrics import MOSAIC_TILES_RENDERED, MOSAIC_COMPOSE_SECONDS
+
+LABEL_COLOR = (255, 255, 255)
+
+
+class MosaicComposer:
+    """Composes downscaled tiles of several SharedFrameBuffers into the frames of its own buffer.
+
+    Tiles are laid out row by row, columns per row (default: the smallest square grid). Each
+    compose() re-renders only the tiles whose camera published a frame since the last
+    composite and publishes a new composite if any did. Stream clients read the output through
+    a FrameEncoder like any camera, so the mosaic is composed and encoded once however many
+    wall displays watch it.
+    """
+
+    def __init__(self, buffers, name='frame_buffer_mosaic', columns=None, tile_size=(320, 240), fps=10,
+                 labels=True):
+        self.buffers = dict(buffers)
+        self.columns = columns or int(np.ceil(np.sqrt(len(self.buffers))))
+        self.rows = int(np.ceil(len(self.buffers) / self.columns))
+        self.tile_size = tuple(tile_size)
+        self.fps = fps
+        self.labels = labels
+        tile_w, tile_h = self.tile_size
+        shape = (self.rows * tile_h, self.columns * tile_w, 3)
+        self.output = SharedFrameBuffer(name=name, shape=shape, create=True)
+        self.composites = 0
+
+        # Composites are built here and copied into the next ring slot whole, slots hold older frames
+        self.canvas = np.zeros(shape, dtype=np.uint8)
+        # A tile is resized here first, so a torn read never reaches the canvas
+        self._scratch = np.empty((tile_h, tile_w, 3), dtype=np.uint8)
+        self.tiles = {}
+        self._shown = {}
+        for i, camera_id in enumerate(self.buffers):
+            x, y = (i % self.columns) * tile_w, (i // self.columns) * tile_h
+            self.tiles[camera_id] = self.canvas[y:y + tile_h, x:x + tile_w]
+            self._shown[camera_id] = -1
+            self._label(camera_id)
+
+    def _label(self, camera_id):
+        if self.labels:
+            cv2.putText(self.tiles[camera_id], str(camera_id), (8, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                        LABEL_COLOR, 2)
+
+    def compose(self):
+        """Re-render the tiles with a new source frame; returns the composite's frame id, or -1 if none changed."""
+        timestamps = []
+        for camera_id, buffer in self.buffers.items():
+            if buffer.latest_frame_id() == self._shown[camera_id]:
+                continue
+            snapshot = buffer.read_latest()
+            if snapshot is None:
+                continue
+            cv2.resize(snapshot.frame, self.tile_size, dst=self._scratch, interpolation=cv2.INTER_AREA)
+            if not buffer.is_current(snapshot.frame_id):
+                continue  # the camera overwrote the slot mid-resize; retried on the next compose
+            np.copyto(self.tiles[camera_id], self._scratch)
+            self._label(camera_id)
+            self._shown[camera_id] = snapshot.frame_id
+            timestamps.append(snapshot.timestamp)
+            MOSAIC_TILES_RENDERED.labels(camera_id).inc()
+
+        if not timestamps:
+            return -1
+        slot = self.output.begin_write()
+        np.copyto(slot, self.canvas)
+        # Stamped with the oldest capture it shows, so stream latency is not understated
+        self.composites += 1
+        return self.output.end_write(timestamp=min(timestamps))
+
+    def run(self, stop_event):
+        interval = 1.0 / self.fps
+        next_at = time.monotonic()
+        print(f"🧩 Mosaic of {len(self.buffers)} cameras, {self.columns}x{self.rows} tiles at {self.fps:g} FPS")
+        while not stop_event.is_set():
+            started = time.perf_counter()
+            try:
+                self.compose()
+            except Exception as e:
+                print(f"⚠️ Mosaic compose error: {e}")
+            MOSAIC_COMPOSE_SECONDS.observe(time.perf_counter() - started)
+            # Fixed rate; a slow compose skips ticks instead of bursting to catch up
+            next_at = max(next_at + interval, time.monotonic())
+            time.sleep(max(0.0, next_at - time.monotonic()))
+
+    def close(self):
+        self.tiles = None
+        self.output.close()
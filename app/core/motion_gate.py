@@ -0,0 +1,91 @@
+# app/core/motion_gate.py
+
+import cv2
+import numpy as np
+
+GATE_SIZE = (160, 120)  # (width, height) the change detector works at
+
+
+def roi_mask(rois, size=GATE_SIZE):
+    """Boolean mask at gate resolution from (x1, y1, x2, y2) rectangles in 0..1 frame coordinates."""
+    width, height = size
+    if not rois:
+        return np.ones((height, width), dtype=bool)
+    mask = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in rois:
+        mask[int(y1 * height):int(np.ceil(y2 * height)), int(x1 * width):int(np.ceil(x2 * width))] = True
+    return mask
+
+
+class MotionGate:
+    """Cheap change detector in front of the detection queue.
+
+    measure() compares a downscaled grey frame with the frame the detector last ran on
+    ('diff') or feeds a MOG2 background subtractor ('mog2'), restricted to the ROI mask,
+    and is cheap enough to run on every frame. check() then answers False while the scene
+    is static so the previous result can be reused, except that a detector run is forced
+    every refresh_interval seconds.
+    """
+
+    def __init__(self, method='diff', pixel_threshold=25, min_changed=0.002,
+                 refresh_interval=10.0, rois=None):
+        self.method = method
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.refresh_interval = refresh_interval
+        self.mask = roi_mask(rois)
+        self.subtractor = None
+        if method == 'mog2':
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(varThreshold=pixel_threshold, detectShadows=False)
+
+        self.frames_checked = 0
+        self.inferences_skipped = 0
+        self.motion_triggers = 0
+        self.forced_refreshes = 0
+        self.changed_fraction = 0.0
+
+        self._reference = None
+        self._current = None
+        self._last_inference = None
+
+    def _changed(self, small):
+        if self.subtractor is not None:
+            changed = self.subtractor.apply(small) > 0
+        elif self._reference is None:
+            return 1.0
+        else:
+            changed = cv2.absdiff(small, self._reference) > self.pixel_threshold
+        return float(changed[self.mask].mean())
+
+    def measure(self, frame):
+        """True if at least min_changed of the ROI differs; check() decides on the frame measured last."""
+        small = cv2.resize(frame, GATE_SIZE, interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        self._current = small
+        self.changed_fraction = self._changed(small)
+        return self.changed_fraction >= self.min_changed
+
+    def check(self, now):
+        """True if the detector should run on the frame measured last."""
+        self.frames_checked += 1
+        if self.changed_fraction >= self.min_changed:
+            self.motion_triggers += 1
+            return True
+        if self._last_inference is None or now - self._last_inference >= self.refresh_interval:
+            self.forced_refreshes += 1
+            return True
+        self.inferences_skipped += 1
+        return False
+
+    def inferred(self, now):
+        # The frame just measured went to the detector; later frames are diffed against it
+        self._reference = self._current
+        self._last_inference = now
+
+    def stats(self):
+        return {
+            'frames_checked': self.frames_checked,
+            'inferences_skipped': self.inferences_skipped,
+            'motion_triggers': self.motion_triggers,
+            'forced_refreshes': self.forced_refreshes,
+        }
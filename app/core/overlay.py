@@ -0,0 +1,19 @@
+# app/core/overlay.py
+
+import time
+import cv2
+
+from config.yolo_config import FRESH_WINDOW  # seconds a detection is drawn green before it greys out
+
+def draw_boxes(frame, boxes, target_classes, current_time=None, fresh_window=FRESH_WINDOW):
+    if current_time is None:
+        current_time = time.time()
+    # boxes is a BOX_DTYPE array; tolist() converts all rows to Python scalars in one call
+    for (x1, y1, x2, y2, conf, class_id, timestamp) in boxes.tolist():
+        is_fresh = current_time - timestamp < fresh_window
+        color = (0, 255, 0) if is_fresh else (128, 128, 128)
+        # The control block may enable classes beyond TARGET_CLASSES, those are labelled by id
+        label = f"{target_classes.get(class_id, class_id)}: {conf:.2f}"
+        cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
@@ -0,0 +1,206 @@
+# app/core/process_detector.py
+
+import os
+import time
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from collections import deque
+from queue import Queue
+
+import numpy as np
+
+from app.core.memory_buffer import SharedFrameBuffer
+from app.core.boxes import BOX_DTYPE, scale_boxes
+from app.core.tiling import detect
+from app.core.metrics import INFERENCE_SECONDS
+
+LATENCY_WINDOW = 1000
+
+
+def _unpack_boxes(payload, timestamp, scale_x=1.0, scale_y=1.0):
+    # Boxes cross the process boundary as the raw bytes of a BOX_DTYPE array
+    boxes = scale_boxes(np.frombuffer(payload, dtype=BOX_DTYPE), scale_x, scale_y)
+    boxes['timestamp'] = timestamp
+    return boxes
+
+
+def _worker_main(index, buffer_name, conn, model_path, target_classes, max_boxes, cpus, roi, tile_size,
+                 control_name):
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    import torch
+    from app.core.model_backend import load_model, warmup_model
+    from app.core.control_block import ControlBlock
+
+    # One intra-op thread per pinned core, otherwise K workers oversubscribe the box
+    torch.set_num_threads(len(cpus) if cpus else max(1, os.cpu_count() // 2))
+    model = load_model(model_path=model_path)
+    warmup_model(model)
+    frames = SharedFrameBuffer(name=buffer_name, create=False)
+    control = ControlBlock(control_name, create=False) if control_name else None
+    snapshot = None
+
+    try:
+        while True:
+            frame_id = conn.recv()
+            if frame_id is None:
+                break
+            snapshot = frames.read_latest()
+            if snapshot is None or snapshot.frame_id != frame_id:
+                conn.send((frame_id, time.time(), b''))
+                continue
+            try:
+                conf = None
+                if control is not None:
+                    settings = control.settings()
+                    target_classes, max_boxes, conf = settings.classes, settings.max_boxes, settings.conf
+                boxes = detect(model, snapshot.frame, target_classes, max_boxes, roi=roi, tile_size=tile_size,
+                               conf=conf)
+                conn.send((frame_id, time.time(), boxes.tobytes()))
+            except Exception as e:
+                print(f"Detection error in worker {index}: {e}")
+                conn.send((frame_id, time.time(), b''))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del snapshot
+        frames.close()
+        if control is not None:
+            control.close()
+
+
+class ProcessDetectionPool:
+    """K detection processes, each with its own model, fed through SharedFrameBuffers.
+
+    submit() copies the frame into an idle worker's input buffer and sends it the
+    frame id; results come back as BOX_DTYPE bytes over a pipe and land on box_queue
+    as (captured_at, boxes), the same format detection_worker produces. Results older
+    than one already delivered are dropped so boxes never step backwards in time. Workers attach to the
+    control block control_name, if given, and follow its detection settings.
+    """
+
+    def __init__(self, model_path, target_classes, num_workers=2, cpu_affinity=None, max_boxes=5,
+                 roi=None, tile_size=None, control_name=None):
+        self.model_path = model_path
+        self.target_classes = target_classes
+        self.num_workers = num_workers
+        self.cpu_affinity = cpu_affinity or [None] * num_workers
+        self.max_boxes = max_boxes
+        self.roi = roi
+        self.tile_size = tile_size
+        self.control_name = control_name
+        self.box_queue = Queue()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.frames_submitted = 0
+        self.results_dropped = 0
+        self.workers_exited = 0
+
+        self._ctx = mp.get_context('spawn')
+        self._lock = threading.Lock()
+        self._shape = None
+        self._buffers = []
+        self._conns = []
+        self._procs = []
+        self._idle = set()
+        self._tasks = {}  # worker index -> (seq, submitted_at, captured_at, frame shape)
+        self._seq = 0
+        self._last_delivered = -1
+
+    @property
+    def started(self):
+        return self._shape is not None
+
+    def start(self, shape, stop_event):
+        self._shape = tuple(shape)
+        for i in range(self.num_workers):
+            name = f"det_in_{os.getpid()}_{i}"
+            buffer = SharedFrameBuffer(name=name, shape=self._shape, create=True, slots=2)
+            parent_conn, child_conn = self._ctx.Pipe()
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(i, name, child_conn, self.model_path, self.target_classes,
+                      self.max_boxes, self.cpu_affinity[i], self.roi, self.tile_size, self.control_name),
+                name=f"detector-{i}",
+                daemon=True
+            )
+            proc.start()
+            child_conn.close()
+            self._buffers.append(buffer)
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+            self._idle.add(i)
+
+        threading.Thread(target=self._collect, args=(stop_event,), daemon=True).start()
+
+    def submit(self, frame, captured_at=None):
+        with self._lock:
+            if not self._idle:
+                return False
+            index = self._idle.pop()
+
+        # The worker's input buffer resizes mismatched frames, boxes are scaled back on return
+        frame_id = self._buffers[index].write(frame)
+        self._seq += 1
+        submitted_at = time.time()
+        self._tasks[index] = (self._seq, submitted_at, submitted_at if captured_at is None else captured_at,
+                              frame.shape)
+        self._conns[index].send(frame_id)
+        self.frames_submitted += 1
+        return True
+
+    def wait_idle(self, timeout=None):
+        """Block until every worker has answered its last frame, delivered or dropped; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if len(self._idle) == self.num_workers:
+                    return True
+            if self.workers_exited:
+                return False  # a worker died, e.g. failed to load its model
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+
+    def _collect(self, stop_event):
+        conns = {conn: i for i, conn in enumerate(self._conns)}
+        while not stop_event.is_set() and conns:
+            for conn in wait(list(conns), timeout=0.5):
+                index = conns[conn]
+                try:
+                    _, finished_at, payload = conn.recv()
+                except (EOFError, OSError):
+                    print(f"⚠️ Detection worker {index} exited")
+                    self.workers_exited += 1
+                    del conns[conn]
+                    continue
+
+                seq, submitted_at, captured_at, frame_shape = self._tasks.pop(index)
+                with self._lock:
+                    self._idle.add(index)
+
+                self.latencies.append(finished_at - submitted_at)
+                INFERENCE_SECONDS.labels('process').observe(finished_at - submitted_at)
+                if seq < self._last_delivered:
+                    self.results_dropped += 1
+                    continue
+                self._last_delivered = seq
+                scale_x = frame_shape[1] / self._shape[1]
+                scale_y = frame_shape[0] / self._shape[0]
+                self.box_queue.put((captured_at, _unpack_boxes(payload, captured_at, scale_x, scale_y)))
+        self.close()
+
+    def close(self):
+        with self._lock:
+            conns, procs, buffers = self._conns, self._procs, self._buffers
+            self._conns, self._procs, self._buffers = [], [], []
+            self._idle.clear()
+        for conn in conns:
+            try:
+                conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for proc in procs:
+            proc.join(timeout=2)
+        for buffer in buffers:
+            buffer.close()
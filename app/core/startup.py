@@ -0,0 +1,72 @@
+# app/core/startup.py
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+from app.core.metrics import STARTUP_PHASE_SECONDS, SERVICE_READY
+
+logger = logging.getLogger(__name__)
+
+# Service states reported by the health routes
+STARTING = 'starting'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class StartupState:
+    """Tracks startup phases and their durations for /health and the startup log."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.status = STARTING
+        self.current = None
+        self.error = None
+        self.phases = {}  # phase -> seconds, in the order they ran
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        began = time.perf_counter()
+        with self._lock:
+            self.current = name
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - began
+            with self._lock:
+                self.phases[name] = round(seconds, 3)
+                self.current = None
+            STARTUP_PHASE_SECONDS.labels(name).set(seconds)
+            print(f"⏱️ Startup phase '{name}' took {seconds:.2f}s")
+            logger.info(f"Startup phase '{name}' took {seconds:.2f}s")
+
+    def set_status(self, status, error=None):
+        with self._lock:
+            self.status = status
+            self.error = error
+        SERVICE_READY.set(1 if status == READY else 0)
+        if status == READY:
+            print(f"✅ Ready {time.time() - self.started:.2f}s after start")
+            logger.info(f"Ready {time.time() - self.started:.2f}s after start: {self.phases}")
+        elif status == FAILED:
+            logger.error(f"Startup failed: {error}")
+
+    def is_ready(self):
+        return self.status == READY
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'status': self.status,
+                'uptime': round(time.time() - self.started, 3),
+                'phase': self.current,
+                'phases': dict(self.phases),
+                'error': self.error,
+            }
+
+
+# One per process; bootstrap/start.py drives it, the health routes read it
+STARTUP = StartupState()
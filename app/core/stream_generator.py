@@ -1,36 +1,180 @@
 # app/core/stream_generator.py
 
-import cv2
 import time
+import struct
 import logging
+import itertools
+from collections import deque
+
+import numpy as np
+
+try:
+    import fcntl
+    import termios
+except ImportError:  # not on Windows; the kernel backlog is then not measured
+    fcntl = termios = None
+
+from app.core.frame_encoder import QUALITY_LEVELS
+from app.core.control_block import current_settings
+from app.core.metrics import (
+    STREAM_CLIENTS, STREAM_FRAMES_SENT, STREAM_BYTES_SENT, STREAM_LATENCY_SECONDS,
+    STREAM_LEVEL_FRAMES, STREAM_LEVEL_CHANGES
+)
 
 logger = logging.getLogger(__name__)
 
-def generate_stream(shared_buffer, stop_event):
+DEFAULT_FPS = 10
+MAX_FPS = 30
+WAIT_TIMEOUT = 0.5  # bound on a single wait so stop_event is noticed promptly
+STATS_WINDOW = 300
+
+# Adaptive quality: a frame should drain within CONGESTION_BUDGET of the client's send interval
+CONGESTION_BUDGET = 0.5
+MAX_STREAM_LATENCY = 1.0  # capture-to-wire seconds beyond which a frame counts as congested
+DOWNGRADE_AFTER = 2       # congested frames in a row before stepping down a level
+UPGRADE_AFTER = 30        # clear frames in a row before trying a level up
+DRAIN_FRACTION = 0.25     # next frame waits until at most this much of the last one is unsent
+BACKLOG_POLL = 0.01
+
+_client_ids = itertools.count(1)
+
+
+class ClientLatency:
+    """Capture-to-wire latency of one stream client over its last STATS_WINDOW frames."""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.samples = deque(maxlen=STATS_WINDOW)
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def record(self, latency):
+        self.samples.append(latency)
+        self.frames_sent += 1
+
+    def summary(self):
+        if not self.samples:
+            return f"client {self.client_id}: no frames sent"
+        ms = np.asarray(self.samples) * 1000.0
+        p50, p95 = np.percentile(ms, [50, 95])
+        return (f"client {self.client_id}: sent={self.frames_sent} skipped={self.frames_skipped} "
+                f"latency p50={p50:.1f}ms p95={p95:.1f}ms max={ms.max():.1f}ms")
+
+
+def unsent_bytes(sock):
+    """Bytes the kernel still holds for the peer (SIOCOUTQ), 0 where that can't be asked."""
+    if sock is None or fcntl is None:
+        return 0
+    try:
+        return struct.unpack('i', fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, b'\0\0\0\0'))[0]
+    except (OSError, ValueError):
+        return 0
+
+
+class AdaptiveQuality:
+    """Picks a client's encoding level (see QUALITY_LEVELS) from how fast it drains frames.
+
+    A frame counts as congested when it took the client more than CONGESTION_BUDGET of the
+    send interval to drain, or reached it more than MAX_STREAM_LATENCY after capture.
+    DOWNGRADE_AFTER congested frames in a row step down a level (smaller, lower quality);
+    UPGRADE_AFTER clear ones step back up, if the measured throughput has room for it.
+    The stream loops hold each frame until the socket backlog of the previous one has
+    drained, so a slow client skips frames instead of queueing stale ones.
+    """
+
+    def __init__(self, send_interval, levels=len(QUALITY_LEVELS), level=None):
+        self.send_interval = send_interval
+        self.levels = levels
+        self.fixed = level is not None
+        self.level = min(max(level, 0), levels - 1) if self.fixed else 0
+        self.throughput = None  # bytes/s, exponentially averaged
+        self._congested = 0
+        self._clear = 0
+
+    def record(self, nbytes, send_seconds, latency):
+        budget = self.send_interval * CONGESTION_BUDGET
+        if send_seconds > 0:
+            rate = nbytes / send_seconds
+            self.throughput = rate if self.throughput is None else 0.8 * self.throughput + 0.2 * rate
+        if self.fixed:
+            return self.level
+
+        if send_seconds > budget or latency > MAX_STREAM_LATENCY:
+            self._clear = 0
+            self._congested += 1
+            if self._congested >= DOWNGRADE_AFTER and self.level < self.levels - 1:
+                self.level += 1
+                self._congested = 0
+                STREAM_LEVEL_CHANGES.labels('down').inc()
+        else:
+            self._congested = 0
+            self._clear += 1
+            # The level above is up to ~2x the bytes; only go there if it would still fit the budget
+            if (self._clear >= UPGRADE_AFTER and self.level > 0
+                    and (self.throughput is None or self.throughput * budget > 2 * nbytes)):
+                self.level -= 1
+                self._clear = 0
+                STREAM_LEVEL_CHANGES.labels('up').inc()
+        return self.level
+
+
+def stream_interval(fps, control=None):
+    # A client's own fps, or else the control block's stream_fps as of now
+    if fps is None:
+        fps = current_settings(control).stream_fps
+    return 1.0 / min(max(fps, 0.1), MAX_FPS)
+
+
+def generate_stream(encoder, stop_event, fps=DEFAULT_FPS, level=None, sock=None, control=None):
+    # level=None adapts to the client's connection, an int pins one of QUALITY_LEVELS.
+    # sock is the client's socket, when the server exposes it, to see its kernel backlog.
+    # fps=None follows the control block's stream_fps, changes apply from the next frame.
     last_sent = 0
-    send_interval = 1.0 / 10  # 10 FPS
-
-    while not stop_event.is_set():
-        now = time.time()
-        if now - last_sent < send_interval:
-            time.sleep(0.005)
-            continue
-
-        try:
-            frame = shared_buffer.read()
-            if frame is None:
-                logger.warning("⚠️ No frame in shared buffer.")
-                time.sleep(0.01)
-                continue
+    last_frame_id = -1
+    send_interval = stream_interval(fps, control)
+    stats = ClientLatency(next(_client_ids))
+    quality = AdaptiveQuality(send_interval, level=level)
+    STREAM_CLIENTS.inc()
+
+    try:
+        while not stop_event.is_set():
+            # Honour the client's FPS cap with one sleep, then wait for a frame we have not sent
+            if fps is None:
+                send_interval = quality.send_interval = stream_interval(None, control)
+            remaining = send_interval - (time.time() - last_sent)
+            if remaining > 0:
+                time.sleep(remaining)
 
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                logger.error("❌ Failed to encode frame as JPEG.")
+            encoded = encoder.wait_next(last_frame_id, timeout=WAIT_TIMEOUT, level=quality.level)
+            if encoded is None:
                 continue
 
-            last_sent = now
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-        except Exception as e:
-            logger.exception("🔥 Exception in generate_stream()")
-            break
+            if last_frame_id >= 0:
+                stats.frames_skipped += encoded.frame_id - last_frame_id - 1
+            last_sent = time.time()
+            last_frame_id = encoded.frame_id
+            chunk = (b'--frame\r\n'
+                     b'Content-Type: image/jpeg\r\n\r\n' + encoded.jpeg + b'\r\n')
+            yield chunk
+
+            # The server resumes us once the chunk has been handed to the socket; on a slow link most
+            # of it may still sit in the kernel send buffer, so wait for that too
+            while unsent_bytes(sock) > len(chunk) * DRAIN_FRACTION and not stop_event.is_set():
+                time.sleep(BACKLOG_POLL)
+            now = time.time()
+            latency = now - encoded.timestamp
+            stats.record(latency)
+            STREAM_LATENCY_SECONDS.observe(latency)
+            STREAM_FRAMES_SENT.inc()
+            STREAM_BYTES_SENT.inc(len(chunk))
+            STREAM_LEVEL_FRAMES.labels(quality.level).inc()
+            quality.record(len(chunk), now - last_sent, latency)
+            if stats.frames_sent % STATS_WINDOW == 0:
+                logger.debug(f"📈 {stats.summary()}")
+    except GeneratorExit:
+        pass
+    except Exception as e:
+        logger.exception("🔥 Exception in generate_stream()")
+    finally:
+        STREAM_CLIENTS.dec()
+        logger.info(f"🔌 Stream closed, {stats.summary()} level={quality.level}")
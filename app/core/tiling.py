@@ -0,0 +1,77 @@
+# app/core/tiling.py
+
+import time
+import numpy as np
+
+from app.core.boxes import extract_boxes, top_boxes, nms, EMPTY_BOXES, NMS_IOU
+
+TILE_OVERLAP = 0.2
+MAX_BOXES_PER_REGION = 100
+
+
+def roi_rect(frame_shape, roi=None):
+    """Pixel rect (x1, y1, x2, y2) of an ROI given in 0..1 frame coordinates (None = whole frame)."""
+    height, width = frame_shape[:2]
+    if roi is None:
+        return 0, 0, width, height
+    x1, y1, x2, y2 = roi
+    return int(x1 * width), int(y1 * height), int(np.ceil(x2 * width)), int(np.ceil(y2 * height))
+
+
+def _starts(length, tile, step):
+    # Fewest tiles that cover `length` with at least the requested overlap, spread evenly
+    if length <= tile:
+        return [0]
+    count = int(np.ceil((length - tile) / step)) + 1
+    return [int(round(v)) for v in np.linspace(0, length - tile, count)]
+
+
+def plan_regions(frame_shape, roi=None, tile_size=None, overlap=TILE_OVERLAP):
+    """Rects the detector should run on: the ROI itself, or overlapping tiles covering it."""
+    x1, y1, x2, y2 = roi_rect(frame_shape, roi)
+    if not tile_size:
+        return [(x1, y1, x2, y2)]
+
+    step = max(1, int(tile_size * (1 - overlap)))
+    return [
+        (x1 + tx, y1 + ty, min(x1 + tx + tile_size, x2), min(y1 + ty + tile_size, y2))
+        for ty in _starts(y2 - y1, tile_size, step)
+        for tx in _starts(x2 - x1, tile_size, step)
+    ]
+
+
+def crop_regions(frame, regions):
+    return [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in regions]
+
+
+def merge_results(results, regions, target_classes, max_boxes, timestamp, nms_iou=NMS_IOU):
+    """Boxes from per-region results, shifted back to full-frame coordinates."""
+    merged = []
+    for result, (x1, y1, _, _) in zip(results, regions):
+        boxes = extract_boxes(result, target_classes, MAX_BOXES_PER_REGION, timestamp)
+        boxes['x1'] += x1
+        boxes['x2'] += x1
+        boxes['y1'] += y1
+        boxes['y2'] += y1
+        merged.append(boxes)
+    if not merged:
+        return EMPTY_BOXES
+    boxes = np.concatenate(merged)
+    if len(regions) > 1:
+        # Objects on a tile seam are detected by both tiles
+        boxes = nms(boxes, nms_iou)
+    return top_boxes(boxes, max_boxes)
+
+
+def detect(model, frame, target_classes, max_boxes, timestamp=None, roi=None, tile_size=None,
+           overlap=TILE_OVERLAP, conf=None):
+    """Run the model on the frame's ROI or its tiles in a single batch and return BOX_DTYPE boxes.
+
+    conf overrides the model's confidence threshold; None keeps the model's default.
+    """
+    regions = plan_regions(frame.shape, roi, tile_size, overlap)
+    options = {} if conf is None else {'conf': conf}
+    results = model(crop_regions(frame, regions), verbose=False, **options)
+    if timestamp is None:
+        timestamp = time.time()
+    return merge_results(results, regions, target_classes, max_boxes, timestamp)
@@ -0,0 +1,83 @@
+# app/core/tracker.py
+
+import numpy as np
+
+from app.core.boxes import BOX_DTYPE, COORDS, iou_matrix
+
+IOU_MATCH = 0.3
+MAX_COAST = 2.0       # seconds a track survives without a matching detection
+VELOCITY_GAIN = 0.5   # alpha-beta filter: how much a new measurement corrects the velocity
+
+
+class BoxTracker:
+    """Propagates detections between model runs with a constant-velocity model.
+
+    update() associates a fresh detection array with existing tracks by greedy IoU and
+    corrects each track's position and velocity (an alpha-beta filter, the fixed-gain
+    form of a Kalman filter). predict() extrapolates every live track to any time, so
+    boxes move at capture rate while the detector runs at a fraction of it.
+    """
+
+    def __init__(self, iou_match=IOU_MATCH, max_coast=MAX_COAST, velocity_gain=VELOCITY_GAIN):
+        self.iou_match = iou_match
+        self.max_coast = max_coast
+        self.velocity_gain = velocity_gain
+        self.boxes = np.empty(0, dtype=BOX_DTYPE)   # position at updated_at, timestamp = last detection
+        self.velocity = np.empty((0, 4), dtype=np.float32)  # px/s for x1, y1, x2, y2
+        self.confirmed = np.empty(0, dtype=bool)    # matched or born in the latest update
+        self.updated_at = 0.0
+
+    def _extrapolate(self, now):
+        boxes = self.boxes.copy()
+        dt = min(now - self.updated_at, self.max_coast)
+        for i, field in enumerate(COORDS):
+            boxes[field] = np.round(self.boxes[field] + self.velocity[:, i] * dt).astype(np.int32)
+        return boxes
+
+    def _associate(self, predicted, detections):
+        if len(predicted) == 0 or len(detections) == 0:
+            return []
+        iou = iou_matrix(predicted, detections)
+        iou[predicted['class_id'][:, None] != detections['class_id'][None, :]] = 0
+        matches = []
+        while iou.max() >= self.iou_match:
+            t, d = np.unravel_index(np.argmax(iou), iou.shape)
+            matches.append((t, d))
+            iou[t, :] = 0
+            iou[:, d] = 0
+        return matches
+
+    def update(self, detections, timestamp):
+        predicted = self._extrapolate(timestamp)
+        matches = self._associate(predicted, detections)
+
+        dt = max(timestamp - self.updated_at, 1e-3)
+        velocity = np.zeros((len(detections), 4), dtype=np.float32)
+        for t, d in matches:
+            measured = np.array([detections[f][d] - self.boxes[f][t] for f in COORDS], dtype=np.float32) / dt
+            velocity[d] = (1 - self.velocity_gain) * self.velocity[t] + self.velocity_gain * measured
+
+        # Tracks without a match keep coasting on their old velocity until max_coast
+        matched_tracks = {t for t, _ in matches}
+        coasting = [t for t in range(len(self.boxes))
+                    if t not in matched_tracks and timestamp - self.boxes['timestamp'][t] < self.max_coast]
+
+        self.boxes = np.concatenate([detections, predicted[coasting]])
+        self.velocity = np.concatenate([velocity, self.velocity[coasting]])
+        self.confirmed = np.arange(len(self.boxes)) < len(detections)
+        self.updated_at = timestamp
+
+    def predict(self, now):
+        """Tracks extrapolated to `now`; tracks confirmed by the latest update read as fresh."""
+        boxes = self._extrapolate(now)
+        alive = now - boxes['timestamp'] < self.max_coast
+        boxes['timestamp'][self.confirmed] = now
+        return boxes[alive]
+
+    def motion(self):
+        """Mean box speed in box-sizes per second, a cheap proxy for scene motion."""
+        if len(self.boxes) == 0:
+            return 0.0
+        size = np.maximum(self.boxes['x2'] - self.boxes['x1'], self.boxes['y2'] - self.boxes['y1'])
+        speed = np.abs(self.velocity).max(axis=1)
+        return float(np.mean(speed / np.maximum(size, 1)))
@@ -0,0 +1,106 @@
+# app/core/weight_atlas.py
+
+import os
+import json
+
+import numpy as np
+
+from app.core.model_backend import file_digest
+from config.yolo_config import MODEL_PATH, MODEL_CACHE_DIR
+
+GAP = 1  # background pixels between kernels
+
+
+def atlas_paths(model_path=MODEL_PATH):
+    """(atlas .npy, index .json) for the model file, keyed by its hash; None if the file is missing.
+
+    Atlases hold the checkpoint's unfused weights (see ModelServer.weights).
+    """
+    if not os.path.exists(model_path):
+        return None
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    base = os.path.join(MODEL_CACHE_DIR, f"{stem}-{file_digest(model_path)}-unfused-atlas")
+    return base + '.npy', base + '.json'
+
+
+def normalize_kernels(weight):
+    """(out, in, kh, kw) weights as uint8, each kernel stretched to 0..255 on its own.
+
+    Works on a float32 copy, the caller's array (possibly a live tensor's memory) is untouched.
+    """
+    w = np.asarray(weight, dtype=np.float32).reshape(weight.shape[0], weight.shape[1], -1)
+    lo = w.min(axis=2, keepdims=True)
+    span = w.max(axis=2, keepdims=True) - lo
+    scaled = (w - lo) / np.maximum(span, 1e-5) * 255.0
+    return scaled.reshape(weight.shape).astype(np.uint8)
+
+
+def _block_shape(shape):
+    out_channels, in_channels, kh, kw = shape
+    return out_channels * (kh + GAP), in_channels * (kw + GAP)
+
+
+def build_atlas(weights, path, index_path):
+    """Tile every kernel of the 4-D weights (name -> array) into one uint8 image on disk.
+
+    Each layer is a block with one row per output filter and one kernel per input channel;
+    blocks are stacked top to bottom in state_dict order. The index records every block's
+    rows and width so a viewer can page through layers by slicing the memmap.
+    """
+    layers = [(name, w) for name, w in weights.items() if np.ndim(w) == 4]
+    blocks = [_block_shape(w.shape) for _, w in layers]
+    height = sum(h for h, _ in blocks)
+    width = max((w for _, w in blocks), default=0)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp.npy'
+    atlas = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8, shape=(height, width))
+    atlas[:] = 0
+
+    index = []
+    y = 0
+    for (name, weight), (block_h, block_w) in zip(layers, blocks):
+        out_channels, in_channels, kh, kw = weight.shape
+        kernels = normalize_kernels(weight)
+        # (out, in, kh, kw) -> (out, kh, in, kw) with a gap after every kernel, then flatten to 2-D
+        padded = np.zeros((out_channels, kh + GAP, in_channels, kw + GAP), dtype=np.uint8)
+        padded[:, :kh, :, :kw] = kernels.transpose(0, 2, 1, 3)
+        atlas[y:y + block_h, :block_w] = padded.reshape(block_h, block_w)
+        index.append({'name': name, 'shape': list(weight.shape), 'y0': y, 'y1': y + block_h, 'width': block_w})
+        y += block_h
+
+    atlas.flush()
+    del atlas
+    os.replace(tmp_path, path)
+    with open(index_path, 'w') as f:
+        json.dump(index, f)
+    return load_atlas(path, index_path)
+
+
+def load_atlas(path, index_path):
+    """(read-only memmap of the whole atlas, list of layer records), or None if not built."""
+    if not (os.path.exists(path) and os.path.exists(index_path)):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    return np.load(path, mmap_mode='r'), index
+
+
+def layer_page(atlas, record):
+    # A view, not a copy: paging costs nothing until the pixels are drawn
+    return atlas[record['y0']:record['y1'], :record['width']]
+
+
+def get_atlas(fetch_weights, model_path=MODEL_PATH, rebuild=False):
+    """The cached atlas for model_path, built from fetch_weights() only when the cache misses."""
+    paths = atlas_paths(model_path)
+    if paths is not None and not rebuild:
+        cached = load_atlas(*paths)
+        if cached is not None:
+            return cached
+    weights = fetch_weights()
+    # The model file may only exist now, if loading the model downloaded it; without a file to
+    # hash the atlas is still written, but never reused
+    paths = atlas_paths(model_path) or (os.path.join(MODEL_CACHE_DIR, 'unkeyed-atlas.npy'),
+                                        os.path.join(MODEL_CACHE_DIR, 'unkeyed-atlas.json'))
+    return build_atlas(weights, *paths)
@@ -1,52 +1,253 @@
 # app/services/video_processor.py
-import cv2
 import threading
 import time
 from queue import Queue
-from ultralytics import YOLO
+
+import cv2
+import numpy as np
 from app.core.detection_worker import detection_worker
-from config.yolo_config import MODEL_PATH, VIDEO_SOURCE, TARGET_CLASSES
+from app.core.boxes import EMPTY_BOXES, scale_boxes
+from app.core.batch_scheduler import BatchScheduler
+from app.core.process_detector import ProcessDetectionPool
+from app.core.overlay import draw_boxes
+from app.core.tracker import BoxTracker
+from app.core.inference_scheduler import AdaptiveScheduler
+from app.core.motion_gate import MotionGate
+from app.core.model_backend import load_model
+from app.core.capture import CaptureReader
+from app.core.frame_pool import FramePool
+from app.core.control_block import current_settings
+from app.core.metrics import (
+    FRAMES_DROPPED, INFERENCES_SKIPPED, BOX_QUEUE_DEPTH, FRAMES_STALE, FRAME_AGE_SECONDS
+)
+from config.yolo_config import (
+    MODEL_PATH, VIDEO_SOURCE, VIDEO_SOURCES, TARGET_CLASSES, MAX_BATCH_SIZE, MAX_BATCH_WAIT_MS,
+    DETECTION_BACKEND, DETECTION_WORKERS, DETECTION_CPU_AFFINITY,
+    ADAPTIVE_INFERENCE, INFERENCE_CPU_BUDGET, INFERENCE_MAX_INTERVAL,
+    MOTION_GATE, MOTION_METHOD, MOTION_PIXEL_THRESHOLD, MOTION_MIN_CHANGED, MOTION_REFRESH_INTERVAL,
+    MOTION_ROIS, CAMERA_ROIS, TILED_INFERENCE, TILE_SIZE,
+    CAPTURE_STALL_TIMEOUT, CAPTURE_BACKOFF_MAX, CAPTURE_MAX_FRAME_AGE
+)
 from app.core.memory_buffer import SharedFrameBuffer
 
-def video_processing(shared_buffer: SharedFrameBuffer, stop_event):
-    model = YOLO(MODEL_PATH)
-    cap = cv2.VideoCapture(VIDEO_SOURCE)
-    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+DEFAULT_CAMERA = next(iter(VIDEO_SOURCES))
+DETECT_TILE_SIZE = TILE_SIZE if TILED_INFERENCE else None
+WORKER_START_TIMEOUT = 300.0  # seconds for every detection worker to load, warm and answer a frame
+
+def camera_loop(source, shared_buffer: SharedFrameBuffer, stop_event, submit_frame, box_queue,
+                camera_id=DEFAULT_CAMERA, pool=None, event_store=None, clip_recorder=None, detection_feed=None,
+                control=None):
+    # Capture runs on its own thread, a stalled or dropped source only pauses this loop.
+    # Frames are decoded into buffers from pool; submit_frame(frame, captured_at) gets a read-only
+    # view and must copy it or pool.retain() it before returning True. box_queue yields
+    # (captured_at, boxes), so the tracker places each result at its frame's capture time.
+    # The control block's inference interval and fresh window are picked up on the frame after they change.
+    pool = pool or FramePool()
+    reader = CaptureReader(source, name=camera_id, stall_timeout=CAPTURE_STALL_TIMEOUT,
+                           backoff_max=CAPTURE_BACKOFF_MAX, pool=pool).start(stop_event)
+    last_boxes = EMPTY_BOXES
+    last_submitted = 0.0
+    tracker = BoxTracker()
+    scheduler = None
+    if ADAPTIVE_INFERENCE:
+        scheduler = AdaptiveScheduler(cpu_budget=INFERENCE_CPU_BUDGET, max_interval=INFERENCE_MAX_INTERVAL)
+    motion_gate = None
+    if MOTION_GATE:
+        motion_gate = MotionGate(method=MOTION_METHOD, pixel_threshold=MOTION_PIXEL_THRESHOLD,
+                                 min_changed=MOTION_MIN_CHANGED, refresh_interval=MOTION_REFRESH_INTERVAL,
+                                 rois=MOTION_ROIS.get(camera_id))
+
+    frames_stale = FRAMES_STALE.labels(camera_id)
+    frame_age = FRAME_AGE_SECONDS.labels(camera_id)
+    frames_dropped = FRAMES_DROPPED.labels(camera_id)
+    inferences_skipped = INFERENCES_SKIPPED.labels(camera_id)
+    box_queue_depth = BOX_QUEUE_DEPTH.labels(camera_id)
+
+    while not stop_event.is_set():
+        captured = reader.read(timeout=0.5)
+        if captured is None:
+            continue
+        frame, captured_at = captured.frame, captured.grabbed_at
+        age = time.time() - captured_at
+        frame_age.observe(age)
+        if age > CAPTURE_MAX_FRAME_AGE:
+            frames_stale.inc()
+            pool.release(frame)
+            continue
+        view = frame.view()
+        view.flags.writeable = False
+
+        settings = current_settings(control)
+        # Hand the frame to the detector if it is ready for one (and the scheduler wants it)
+        detected = False
+        # The motion gate looks at every frame, so a change in an empty scene also wakes the scheduler
+        scene_changed = motion_gate is not None and motion_gate.measure(view)
+        if scheduler is not None:
+            scheduler.min_interval = settings.inference_interval
+            wants_frame = scheduler.should_run(captured_at, tracker.motion(), scene_changed)
+        else:
+            wants_frame = captured_at - last_submitted >= settings.inference_interval
+        if wants_frame and motion_gate is not None and not motion_gate.check(captured_at):
+            # Static scene: re-confirm the previous result instead of running the model again
+            last_boxes = last_boxes.copy()
+            last_boxes['timestamp'] = captured_at
+            detected, detected_at = True, captured_at
+            inferences_skipped.inc()
+            last_submitted = captured_at
+            if scheduler is not None:
+                scheduler.skipped(captured_at)
+        elif wants_frame and submit_frame(view, captured_at):
+            last_submitted = captured_at
+            if scheduler is not None:
+                scheduler.submitted(captured_at)
+            if motion_gate is not None:
+                motion_gate.inferred(captured_at)
+        elif wants_frame:
+            frames_dropped.inc()
+
+        # Retrieve latest detection results
+        box_queue_depth.set(box_queue.qsize())
+        while not box_queue.empty():
+            detected_at, last_boxes = box_queue.get()
+            detected = True
+            if event_store is not None:
+                event_store.append(camera_id, last_boxes)
+            if clip_recorder is not None:
+                clip_recorder.trigger(camera_id, last_boxes)
+
+        now = time.time()
+        boxes = last_boxes
+        if scheduler is not None:
+            # Between detector runs boxes are propagated by the tracker at capture rate
+            if detected:
+                scheduler.completed(now)
+                # A result that outlived a stalled submit is older than the tracks, leave them be
+                if detected_at >= tracker.updated_at:
+                    tracker.update(last_boxes, detected_at)
+            boxes = tracker.predict(now)
 
+        # Copy the raw frame into the next shared-memory slot once and draw the overlay there,
+        # so the pooled frame stays clean for the detector; published with the capture time
+        slot = shared_buffer.begin_write()
+        if frame.shape == slot.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot)
+            boxes = scale_boxes(boxes, slot.shape[1] / frame.shape[1], slot.shape[0] / frame.shape[0])
+        draw_boxes(slot, boxes, TARGET_CLASSES, now, fresh_window=settings.fresh_window)
+        frame_id = shared_buffer.end_write(timestamp=captured_at)
+        if detection_feed is not None:
+            detection_feed.publish(frame, boxes, frame_id, captured_at, slot.shape)
+        pool.release(frame)
+
+def video_processing(shared_buffer: SharedFrameBuffer, stop_event, source=VIDEO_SOURCE, model_server=None,
+                     event_store=None, clip_recorder=None, detection_feeds=None, model=None, control=None,
+                     detection_pool=None):
+    detection_feed = (detection_feeds or {}).get(DEFAULT_CAMERA)
+    if DETECTION_BACKEND == 'process':
+        # Workers load their own models; a model server only answers the debug scripts
+        return process_video_processing(shared_buffer, stop_event, source, event_store=event_store,
+                                        clip_recorder=clip_recorder, detection_feed=detection_feed,
+                                        control=control, detection_pool=detection_pool)
+
+    # On the hosted model the detector's forward passes are cached for the model server's clients;
+    # otherwise use the model bootstrap already loaded and warmed, if any
+    if model_server is not None:
+        model = model_server.model
+    elif model is None:
+        model = load_model()
+
+    pool = FramePool()
     frame_queue = Queue(maxsize=1)
     box_queue = Queue()
-    last_boxes = []
 
     threading.Thread(
         target=detection_worker,
         args=(frame_queue, box_queue, model, stop_event, TARGET_CLASSES),
+        kwargs={'roi': CAMERA_ROIS.get(DEFAULT_CAMERA), 'tile_size': DETECT_TILE_SIZE,
+                'on_result': model_server.record if model_server is not None else None,
+                'release_frame': pool.release, 'control': control},
         daemon=True
     ).start()
 
-    while not stop_event.is_set():
-        ret, frame = cap.read()
-        if not ret:
-            print("Frame grab failed")
-            time.sleep(0.05)
-            continue
+    def submit_frame(frame, captured_at):
+        if not frame_queue.empty():
+            return False
+        # The detector shares the pooled frame; camera_loop publishes it next, under the next frame id
+        pool.retain(frame)
+        frame_queue.put((shared_buffer.next_frame_id(), frame, captured_at))
+        return True
 
-        # Push frame to detection queue if available
-        if frame_queue.empty():
-            frame_queue.put(frame.copy())
+    camera_loop(source, shared_buffer, stop_event, submit_frame, box_queue, pool=pool, event_store=event_store,
+                clip_recorder=clip_recorder, detection_feed=detection_feed, control=control)
 
-        # Retrieve latest detection results
-        while not box_queue.empty():
-            last_boxes = box_queue.get()
+def create_detection_pool(control=None):
+    return ProcessDetectionPool(MODEL_PATH, TARGET_CLASSES, num_workers=DETECTION_WORKERS,
+                                cpu_affinity=DETECTION_CPU_AFFINITY,
+                                roi=CAMERA_ROIS.get(DEFAULT_CAMERA), tile_size=DETECT_TILE_SIZE,
+                                control_name=control.name if control is not None else None)
+
+def start_detection_pool(pool, shape, stop_event, timeout=WORKER_START_TIMEOUT):
+    """Start the workers and block until each has loaded and warmed its model and answered a frame."""
+    pool.start(shape, stop_event)
+    blank = np.zeros(shape, dtype=np.uint8)
+    for _ in range(pool.num_workers):
+        pool.submit(blank)
+    if not pool.wait_idle(timeout):
+        pool.close()
+        raise RuntimeError(f"detection workers exited or not ready after {timeout:g}s")
+    while not pool.box_queue.empty():
+        pool.box_queue.get_nowait()
+    pool.latencies.clear()
+
+def process_video_processing(shared_buffer: SharedFrameBuffer, stop_event, source=VIDEO_SOURCE, event_store=None,
+                             clip_recorder=None, detection_feed=None, control=None, detection_pool=None):
+    # Inference runs in DETECTION_WORKERS processes, this process only captures, draws and serves.
+    # detection_pool may already be started (see start_detection_pool), otherwise it starts on the first frame
+    pool = detection_pool or create_detection_pool(control)
+
+    def submit_frame(frame, captured_at):
+        if not pool.started:
+            pool.start(frame.shape, stop_event)
+        return pool.submit(frame, captured_at)
+
+    try:
+        camera_loop(source, shared_buffer, stop_event, submit_frame, pool.box_queue, event_store=event_store,
+                    clip_recorder=clip_recorder, detection_feed=detection_feed, control=control)
+    finally:
+        pool.close()
+
+def multi_video_processing(shared_buffers, stop_event, model_server=None, event_store=None, clip_recorder=None,
+                           detection_feeds=None, model=None, control=None):
+    # One capture thread per camera in VIDEO_SOURCES, one model shared through a batch scheduler
+    if model_server is not None:
+        model = model_server.model
+    elif model is None:
+        model = load_model()
+    pool = FramePool(max_free=4 * len(VIDEO_SOURCES))
+    scheduler = BatchScheduler(model, TARGET_CLASSES, max_batch_size=MAX_BATCH_SIZE,
+                               max_wait_ms=MAX_BATCH_WAIT_MS, tile_size=DETECT_TILE_SIZE,
+                               release_frame=pool.release, control=control)
+
+    threads = []
+    for camera_id, source in VIDEO_SOURCES.items():
+        box_queue = scheduler.register(camera_id, roi=CAMERA_ROIS.get(camera_id))
 
-        current_time = time.time()
-        for (x1, y1, x2, y2, conf, class_id, timestamp) in last_boxes:
-            is_fresh = current_time - timestamp < 0.3
-            color = (0, 255, 0) if is_fresh else (128, 128, 128)
-            label = f"{TARGET_CLASSES[class_id]}: {conf:.2f}"
-            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-            cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        def submit_frame(frame, captured_at, camera_id=camera_id):
+            if not scheduler.is_idle(camera_id):
+                return False
+            pool.retain(frame)
+            scheduler.submit(camera_id, frame, captured_at)
+            return True
 
-        # Write frame to shared memory
-        shared_buffer.write(frame)
+        threads.append(threading.Thread(
+            target=camera_loop,
+            args=(source, shared_buffers[camera_id], stop_event, submit_frame, box_queue, camera_id, pool,
+                  event_store, clip_recorder, (detection_feeds or {}).get(camera_id), control),
+            name=f"capture-{camera_id}",
+            daemon=True
+        ))
 
-    cap.release()
+    for t in threads:
+        t.start()
+    scheduler.run(stop_event)
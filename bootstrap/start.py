@@ -3,59 +3,181 @@ import os
 import threading
 import signal
 import time
-import queue
 import traceback
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from public.flask_app import create_app
-from app.services.video_processor import video_processing
+from app.services.video_processor import (
+    video_processing, multi_video_processing, create_detection_pool, start_detection_pool, DEFAULT_CAMERA
+)
 from app.core.memory_buffer import SharedFrameBuffer
+from app.core.model_server import ModelServer
+from app.core.model_backend import load_model, warmup_model
+from app.core.startup import STARTUP, WARMING, READY, FAILED
+from app.core.event_store import EventStore
+from app.core.clip_recorder import ClipRecorder
+from app.core.detection_feed import DetectionFeed
+from app.core.frame_encoder import FrameEncoder
+from app.core.control_block import ControlBlock, SETTINGS, parse_setting
+from app.core.mosaic import MosaicComposer
+from config.yolo_config import (
+    VIDEO_SOURCES, MODEL_SERVER, DETECTION_BACKEND, MAX_BATCH_SIZE, EVENT_STORE, EVENT_STORE_DIR, EVENT_FLUSH_INTERVAL,
+    EVENT_SEGMENT_ROWS, EVENT_SEGMENT_SECONDS,
+    CLIP_RECORDING, CLIPS_DIR, CLIP_TRIGGER_CLASSES, CLIP_PRE_ROLL, CLIP_POST_ROLL, CLIP_MAX_SECONDS,
+    CLIP_FPS, CLIP_FOURCC, CLIP_EXTENSION, ASYNC_SERVER, ASYNC_SERVER_PORT, WS_CLEAN_FRAMES,
+    MOSAIC, MOSAIC_CAMERAS, MOSAIC_COLUMNS, MOSAIC_TILE_SIZE, MOSAIC_FPS, CONTROL_BLOCK_NAME
+)
 
 stop_event = threading.Event()
-shared_buffer = SharedFrameBuffer(name="frame_buffer", shape=(480, 640, 3), create=True)
-
-throttle_queue = queue.Queue()
-
-def signal_handler(sig, frame):
-    print('🔌 Signal received, shutting down...')
-    stop_event.set()
-    time.sleep(1)
-    shared_buffer.close()
-    os.system('tmux kill-session -t yolo_debug')
-
-def throttle_writer_thread(speed_file):
-    while not stop_event.is_set():
-        try:
-            while not throttle_queue.empty():
-                delay = throttle_queue.get_nowait()
-                with open(speed_file, 'w') as f:
-                    f.write(str(delay))
-        except Exception as e:
-            print(f"⚠️ Failed to write speed file: {e}")
-            traceback.print_exc()
+
+
+def create_buffers():
+    """Every frame ring the pipeline writes, as (shared_buffer, camera_buffers, detection_feeds, mosaic).
+
+    Only called from main(): detector workers and the clip writer are spawned, which re-imports this
+    module as __mp_main__, and a segment created at import would be unlinked and recreated under the
+    parent, leaving it writing to an orphaned copy.
+    """
+    shared_buffer = SharedFrameBuffer(name="frame_buffer", shape=(480, 640, 3), create=True)
+
+    # Multi-camera mode: the first camera keeps the default buffer so the debug scripts still attach to it
+    camera_buffers = {}
+    if len(VIDEO_SOURCES) > 1:
+        for i, camera_id in enumerate(VIDEO_SOURCES):
+            camera_buffers[camera_id] = shared_buffer if i == 0 else SharedFrameBuffer(
+                name=f"frame_buffer_{camera_id}", shape=(480, 640, 3), create=True)
+
+    # Async server mode: per-camera detection metadata, and clean frames in a second buffer per camera
+    detection_feeds = {}
+    if ASYNC_SERVER:
+        for camera_id, buffer in (camera_buffers or {DEFAULT_CAMERA: shared_buffer}).items():
+            detection_feeds[camera_id] = DetectionFeed(SharedFrameBuffer(
+                name=f"{buffer.name}_raw", shape=buffer.shape, create=True) if WS_CLEAN_FRAMES else None)
+
+    # Wall display mode: every camera tiled into one stream, composed in its own buffer
+    mosaic = None
+    if MOSAIC:
+        all_buffers = camera_buffers or {DEFAULT_CAMERA: shared_buffer}
+        mosaic = MosaicComposer({camera_id: all_buffers[camera_id] for camera_id in MOSAIC_CAMERAS or all_buffers},
+                                columns=MOSAIC_COLUMNS, tile_size=MOSAIC_TILE_SIZE, fps=MOSAIC_FPS)
+    return shared_buffer, camera_buffers, detection_feeds, mosaic
+
+def shutdown_handler(shared_buffer, camera_buffers, detection_feeds, mosaic, control):
+    def signal_handler(sig, frame):
+        print('🔌 Signal received, shutting down...')
+        stop_event.set()
         time.sleep(1)
+        raw_buffers = {feed.raw_buffer for feed in detection_feeds.values() if feed.raw_buffer is not None}
+        for buffer in set(camera_buffers.values()) | {shared_buffer} | raw_buffers:
+            buffer.close()
+        if mosaic is not None:
+            mosaic.close()
+        control.close()
+        os.system('tmux kill-session -t yolo_debug')
+    return signal_handler
 
-if __name__ == "__main__":
+def start_pipeline(shared_buffer, camera_buffers, processing_kwargs):
+    # Runs behind the already-serving HTTP servers, which report its progress on /health
     try:
+        # One model for the detector and the debug scripts, which connect to it over a Unix socket. It listens
+        # from the start, so viewers launched alongside start.py wait for the model instead of loading their own
+        model_server = None
+        if MODEL_SERVER:
+            model_server = ModelServer(None, shared_buffer)
+            threading.Thread(target=model_server.serve, args=(stop_event,), daemon=True).start()
+
+        # The thread backend and the batch scheduler share one in-process model; process workers load their own
+        model = None
+        if MODEL_SERVER or camera_buffers or DETECTION_BACKEND != 'process':
+            with STARTUP.phase('load_model'):
+                model = load_model()
+            STARTUP.set_status(WARMING)
+            with STARTUP.phase('warmup'):
+                warmup_model(model, batch_size=MAX_BATCH_SIZE if camera_buffers else 1)
+
+        if model_server is not None:
+            model_server.set_model(model)
+
+        processing_kwargs = dict(processing_kwargs, model_server=model_server, model=model)
+        if not camera_buffers and DETECTION_BACKEND == 'process':
+            # Not ready until every worker has its model loaded and warm; frames are resized to this shape
+            STARTUP.set_status(WARMING)
+            with STARTUP.phase('detection_workers'):
+                pool = create_detection_pool(processing_kwargs['control'])
+                start_detection_pool(pool, shared_buffer.shape, stop_event)
+            processing_kwargs['detection_pool'] = pool
+        if camera_buffers:
+            threading.Thread(target=multi_video_processing, args=(camera_buffers, stop_event),
+                             kwargs=processing_kwargs, daemon=True).start()
+        else:
+            threading.Thread(target=video_processing, args=(shared_buffer, stop_event),
+                             kwargs=processing_kwargs, daemon=True).start()
+        STARTUP.set_status(READY)
+    except Exception as e:
+        print(f"❌ Startup failed: {e}")
+        traceback.print_exc()
+        STARTUP.set_status(FAILED, str(e))
+
+def main():
+    try:
+        shared_buffer, camera_buffers, detection_feeds, mosaic = create_buffers()
+        # Live settings for the detectors, stream servers and debug scripts. Created here for the same
+        # reason as the buffers; process workers get its name, the viewers attach to CONTROL_BLOCK_NAME
+        control = ControlBlock(CONTROL_BLOCK_NAME, create=True)
+        signal_handler = shutdown_handler(shared_buffer, camera_buffers, detection_feeds, mosaic, control)
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
-        # Start background threads for video and flask
-        threading.Thread(target=video_processing, args=(shared_buffer, stop_event), daemon=True).start()
+        with STARTUP.phase('services'):
+            # Detection history, written in batches by its own thread
+            event_store = None
+            if EVENT_STORE:
+                event_store = EventStore(EVENT_STORE_DIR, flush_interval=EVENT_FLUSH_INTERVAL,
+                                         segment_rows=EVENT_SEGMENT_ROWS, segment_seconds=EVENT_SEGMENT_SECONDS)
+                threading.Thread(target=event_store.run, args=(stop_event,), daemon=True).start()
+
+            # One JPEG encode per annotated frame, shared by every stream server and the clip recorder
+            encoders = [FrameEncoder(buffer) for buffer in set(camera_buffers.values()) | {shared_buffer}]
+            if mosaic is not None:
+                encoders.append(FrameEncoder(mosaic.output))
+                threading.Thread(target=mosaic.run, args=(stop_event,), daemon=True).start()
 
-        app = create_app(shared_buffer, stop_event)
-        threading.Thread(target=lambda: app.run(host='0.0.0.0', port=5000, threaded=True), daemon=True).start()
+            # Pre-roll clips of detections
+            clip_recorder = None
+            if CLIP_RECORDING:
+                clip_recorder = ClipRecorder(camera_buffers or {DEFAULT_CAMERA: shared_buffer}, CLIPS_DIR,
+                                             encoders=encoders, pre_roll=CLIP_PRE_ROLL, post_roll=CLIP_POST_ROLL,
+                                             fps=CLIP_FPS, fourcc=CLIP_FOURCC, extension=CLIP_EXTENSION,
+                                             max_clip=CLIP_MAX_SECONDS, trigger_classes=CLIP_TRIGGER_CLASSES)
+                threading.Thread(target=clip_recorder.run, args=(stop_event,), daemon=True).start()
 
-        # Start throttle writer thread
-        speed_file = os.path.join(os.path.dirname(__file__), '../.throttle')
-        threading.Thread(target=throttle_writer_thread, args=(speed_file,), daemon=True).start()
+        # Serve /health before the model is loaded, orchestrators poll /health/ready for traffic
+        with STARTUP.phase('http'):
+            app = create_app(shared_buffer, stop_event, camera_buffers=camera_buffers, event_store=event_store,
+                             encoders=encoders, control=control, mosaic=mosaic)
+            threading.Thread(target=lambda: app.run(host='0.0.0.0', port=5000, threaded=True), daemon=True).start()
+
+            if ASYNC_SERVER:
+                # aiohttp is optional, only needed for this mode
+                from public.async_app import create_async_app, run_async_app
+                async_app = create_async_app(camera_buffers or {DEFAULT_CAMERA: shared_buffer}, stop_event,
+                                             detection_feeds=detection_feeds, encoders=encoders, control=control)
+                threading.Thread(target=run_async_app, args=(async_app, stop_event),
+                                 kwargs={'port': ASYNC_SERVER_PORT}, daemon=True).start()
+
+        # Model load, warmup and the capture threads
+        processing_kwargs = {'event_store': event_store, 'clip_recorder': clip_recorder,
+                             'detection_feeds': detection_feeds, 'control': control}
+        threading.Thread(target=start_pipeline, args=(shared_buffer, camera_buffers, processing_kwargs),
+                         daemon=True).start()
 
         # Run input loop in MAIN thread so prompt and input work correctly
         while not stop_event.is_set():
             try:
                 print("⏳ Waiting for input in start.py main thread...")
-                cmd = input("Press Enter to update visualizations or type 'exit' or 'speed [float]': ").strip().lower()
+                cmd = input("Press Enter to update visualizations or type 'exit', 'speed [float]', "
+                            "'set [setting] [value]' or 'show': ").strip().lower()
                 print(f"✅ Input received: {cmd}")
                 if cmd == 'exit':
                     stop_event.set()
@@ -63,10 +185,21 @@ if __name__ == "__main__":
                 elif cmd.startswith('speed '):
                     try:
                         delay = float(cmd.split()[1])
-                        throttle_queue.put(delay)
+                        control.update(viewer_delay=delay)
                         print(f"⏱️ Update speed set to {delay} seconds.")
                     except ValueError:
                         print("⚠️ Invalid speed value. Use: speed 2.5")
+                elif cmd.startswith('set '):
+                    parts = cmd.split(maxsplit=2)
+                    try:
+                        if len(parts) < 3:
+                            raise ValueError(f"Use: set [setting] [value], settings: {', '.join(SETTINGS)}")
+                        version = control.update(**{parts[1]: parse_setting(parts[1], parts[2])})
+                        print(f"🎛️ {parts[1]} set to {getattr(control.settings(), parts[1])} (v{version}).")
+                    except ValueError as e:
+                        print(f"⚠️ {e}")
+                elif cmd == 'show':
+                    print(f"🎛️ {control.settings()}")
                 else:
                     print("🔄 Triggered update (handled by each script's internal loop).")
             except EOFError:
@@ -79,9 +212,8 @@ if __name__ == "__main__":
         print(f"❌ Fatal error in start.py: {e}")
         traceback.print_exc()
     finally:
-        try:
-            os.remove(os.path.join(os.path.dirname(__file__), '../.throttle'))
-        except FileNotFoundError:
-            pass
         print("🧹 Exited cleanly.")
         sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import os
+
 TARGET_CLASSES = {
     0: "person",
     46: "banana",
@@ -6,4 +8,125 @@ TARGET_CLASSES = {
 }
 
 MODEL_PATH = 'yolov8n.pt'
+# Inference backend: 'torch' (eager PyTorch), 'onnx' (ONNX Runtime) or 'openvino'. Other than
+# torch, the model is exported from MODEL_PATH once and cached in MODEL_CACHE_DIR; MODEL_INT8
+# adds dynamic (ONNX) or calibrated (OpenVINO) INT8 quantization.
+MODEL_BACKEND = 'torch'
+MODEL_INT8 = False
+MODEL_CACHE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.model_cache'))
+# Inferences on test_frame.jpg before the first camera frame; /health reports 'warming' until done
+WARMUP_RUNS = 2
 VIDEO_SOURCE = 'http://10.0.0.219:8080/video'
+# Capture: a source silent for CAPTURE_STALL_TIMEOUT seconds is reopened, failed opens retry with
+# exponential backoff up to CAPTURE_BACKOFF_MAX. Frames older than CAPTURE_MAX_FRAME_AGE when the
+# pipeline gets to them are dropped rather than detected and streamed late.
+CAPTURE_STALL_TIMEOUT = 3.0
+CAPTURE_BACKOFF_MAX = 30.0
+CAPTURE_MAX_FRAME_AGE = 0.5
+
+# Multi-camera mode: one capture thread per source, detections batched into one model call
+VIDEO_SOURCES = {
+    'cam0': VIDEO_SOURCE,
+}
+MAX_BATCH_SIZE = 8
+MAX_BATCH_WAIT_MS = 20
+
+# Detection backend: 'thread' runs the model next to capture, 'process' runs DETECTION_WORKERS
+# processes with their own model. DETECTION_CPU_AFFINITY optionally pins worker i to a CPU list.
+DETECTION_BACKEND = 'thread'
+DETECTION_WORKERS = 2
+DETECTION_CPU_AFFINITY = None  # e.g. [[0, 1], [2, 3]]
+
+# Control plane: the live-tunable settings below start at these values and can be changed at the
+# start.py prompt ('set conf 0.4', 'set classes person,mouse'). They are kept in the shared-memory
+# control block CONTROL_BLOCK_NAME, which detectors, stream servers and the debug scripts read on
+# every frame. STREAM_FPS is the rate of stream clients that don't ask for one; INFERENCE_INTERVAL
+# is the shortest time between detector runs; FRESH_WINDOW is how long a box is drawn green;
+# VIEWER_DELAY is the seconds per update of the debug viewers.
+CONTROL_BLOCK_NAME = 'pipeline_control'
+STREAM_FPS = 10
+DETECT_CONF = 0.25
+MAX_BOXES = 5
+INFERENCE_INTERVAL = 0.0
+FRESH_WINDOW = 0.3
+VIEWER_DELAY = 5.0
+
+# Adaptive inference: run the detector on a fraction of frames and track boxes in between.
+# The detector may be busy at most INFERENCE_CPU_BUDGET of the time; still scenes back off
+# to one run per INFERENCE_MAX_INTERVAL seconds.
+ADAPTIVE_INFERENCE = True
+INFERENCE_CPU_BUDGET = 0.5
+INFERENCE_MAX_INTERVAL = 1.0
+
+# Motion gate: skip the detector while the scene is static and reuse the previous result.
+# MOTION_METHOD is 'diff' (against the last inferred frame) or 'mog2' (background subtractor).
+MOTION_GATE = True
+MOTION_METHOD = 'diff'
+MOTION_PIXEL_THRESHOLD = 25     # grey-level change that counts a pixel as changed
+MOTION_MIN_CHANGED = 0.002      # fraction of ROI pixels that must change to run the detector
+MOTION_REFRESH_INTERVAL = 10.0  # force a detector run at least this often (seconds)
+MOTION_ROIS = {}                # camera_id -> [(x1, y1, x2, y2), ...] in 0..1 frame coordinates
+
+# Detection ROI per camera as (x1, y1, x2, y2) in 0..1 frame coordinates; the detector only sees
+# this crop. With TILED_INFERENCE the ROI (or whole frame) is split into overlapping TILE_SIZE
+# tiles that run as one batch, so small objects are not lost to letterbox downscaling.
+CAMERA_ROIS = {}
+TILED_INFERENCE = False
+TILE_SIZE = 320
+
+# Event store: every detector result is logged per camera under EVENT_STORE_DIR for history
+# queries (/events). Writes are batched every EVENT_FLUSH_INTERVAL seconds; segments are sealed
+# and indexed by class and time after EVENT_SEGMENT_ROWS rows or EVENT_SEGMENT_SECONDS.
+EVENT_STORE = True
+EVENT_STORE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../events'))
+EVENT_FLUSH_INTERVAL = 1.0
+EVENT_SEGMENT_ROWS = 500_000
+EVENT_SEGMENT_SECONDS = 600.0
+
+# Clip recording: when a detection of CLIP_TRIGGER_CLASSES (None: any of TARGET_CLASSES) fires,
+# the annotated stream from CLIP_PRE_ROLL seconds before it until CLIP_POST_ROLL seconds after the
+# last one is saved to CLIPS_DIR. The pre-roll ring holds CLIP_PRE_ROLL * CLIP_FPS JPEG frames per
+# camera; video encoding runs in a background process with an OpenCV software codec.
+CLIP_RECORDING = False
+CLIPS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../clips'))
+CLIP_TRIGGER_CLASSES = None     # e.g. [0]
+CLIP_PRE_ROLL = 5.0
+CLIP_POST_ROLL = 10.0
+CLIP_MAX_SECONDS = 120.0
+CLIP_FPS = 10.0
+CLIP_FOURCC = 'mp4v'
+CLIP_EXTENSION = '.mp4'
+
+# Async stream server (needs aiohttp): serves MJPEG at / and /camera/<id> plus a WebSocket at /ws
+# and /ws/<id> from one event loop on ASYNC_SERVER_PORT, next to the Flask app. WebSocket clients
+# get JPEG frames and detection metadata as separate binary messages and draw boxes themselves;
+# with WS_CLEAN_FRAMES the frames are published un-annotated to a second shared buffer.
+ASYNC_SERVER = False
+ASYNC_SERVER_PORT = 5001
+WS_CLEAN_FRAMES = True
+
+# Mosaic wall stream at /mosaic: the annotated frames of MOSAIC_CAMERAS (None: all cameras, in
+# VIDEO_SOURCES order) as MOSAIC_TILE_SIZE (width, height) tiles, MOSAIC_COLUMNS per row (None:
+# a square grid). Composed at MOSAIC_FPS into its own shared buffer and encoded once for all clients;
+# only tiles whose camera has a new frame are redrawn.
+MOSAIC = False
+MOSAIC_CAMERAS = None
+MOSAIC_COLUMNS = None
+MOSAIC_TILE_SIZE = (320, 240)
+MOSAIC_FPS = 10.0
+
+# Model server: the detector process shares its model with the debug scripts over a Unix socket,
+# so they neither load YOLO again nor repeat forward passes the detector already ran. While a
+# viewer is polling, the outputs of ACTIVATION_LAYERS (qualified names or fnmatch patterns; None
+# means every ACTIVATION_LAYER_TYPES module) are reduced on the model's device to their first
+# ACTIVATION_MAX_CHANNELS channels at most ACTIVATION_SIZE pixels across, and kept for the last
+# ACTIVATION_CACHE_SIZE frames. Clients can ask for a different ActivationSpec per request.
+# Clients authenticate with a key the server writes to MODEL_SERVER_ADDRESS + '.key' (mode 0600),
+# so only the user running the pipeline can talk to it.
+MODEL_SERVER = True
+MODEL_SERVER_ADDRESS = '/tmp/yolo_model_server.sock'
+ACTIVATION_LAYERS = None        # e.g. ['model.2.*', 'model.9']
+ACTIVATION_LAYER_TYPES = ('Conv',)
+ACTIVATION_MAX_CHANNELS = 8
+ACTIVATION_SIZE = 80
+ACTIVATION_CACHE_SIZE = 16
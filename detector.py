@@ -86,8 +86,9 @@ def video_processing():
             cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
             cv2.putText(frame, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
 
+        # cap.read() returns a new array every time, so handing over the reference is enough
         with lock:
-            output_frame = frame.copy()
+            output_frame = frame
 
     cap.release()
 
@@ -0,0 +1,283 @@
+# public/async_app.py
+
+import json
+import time
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from aiohttp import web, WSMsgType
+
+from app.core.frame_encoder import FrameEncoder
+from app.core.startup import STARTUP
+from app.core.detection_feed import pack_frame, pack_detections, FRAME_HEADER, DETECTIONS_HEADER, WIRE_BOX_DTYPE
+from app.core.stream_generator import (
+    DEFAULT_FPS, MAX_FPS, WAIT_TIMEOUT, DRAIN_FRACTION, BACKLOG_POLL, AdaptiveQuality, unsent_bytes,
+    stream_interval
+)
+from app.core.metrics import (
+    render_prometheus, STREAM_CLIENTS, STREAM_FRAMES_SENT, STREAM_BYTES_SENT, STREAM_LATENCY_SECONDS,
+    STREAM_LEVEL_FRAMES, WS_CLIENTS, WS_MESSAGES_SENT, WS_BYTES_SENT
+)
+from config.yolo_config import TARGET_CLASSES
+
+logger = logging.getLogger(__name__)
+
+
+class Broadcast:
+    """Fans one source out to every client on the event loop.
+
+    A single thread blocks in wait_next (a FrameEncoder or DetectionFeed) while anyone is
+    subscribed; each new item is packed once and every client awaits the shared bytes, so a
+    viewer costs a coroutine, not a thread or an encode.
+    """
+
+    def __init__(self, wait_next, pack):
+        self.wait_next = wait_next
+        self.pack = pack
+        self.latest = None  # (frame_id, item, packed bytes)
+        self.subscribers = 0
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._cond = asyncio.Condition()
+        self._task = None
+
+    @asynccontextmanager
+    async def subscribe(self):
+        self.subscribers += 1
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            yield self
+        finally:
+            self.subscribers -= 1
+
+    async def next(self, after_frame_id, timeout=WAIT_TIMEOUT):
+        """The newest (frame_id, item, data) after after_frame_id, or None after timeout."""
+        def is_new():
+            return self.latest is not None and self.latest[0] > after_frame_id
+        async with self._cond:
+            try:
+                await asyncio.wait_for(self._cond.wait_for(is_new), timeout)
+            except asyncio.TimeoutError:
+                return None
+            return self.latest
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        last_frame_id = self.latest[0] if self.latest is not None else -1
+        try:
+            while self.subscribers:
+                item = await loop.run_in_executor(self._executor, self.wait_next, last_frame_id, WAIT_TIMEOUT)
+                if item is None:
+                    continue
+                last_frame_id = item.frame_id
+                data = self.pack(item)
+                async with self._cond:
+                    self.latest = (item.frame_id, item, data)
+                    self._cond.notify_all()
+        finally:
+            self._task = None
+
+
+def _fps(value):
+    return min(max(float(value), 0.1), MAX_FPS)
+
+
+def create_async_app(buffers, stop_event, detection_feeds=None, encoders=(), control=None):
+    """aiohttp app serving MJPEG and WebSocket streams of buffers (camera_id -> SharedFrameBuffer).
+
+    The first camera is also served at / and /ws. detection_feeds (camera_id -> DetectionFeed)
+    enable the WebSocket endpoints; their raw buffers, when set, provide the un-annotated frames.
+    MJPEG clients without ?fps follow the control block's stream_fps.
+    """
+    detection_feeds = detection_feeds or {}
+    default_camera = next(iter(buffers))
+    existing = {id(e.shared_buffer): e for e in encoders}
+
+    def encoder_for(buffer):
+        if id(buffer) not in existing:
+            existing[id(buffer)] = FrameEncoder(buffer)
+        return existing[id(buffer)]
+
+    # One broadcast per quality level; frame ids are shared, so a client can switch levels between frames
+    jpeg_streams = {}
+    for camera_id, buffer in buffers.items():
+        encoder = encoder_for(buffer)
+        jpeg_streams[camera_id] = [Broadcast(functools.partial(encoder.wait_next, level=level), lambda e: e)
+                                   for level in range(len(encoder.levels))]
+    ws_frames = {camera_id: Broadcast(encoder_for(buffers[camera_id] if feed.raw_buffer is None else feed.raw_buffer).wait_next, pack_frame)
+                 for camera_id, feed in detection_feeds.items()}
+    ws_detections = {camera_id: Broadcast(feed.wait_next, pack_detections)
+                     for camera_id, feed in detection_feeds.items()}
+
+    async def mjpeg(request):
+        camera_id = request.match_info.get('camera_id', default_camera)
+        if camera_id not in jpeg_streams:
+            return web.Response(status=404, text=f"Unknown camera '{camera_id}'")
+        try:
+            fps = _fps(request.query['fps']) if 'fps' in request.query else None
+            level = int(request.query['level']) if 'level' in request.query else None
+        except ValueError:
+            return web.Response(status=400, text="Bad fps or level")
+        streams = jpeg_streams[camera_id]
+        quality = AdaptiveQuality(stream_interval(fps, control), levels=len(streams), level=level)
+        response = web.StreamResponse(headers={'Content-Type': 'multipart/x-mixed-replace; boundary=frame'})
+        await response.prepare(request)
+        logger.info(f"🔌 Client connected to {request.path} at {'live' if fps is None else f'{fps:g}'} FPS (async).")
+
+        loop = asyncio.get_running_loop()
+        last_frame_id, last_sent = -1, 0.0
+        transport = request.transport
+        sock = transport.get_extra_info('socket') if transport is not None else None
+
+        def backlog():
+            if transport is None or transport.is_closing():
+                return 0
+            return transport.get_write_buffer_size() + unsent_bytes(sock)
+
+        STREAM_CLIENTS.inc()
+        try:
+            while not stop_event.is_set():
+                level = quality.level
+                async with streams[level].subscribe() as stream:
+                    while not stop_event.is_set() and quality.level == level:
+                        if fps is None:
+                            quality.send_interval = stream_interval(None, control)
+                        remaining = quality.send_interval - (loop.time() - last_sent)
+                        if remaining > 0:
+                            await asyncio.sleep(remaining)
+                        latest = await stream.next(last_frame_id)
+                        if latest is None:
+                            continue
+                        last_frame_id, encoded, _ = latest
+                        last_sent = loop.time()
+                        chunk = b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + encoded.jpeg + b'\r\n'
+                        await response.write(chunk)
+                        # write() returns once the transport took the chunk; wait until the client
+                        # has drained it from the transport and kernel buffers too
+                        while backlog() > len(chunk) * DRAIN_FRACTION and not stop_event.is_set():
+                            await asyncio.sleep(BACKLOG_POLL)
+                        latency = time.time() - encoded.timestamp
+                        quality.record(len(chunk), loop.time() - last_sent, latency)
+                        STREAM_LATENCY_SECONDS.observe(latency)
+                        STREAM_FRAMES_SENT.inc()
+                        STREAM_BYTES_SENT.inc(len(chunk))
+                        STREAM_LEVEL_FRAMES.labels(level).inc()
+        except ConnectionError:
+            pass
+        finally:
+            STREAM_CLIENTS.dec()
+        return response
+
+    async def pump(ws, stream, kind, state):
+        # Newest-wins: a client slower than the source skips to the latest item after each send
+        loop = asyncio.get_running_loop()
+        last_frame_id, last_sent = -1, 0.0
+        try:
+            async with stream.subscribe():
+                while not ws.closed and not stop_event.is_set():
+                    remaining = 1.0 / state['fps'] - (loop.time() - last_sent)
+                    if remaining > 0:
+                        await asyncio.sleep(remaining)
+                    latest = await stream.next(last_frame_id)
+                    if latest is None:
+                        continue
+                    last_frame_id, _, data = latest
+                    last_sent = loop.time()
+                    await ws.send_bytes(data)
+                    WS_MESSAGES_SENT.labels(kind).inc()
+                    WS_BYTES_SENT.labels(kind).inc(len(data))
+        except ConnectionError:
+            pass
+
+    async def websocket(request):
+        # ?frames=0 subscribes to detections only; text messages {"frames": bool, "fps": n} change it live
+        camera_id = request.match_info.get('camera_id', default_camera)
+        if camera_id not in ws_detections:
+            return web.Response(status=404, text=f"No detection feed for camera '{camera_id}'")
+        try:
+            state = {'fps': _fps(request.query.get('fps', DEFAULT_FPS))}
+        except ValueError:
+            return web.Response(status=400, text="Bad fps")
+        send_frames = request.query.get('frames', '1') not in ('0', 'false', 'no')
+
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        await ws.send_json({
+            'camera': camera_id,
+            'clean_frames': detection_feeds[camera_id].raw_buffer is not None,
+            'classes': {str(k): v for k, v in TARGET_CLASSES.items()},
+            'frame_header': FRAME_HEADER.format,
+            'detections_header': DETECTIONS_HEADER.format,
+            'box_fields': [[name, WIRE_BOX_DTYPE[name].str] for name in WIRE_BOX_DTYPE.names],
+        })
+
+        loop = asyncio.get_running_loop()
+        tasks = {'detections': loop.create_task(pump(ws, ws_detections[camera_id], 'detections', state))}
+        if send_frames:
+            tasks['frames'] = loop.create_task(pump(ws, ws_frames[camera_id], 'frames', state))
+        WS_CLIENTS.inc()
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    message = json.loads(msg.data)
+                    if not isinstance(message, dict):
+                        raise TypeError
+                    if 'fps' in message:
+                        state['fps'] = _fps(message['fps'])
+                except (ValueError, TypeError):
+                    await ws.send_json({'error': 'expected {"frames": bool, "fps": number}'})
+                    continue
+                if message.get('frames') and 'frames' not in tasks:
+                    tasks['frames'] = loop.create_task(pump(ws, ws_frames[camera_id], 'frames', state))
+                elif message.get('frames') is False and 'frames' in tasks:
+                    tasks.pop('frames').cancel()
+        finally:
+            WS_CLIENTS.dec()
+            for task in tasks.values():
+                task.cancel()
+        return ws
+
+    async def health(request):
+        return web.json_response(STARTUP.snapshot())
+
+    async def ready(request):
+        return web.json_response(STARTUP.snapshot(), status=200 if STARTUP.is_ready() else 503)
+
+    async def metrics(request):
+        return web.Response(text=render_prometheus(), content_type='text/plain')
+
+    app = web.Application()
+    app.add_routes([
+        web.get('/', mjpeg),
+        web.get('/camera/{camera_id}', mjpeg),
+        web.get('/ws', websocket),
+        web.get('/ws/{camera_id}', websocket),
+        web.get('/health', health),
+        web.get('/health/ready', ready),
+        web.get('/metrics', metrics),
+    ])
+    return app
+
+
+def run_async_app(app, stop_event, host='0.0.0.0', port=5001):
+    """Serve app from an event loop on the calling thread until stop_event is set."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    loop.run_until_complete(web.TCPSite(runner, host, port).start())
+    print(f"🌐 Async stream server on http://{host}:{port} (MJPEG /, WebSocket /ws)")
+    try:
+        loop.run_until_complete(loop.run_in_executor(None, stop_event.wait))
+    finally:
+        loop.run_until_complete(runner.cleanup())
+        pending = asyncio.all_tasks(loop)  # broadcasts still waiting on their source
+        for task in pending:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.close()
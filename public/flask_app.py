@@ -1,10 +1,17 @@
 # public/flask_app.py
 
 import os
+import time
 import logging
-from flask import Flask, Response, stream_with_context
-from app.core.stream_generator import generate_stream
+from flask import Flask, Response, request, stream_with_context, jsonify
+from app.core.stream_generator import generate_stream, MAX_FPS
+from app.core.frame_encoder import FrameEncoder
 from app.core.memory_buffer import SharedFrameBuffer
+from app.core.metrics import render_prometheus
+from app.core.capture import capture_health, STREAMING
+from app.core.startup import STARTUP
+from app.core.control_block import current_settings
+from config.yolo_config import TARGET_CLASSES
 
 LOG_FILE = os.path.join(os.path.dirname(__file__), '../logs/flask_app.log')
 
@@ -18,23 +25,141 @@ logging.basicConfig(
     format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s'
 )
 
-def create_app(shared_buffer: SharedFrameBuffer, stop_event):
+def _event_filters():
+    # ?start=&end= are unix seconds, negative values are relative to now (start=-3600: last hour);
+    # ?class= takes an id or a TARGET_CLASSES name
+    now = time.time()
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    start = now + start if start is not None and start < 0 else start
+    end = now + end if end is not None and end < 0 else end
+    class_id = request.args.get('class')
+    if class_id is not None:
+        names = {name: cid for cid, name in TARGET_CLASSES.items()}
+        class_id = names[class_id] if class_id in names else int(class_id)
+    return {'start': start, 'end': end, 'class_id': class_id, 'camera_id': request.args.get('camera')}
+
+def create_app(shared_buffer: SharedFrameBuffer, stop_event, camera_buffers=None, event_store=None, encoders=(),
+               control=None, mosaic=None):
     app = Flask(__name__)
+    # FrameEncoders shared with other consumers (async server, clip recorder) are reused for their buffers
+    existing = {id(e.shared_buffer): e for e in encoders}
+
+    def encoder_for(buffer):
+        if id(buffer) not in existing:
+            existing[id(buffer)] = FrameEncoder(buffer)
+        return existing[id(buffer)]
+
+    encoder = encoder_for(shared_buffer)
+    camera_encoders = {
+        camera_id: encoder_for(buffer)
+        for camera_id, buffer in (camera_buffers or {}).items()
+    }
+    # The mosaic's output buffer streams like a camera: one encode per composite for every wall client
+    mosaic_encoder = encoder_for(mosaic.output) if mosaic is not None else None
+
+    def stream_response(frame_encoder):
+        # Each viewer picks its own rate with ?fps=N, without one it follows the control block's
+        # stream_fps; encoding stays shared. Quality adapts to the viewer's connection unless
+        # pinned with ?level=N (0 = full size)
+        fps = request.args.get('fps', type=float)
+        if fps is not None:
+            fps = min(max(fps, 0.1), MAX_FPS)
+        level = request.args.get('level', type=int)
+        logging.info(f"🔌 Client connected to {request.path} at {'live' if fps is None else f'{fps:g}'} FPS.")
+        return Response(
+            stream_with_context(generate_stream(frame_encoder, stop_event, fps=fps, level=level,
+                                                sock=request.environ.get('werkzeug.socket'), control=control)),
+            mimetype='multipart/x-mixed-replace; boundary=frame'
+        )
 
     @app.route('/')
     def video_feed():
         try:
-            logging.info("🔌 Client connected to video feed.")
-            return Response(
-                stream_with_context(generate_stream(shared_buffer, stop_event)),
-                mimetype='multipart/x-mixed-replace; boundary=frame'
-            )
+            return stream_response(encoder)
         except Exception as e:
             logging.exception("❌ Error in video_feed route")
             return "Internal Server Error", 500
 
+    @app.route('/camera/<camera_id>')
+    def camera_feed(camera_id):
+        if camera_id not in camera_encoders:
+            return f"Unknown camera '{camera_id}'", 404
+        try:
+            return stream_response(camera_encoders[camera_id])
+        except Exception as e:
+            logging.exception("❌ Error in camera_feed route")
+            return "Internal Server Error", 500
+
+    @app.route('/mosaic')
+    def mosaic_feed():
+        if mosaic_encoder is None:
+            return "Mosaic disabled", 404
+        try:
+            return stream_response(mosaic_encoder)
+        except Exception as e:
+            logging.exception("❌ Error in mosaic_feed route")
+            return "Internal Server Error", 500
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
     @app.route('/health')
     def health_check():
-        return "✅ Flask server running", 200
+        # Liveness: the server answers as soon as it is up, the body tells how far startup got
+        return jsonify(STARTUP.snapshot()), 200
+
+    @app.route('/health/ready')
+    def readiness_check():
+        return jsonify(STARTUP.snapshot()), 200 if STARTUP.is_ready() else 503
+
+    @app.route('/control')
+    def control_settings():
+        # Read-only; settings are changed at the start.py prompt
+        settings = current_settings(control)._asdict()
+        settings['classes'] = {str(c): TARGET_CLASSES.get(c, str(c)) for c in settings['classes']}
+        return jsonify(settings)
+
+    @app.route('/events')
+    def events():
+        if event_store is None:
+            return "Event store disabled", 404
+        try:
+            filters = _event_filters()
+        except ValueError:
+            return "Bad start/end/class", 400
+        limit = min(request.args.get('limit', 100, type=int), 10000)
+        found = event_store.query(**filters, limit=limit)
+        return jsonify({'count': event_store.count(**filters),
+                        'events': event_store.to_dicts(found, TARGET_CLASSES)})
+
+    @app.route('/events/count')
+    def events_count():
+        if event_store is None:
+            return "Event store disabled", 404
+        try:
+            return jsonify({'count': event_store.count(**_event_filters())})
+        except ValueError:
+            return "Bad start/end/class", 400
+
+    @app.route('/events/last_seen')
+    def events_last_seen():
+        if event_store is None:
+            return "Event store disabled", 404
+        try:
+            filters = _event_filters()
+        except ValueError:
+            return "Bad start/end/class", 400
+        if filters['class_id'] is None:
+            return "?class= is required", 400
+        found = event_store.last_seen(filters['class_id'], filters['camera_id'], before=filters['end'])
+        return jsonify({'event': event_store.to_dicts([found], TARGET_CLASSES)[0] if found is not None else None})
+
+    @app.route('/health/capture')
+    def capture_health_check():
+        sources = capture_health()
+        healthy = bool(sources) and all(s['state'] == STREAMING for s in sources.values())
+        return jsonify(sources), 200 if healthy else 503
 
     return app
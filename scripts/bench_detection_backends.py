@@ -0,0 +1,124 @@
+import sys
+import os
+import argparse
+import threading
+import time
+from collections import deque
+from queue import Queue, Empty
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.detection_worker import detection_worker
+from app.core.process_detector import ProcessDetectionPool
+from app.core.model_backend import load_model
+from config.yolo_config import MODEL_PATH, TARGET_CLASSES
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+WARMUP_TIMEOUT = 300.0  # seconds for every worker to load its model and answer one frame
+
+
+def load_frame():
+    frame = cv2.imread(TEST_FRAME)
+    if frame is None:
+        frame = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
+    return frame
+
+
+def report(name, results, elapsed, latencies):
+    ms = np.asarray(latencies) * 1000.0 if latencies else np.zeros(1)
+    p50, p99 = np.percentile(ms, [50, 99])
+    print(f"{name:<22}{results / elapsed:>8.1f} FPS   p50={p50:7.1f}ms   p99={p99:7.1f}ms   n={results}")
+
+
+def bench_thread(frame, duration, capture_fps):
+    stop_event = threading.Event()
+    frame_queue = Queue(maxsize=1)
+    box_queue = Queue()
+    threading.Thread(
+        target=detection_worker,
+        args=(frame_queue, box_queue, load_model(), stop_event, TARGET_CLASSES),
+        daemon=True
+    ).start()
+
+    # Warm up so model initialisation is not counted
+    frame_queue.put((None, frame.copy(), time.time()))
+    box_queue.get()
+
+    submitted = deque()
+    latencies = []
+    results = 0
+    start = time.time()
+    while time.time() - start < duration:
+        if frame_queue.empty():
+            submitted.append(time.time())
+            frame_queue.put((None, frame.copy(), submitted[-1]))
+        try:
+            box_queue.get(timeout=1.0 / capture_fps)
+            latencies.append(time.time() - submitted.popleft())
+            results += 1
+        except Empty:
+            pass
+    elapsed = time.time() - start
+    stop_event.set()
+    report("thread", results, elapsed, latencies)
+
+
+def bench_process(frame, duration, capture_fps, workers, pin):
+    stop_event = threading.Event()
+    affinity = None
+    if pin:
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // workers)
+        affinity = [cpus[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+    pool = ProcessDetectionPool(MODEL_PATH, TARGET_CLASSES, num_workers=workers, cpu_affinity=affinity)
+    pool.start(frame.shape, stop_event)
+
+    # Warm up every worker (model load happens in the child). Out-of-order results are dropped
+    # by the pool, so wait for the workers to go idle rather than for one result each
+    for _ in range(workers):
+        while not pool.submit(frame):
+            time.sleep(0.01)
+    if not pool.wait_idle(timeout=WARMUP_TIMEOUT):
+        print(f"❌ Detection workers did not finish warming up within {WARMUP_TIMEOUT:g}s")
+        stop_event.set()
+        pool.close()
+        return
+    while not pool.box_queue.empty():
+        pool.box_queue.get_nowait()
+    pool.latencies.clear()
+
+    results = 0
+    start = time.time()
+    while time.time() - start < duration:
+        pool.submit(frame)
+        try:
+            while True:
+                pool.box_queue.get(timeout=1.0 / capture_fps)
+                results += 1
+        except Empty:
+            pass
+    elapsed = time.time() - start
+    stop_event.set()
+    pool.close()
+    report(f"process x{workers}{' pinned' if pin else ''}", results, elapsed, list(pool.latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end FPS and detection latency per backend")
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--capture-fps', type=float, default=30.0)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--pin', action='store_true', help="split the allowed CPUs evenly between workers")
+    args = parser.parse_args()
+
+    frame = load_frame()
+    bench_thread(frame, args.duration, args.capture_fps)
+    for workers in args.workers:
+        bench_process(frame, args.duration, args.capture_fps, workers, args.pin)
+
+
+if __name__ == "__main__":
+    main()
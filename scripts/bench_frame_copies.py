@@ -0,0 +1,242 @@
+import sys
+import os
+import argparse
+import tempfile
+import threading
+import time
+from queue import Queue, Empty
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.memory_buffer import SharedFrameBuffer
+from app.core.frame_pool import FramePool
+from app.core.capture import CAPTURE_READERS, STREAMING
+from app.core.detection_feed import DetectionFeed
+from app.services.video_processor import camera_loop
+from app.core.boxes import BOX_DTYPE
+from app.core.overlay import draw_boxes
+from config.yolo_config import TARGET_CLASSES
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+BENCH_CAMERA = 'bench'
+LEGACY_DETECT_EVERY = 3  # frames per detector submission in the rebuilt pre-pool loop
+
+
+class Counts:
+    def __init__(self):
+        self.allocations = 0
+        self.copies = 0
+        self.bytes_copied = 0
+        self.sites = {}  # where the copies happen -> count
+
+    def copy(self, nbytes, allocated=True, site='other'):
+        self.copies += 1
+        self.bytes_copied += nbytes
+        self.allocations += int(allocated)
+        self.sites[site] = self.sites.get(site, 0) + 1
+
+
+def count_writes(buffer, counts, site):
+    # Every published slot was filled with one full frame (np.copyto, or a resize into the slot)
+    end_write = buffer.end_write
+
+    def counted(*args, **kwargs):
+        counts.copy(buffer.frame_nbytes, allocated=False, site=site)
+        return end_write(*args, **kwargs)
+
+    buffer.end_write = counted
+    return buffer
+
+
+def count_reads(buffer, counts, site):
+    read_latest = buffer.read_latest
+
+    def counted(copy=False):
+        snapshot = read_latest(copy=copy)
+        if copy and snapshot is not None:
+            counts.copy(buffer.frame_nbytes, site=site)
+        return snapshot
+
+    buffer.read_latest = counted
+    return buffer
+
+
+def make_video(path, frames, shape):
+    base = cv2.imread(TEST_FRAME)
+    if base is None:
+        base = np.random.randint(0, 255, shape, dtype=np.uint8)
+    base = cv2.resize(base, (shape[1], shape[0]))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30, (shape[1], shape[0]))
+    for i in range(frames):
+        writer.write(np.roll(base, i * 8, axis=1))
+    writer.release()
+
+
+def sample_boxes(shape):
+    boxes = np.zeros(3, dtype=BOX_DTYPE)
+    h, w = shape[:2]
+    boxes['x1'], boxes['y1'] = [w // 8, w // 3, w // 2], [h // 8, h // 3, h // 2]
+    boxes['x2'], boxes['y2'] = boxes['x1'] + w // 6, boxes['y1'] + h // 6
+    boxes['conf'], boxes['class_id'], boxes['timestamp'] = 0.9, 0, time.time()
+    return boxes
+
+
+def run_legacy(path, shared_buffer, backend, raw_feed, readers, detect_ms):
+    # The pre-pool pipeline, which no longer exists in the tree, so rebuilt here with its copies
+    # counted by hand: fresh decode, .copy() for the detector, draw, copyto shm, copying reads
+    counts = Counts()
+    cap = cv2.VideoCapture(path)
+    boxes = None
+    frames = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        counts.allocations += 1  # decoder output
+        boxes = sample_boxes(frame.shape) if boxes is None else boxes
+        if frames % LEGACY_DETECT_EVERY == 0:
+            detector_frame = frame.copy()
+            counts.copy(frame.nbytes, site='detector')
+            del detector_frame
+        draw_boxes(frame, boxes, TARGET_CLASSES)
+        shared_buffer.write(frame)
+        counts.copy(frame.nbytes, allocated=False, site='shm')
+        for _ in range(readers):
+            shared_buffer.read()
+            counts.copy(frame.nbytes, site='reader')
+        frames += 1
+    cap.release()
+    return frames, counts
+
+
+def stand_in_detector(frame_queue, box_queue, stop_event, release_frame, detect_ms):
+    # detection_worker's queue protocol with a fixed latency instead of a model
+    while not stop_event.is_set():
+        try:
+            frame_id, frame, captured_at = frame_queue.get(timeout=0.1)
+        except Empty:
+            continue
+        time.sleep(detect_ms / 1000.0)
+        box_queue.put((captured_at, sample_boxes(frame.shape)))
+        release_frame(frame)
+
+
+def run_pooled(path, shared_buffer, backend, raw_feed, readers, detect_ms):
+    # The real camera_loop on the clip; copies are counted where they happen: the shared-memory
+    # slot, the DetectionFeed raw buffer, the process pool's input buffers and copying readers
+    counts = Counts()
+    stop_event = threading.Event()
+    pool = FramePool()
+    count_writes(shared_buffer, counts, 'shm')
+    count_reads(shared_buffer, counts, 'reader')
+    detection_feed = None
+    raw_buffer = None
+    if raw_feed:
+        raw_buffer = SharedFrameBuffer(name=f"bench_copies_raw_{os.getpid()}", shape=shared_buffer.shape,
+                                       create=True)
+        detection_feed = DetectionFeed(count_writes(raw_buffer, counts, 'raw feed'))
+
+    frame_queue = Queue(maxsize=1)
+    box_queue = Queue()
+    if backend == 'process':
+        # ProcessDetectionPool.submit() writes the frame into the worker's input ring, then the
+        # worker reads it in place; the stand-in answers from the same ring
+        det_in = SharedFrameBuffer(name=f"bench_copies_det_{os.getpid()}", shape=shared_buffer.shape,
+                                   create=True, slots=2)
+        count_writes(det_in, counts, 'process pool')
+
+        def submit_frame(frame, captured_at):
+            if not frame_queue.empty():
+                return False
+            det_in.write(frame)
+            frame_queue.put((None, det_in.read_latest().frame, captured_at))
+            return True
+
+        def release_frame(frame):
+            pass  # the ring slot is simply overwritten by the next submit
+    else:
+        def submit_frame(frame, captured_at):
+            # As video_processing: the detector shares the pooled frame
+            if not frame_queue.empty():
+                return False
+            pool.retain(frame)
+            frame_queue.put((None, frame, captured_at))
+            return True
+        release_frame = pool.release
+    threading.Thread(target=stand_in_detector, args=(frame_queue, box_queue, stop_event, release_frame, detect_ms),
+                     daemon=True).start()
+
+    # Readers take views of every published frame, as the stream servers do
+    end_write = shared_buffer.end_write
+
+    def publish_and_read(*args, **kwargs):
+        frame_id = end_write(*args, **kwargs)
+        for _ in range(readers):
+            shared_buffer.read_latest()
+        return frame_id
+
+    shared_buffer.end_write = publish_and_read
+
+    def stop_at_end_of_clip():
+        # The reader reconnects (replays the file) at the end; stop once it leaves STREAMING
+        while not stop_event.wait(0.01):
+            reader = CAPTURE_READERS.get(BENCH_CAMERA)
+            if reader is not None and reader.frames and reader.state != STREAMING:
+                stop_event.set()
+
+    watcher = threading.Thread(target=stop_at_end_of_clip, daemon=True)
+    watcher.start()
+    camera_loop(path, shared_buffer, stop_event, submit_frame, box_queue, camera_id=BENCH_CAMERA, pool=pool,
+                detection_feed=detection_feed)
+    stop_event.set()
+    watcher.join()
+
+    frames = counts.sites.get('shm', 0)
+    counts.allocations += pool.stats()['allocations']
+    if backend == 'process':
+        det_in.close()
+    if raw_buffer is not None:
+        raw_buffer.close()
+    return frames, counts
+
+
+def report(name, frames, counts, elapsed, frame_nbytes):
+    print(f"{name:<8}{elapsed / frames * 1000:>9.2f} ms/frame"
+          f"{counts.allocations / frames:>9.2f} allocs/frame"
+          f"{counts.copies / frames:>9.2f} copies/frame"
+          f"{counts.bytes_copied / frames / 1e6:>9.1f} MB copied/frame"
+          f"   (frame = {frame_nbytes / 1e6:.1f} MB, {frames} frames)")
+    print("        " + ", ".join(f"{site} {n / frames:.2f}" for site, n in sorted(counts.sites.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocations and copies, pooled vs pre-pool pipeline")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--shape', type=int, nargs=2, default=[1080, 1920], metavar=('H', 'W'))
+    parser.add_argument('--backend', choices=('thread', 'process'), default='thread',
+                        help="how frames reach the detector in the pooled run")
+    parser.add_argument('--raw-feed', action='store_true', help="also publish clean frames for a DetectionFeed")
+    parser.add_argument('--detect-ms', type=float, default=30.0, help="stand-in detector latency")
+    parser.add_argument('--readers', type=int, default=2, help="shared-memory readers per frame")
+    args = parser.parse_args()
+
+    shape = (args.shape[0], args.shape[1], 3)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.avi')
+        make_video(path, args.frames, shape)
+
+        for name, run in (('legacy', run_legacy), ('pooled', run_pooled)):
+            shared_buffer = SharedFrameBuffer(name=f"bench_copies_{os.getpid()}", shape=shape, create=True)
+            try:
+                started = time.perf_counter()
+                frames, counts = run(path, shared_buffer, args.backend, args.raw_feed, args.readers,
+                                     args.detect_ms)
+                report(name, frames, counts, time.perf_counter() - started, int(np.prod(shape)))
+            finally:
+                shared_buffer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import sys
+import os
+import argparse
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.memory_buffer import SharedFrameBuffer
+from app.core.frame_encoder import FrameEncoder, EncodedFrame
+from app.core.stream_generator import generate_stream
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+
+
+class PerClientEncoder:
+    # The pre-fan-out behaviour: every client encodes the frame it sends itself
+    def __init__(self, shared_buffer):
+        self.shared_buffer = shared_buffer
+        self.frames_encoded = 0
+        self._lock = threading.Lock()
+
+    def latest(self, level=0):
+        snapshot = self.shared_buffer.read_latest(copy=True)
+        if snapshot is None:
+            return None
+        ret, buffer = cv2.imencode('.jpg', snapshot.frame)
+        with self._lock:
+            self.frames_encoded += 1
+        return EncodedFrame(snapshot.frame_id, snapshot.timestamp, buffer.tobytes())
+
+    def wait_next(self, after_frame_id, timeout=None, level=0):
+        if self.shared_buffer.wait_for_frame(after_frame_id, timeout) < 0:
+            return None
+        return self.latest()
+
+
+def load_frame(shape):
+    frame = cv2.imread(TEST_FRAME)
+    if frame is None:
+        frame = np.random.randint(0, 255, shape, dtype=np.uint8)
+    return cv2.resize(frame, (shape[1], shape[0]))
+
+
+def run_case(shared_buffer, encoder_cls, clients, duration, capture_fps, client_fps):
+    stop_event = threading.Event()
+    encoder = encoder_cls(shared_buffer)
+    base = load_frame(shared_buffer.shape)
+    published = [0]
+
+    def writer():
+        interval = 1.0 / capture_fps
+        while not stop_event.is_set():
+            # Shift the image so every frame is genuinely new content for the encoder
+            shared_buffer.write(np.roll(base, published[0] % base.shape[1], axis=1))
+            published[0] += 1
+            time.sleep(interval)
+
+    def client():
+        for _ in generate_stream(encoder, stop_event, fps=client_fps):
+            pass
+
+    threads = [threading.Thread(target=writer, daemon=True)]
+    threads += [threading.Thread(target=client, daemon=True) for _ in range(clients)]
+
+    cpu_start = time.process_time()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop_event.set()
+    for t in threads:
+        t.join(timeout=2)
+    cpu = time.process_time() - cpu_start
+
+    frames = max(published[0], 1)
+    return {
+        'clients': clients,
+        'frames': published[0],
+        'encodes': encoder.frames_encoded,
+        'cpu_ms_per_frame': 1000.0 * cpu / frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU cost of MJPEG fan-out per published frame")
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--capture-fps', type=float, default=30.0)
+    parser.add_argument('--client-fps', type=float, default=30.0)
+    args = parser.parse_args()
+
+    shared_buffer = SharedFrameBuffer(name=f"bench_fanout_{os.getpid()}", shape=(480, 640, 3), create=True)
+    try:
+        print(f"{'mode':<12}{'clients':>8}{'frames':>8}{'encodes':>9}{'cpu ms/frame':>14}")
+        for mode, encoder_cls in (('per-client', PerClientEncoder), ('shared', FrameEncoder)):
+            for clients in args.clients:
+                r = run_case(shared_buffer, encoder_cls, clients, args.duration,
+                             args.capture_fps, args.client_fps)
+                print(f"{mode:<12}{r['clients']:>8}{r['frames']:>8}{r['encodes']:>9}"
+                      f"{r['cpu_ms_per_frame']:>14.2f}")
+    finally:
+        shared_buffer.close()
+
+
+if __name__ == "__main__":
+    main()
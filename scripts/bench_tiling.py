@@ -0,0 +1,113 @@
+import sys
+import os
+import argparse
+import json
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.boxes import match_boxes
+from app.core.model_backend import load_model
+from app.core.tiling import detect, merge_results
+from config.yolo_config import TARGET_CLASSES
+
+MAX_BOXES = 100
+SMALL_AREA = 0.005  # boxes under 0.5% of the frame area count as small objects
+
+
+def read_frames(path, count, stride):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def is_small(boxes, frame_shape):
+    area = (boxes['x2'] - boxes['x1']) * (boxes['y2'] - boxes['y1'])
+    return area < SMALL_AREA * frame_shape[0] * frame_shape[1]
+
+
+def evaluate(name, run, frames, references):
+    latencies = []
+    totals = {'pred': 0, 'ref': 0, 'matched': 0, 'small_ref': 0, 'small_matched': 0}
+    for frame, ref in zip(frames, references):
+        start = time.perf_counter()
+        pred = run(frame)
+        latencies.append(time.perf_counter() - start)
+
+        small = is_small(ref, frame.shape)
+        totals['pred'] += len(pred)
+        totals['ref'] += len(ref)
+        totals['matched'] += len(match_boxes(pred, ref))
+        totals['small_ref'] += int(small.sum())
+        totals['small_matched'] += len(match_boxes(pred, ref[small]))
+
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'mode': name,
+        'latency_ms_mean': float(ms.mean()),
+        'latency_ms_p95': float(np.percentile(ms, 95)),
+        'recall': totals['matched'] / max(totals['ref'], 1),
+        'precision': totals['matched'] / max(totals['pred'], 1),
+        'small_recall': totals['small_matched'] / max(totals['small_ref'], 1),
+        **totals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy/latency of tiled vs full-frame detection on a recorded clip")
+    parser.add_argument('video', help="recorded clip to evaluate on")
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--stride', type=int, default=5, help="use every Nth frame of the clip")
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[320, 480])
+    parser.add_argument('--roi', type=float, nargs=4, default=None, metavar=('X1', 'Y1', 'X2', 'Y2'))
+    parser.add_argument('--reference-imgsz', type=int, default=1280,
+                        help="full-frame inference size used as pseudo ground truth")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    model = load_model()
+    frames = read_frames(args.video, args.frames, args.stride)
+    if not frames:
+        print(f"❌ No frames read from {args.video}")
+        return
+    print(f"🎞️ {len(frames)} frames from {args.video}")
+
+    # No labels for our clips: a high-resolution full-frame pass stands in for ground truth
+    references = []
+    for frame in frames:
+        h, w = frame.shape[:2]
+        results = model(frame, imgsz=args.reference_imgsz, verbose=False)
+        references.append(merge_results(results, [(0, 0, w, h)], TARGET_CLASSES, MAX_BOXES, 0.0))
+
+    detect(model, frames[0], TARGET_CLASSES, MAX_BOXES)  # warm-up
+    runs = [('full-frame', lambda f: detect(model, f, TARGET_CLASSES, MAX_BOXES, roi=args.roi))]
+    for tile_size in args.tile_sizes:
+        runs.append((f'tiled {tile_size}',
+                     lambda f, t=tile_size: detect(model, f, TARGET_CLASSES, MAX_BOXES, roi=args.roi, tile_size=t)))
+
+    report = [evaluate(name, run, frames, references) for name, run in runs]
+
+    print(f"{'mode':<14}{'mean ms':>9}{'p95 ms':>9}{'recall':>8}{'prec':>8}{'small rec':>11}")
+    for r in report:
+        print(f"{r['mode']:<14}{r['latency_ms_mean']:>9.1f}{r['latency_ms_p95']:>9.1f}"
+              f"{r['recall']:>8.2f}{r['precision']:>8.2f}{r['small_recall']:>11.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'video': args.video, 'frames': len(frames), 'results': report}, f, indent=2)
+        print(f"✅ Saved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
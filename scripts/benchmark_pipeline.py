@@ -0,0 +1,254 @@
+import sys
+import os
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.memory_buffer import SharedFrameBuffer
+from app.core.frame_encoder import FrameEncoder
+from app.core.overlay import draw_boxes
+from app.core.tiling import plan_regions, crop_regions, merge_results
+from app.core.stream_generator import generate_stream
+from app.services.video_processor import video_processing
+from app.core.model_backend import load_model, BACKENDS
+from config.yolo_config import MODEL_PATH, MODEL_BACKEND, MODEL_INT8, TARGET_CLASSES
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+STAGES = ['decode', 'inference', 'postprocess', 'draw', 'shm_write', 'jpeg_encode']
+# Log-spaced histogram bucket upper bounds in milliseconds (last bucket is +inf)
+BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000]
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+
+    def time(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.samples[stage].append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def summary(self):
+        report = {}
+        for stage, samples in self.samples.items():
+            if not samples:
+                continue
+            ms = np.asarray(samples)
+            counts = np.histogram(ms, bins=[0] + BUCKETS_MS + [np.inf])[0]
+            report[stage] = {
+                'count': len(ms),
+                'mean_ms': float(ms.mean()),
+                'p50_ms': float(np.percentile(ms, 50)),
+                'p90_ms': float(np.percentile(ms, 90)),
+                'p99_ms': float(np.percentile(ms, 99)),
+                'max_ms': float(ms.max()),
+                'histogram': {'le_ms': BUCKETS_MS + ['inf'], 'counts': counts.tolist()},
+            }
+        return report
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def synthetic_jpegs(count, shape):
+    """JPEG bytes of test_frame.jpg shifted per frame, so decode and encode see real content."""
+    base = cv2.imread(TEST_FRAME)
+    if base is None:
+        base = np.random.randint(0, 255, shape, dtype=np.uint8)
+    base = cv2.resize(base, (shape[1], shape[0]))
+    return [cv2.imencode('.jpg', np.roll(base, i * 4, axis=1))[1].tobytes() for i in range(count)]
+
+
+def frame_source(args, shape):
+    """Yields (decode_fn) callables so the decode itself is timed as a stage."""
+    if args.video:
+        cap = cv2.VideoCapture(args.video)
+        for _ in range(args.frames):
+            yield lambda: cap.read()[1]
+        cap.release()
+    else:
+        jpegs = synthetic_jpegs(min(args.frames, 64), shape)
+        for i in range(args.frames):
+            data = np.frombuffer(jpegs[i % len(jpegs)], dtype=np.uint8)
+            yield lambda data=data: cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+def run_stages(args, model, shape):
+    """Drives the pipeline stages one frame at a time and times each of them."""
+    timer = StageTimer()
+    shared_buffer = SharedFrameBuffer(name=f"bench_pipeline_{os.getpid()}", shape=shape, create=True)
+    encoder = FrameEncoder(shared_buffer)
+    tile_size = args.tile_size or None
+
+    try:
+        frames = 0
+        start = time.perf_counter()
+        for decode in frame_source(args, shape):
+            frame = timer.time('decode', decode)
+            if frame is None:
+                break
+            regions = plan_regions(frame.shape, None, tile_size)
+            results = timer.time('inference', model, crop_regions(frame, regions), verbose=False)
+            boxes = timer.time('postprocess', merge_results, results, regions, TARGET_CLASSES, 5, time.time())
+            timer.time('draw', draw_boxes, frame, boxes, TARGET_CLASSES)
+            timer.time('shm_write', shared_buffer.write, frame)
+            timer.time('jpeg_encode', encoder.latest)
+            frames += 1
+        elapsed = time.perf_counter() - start
+    finally:
+        shared_buffer.close()
+
+    return {'frames': frames, 'fps': frames / max(elapsed, 1e-9), 'stages': timer.summary()}
+
+
+def run_end_to_end(args, shape):
+    """Runs video_processing itself on a file plus simulated stream clients for --duration seconds."""
+    video = args.video
+    tmp = None
+    if video is None:
+        tmp = tempfile.NamedTemporaryFile(suffix='.avi', delete=False)
+        writer = cv2.VideoWriter(tmp.name, cv2.VideoWriter_fourcc(*'MJPG'), 30, (shape[1], shape[0]))
+        for jpeg in synthetic_jpegs(args.frames, shape):
+            writer.write(cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR))
+        writer.release()
+        video = tmp.name
+
+    stop_event = threading.Event()
+    shared_buffer = SharedFrameBuffer(name=f"bench_e2e_{os.getpid()}", shape=shape, create=True)
+    encoder = FrameEncoder(shared_buffer)
+    sent = [0] * args.clients
+
+    def client(i):
+        for _ in generate_stream(encoder, stop_event, fps=args.client_fps):
+            sent[i] += 1
+
+    try:
+        threading.Thread(target=video_processing, args=(shared_buffer, stop_event),
+                         kwargs={'source': video}, daemon=True).start()
+        for i in range(args.clients):
+            threading.Thread(target=client, args=(i,), daemon=True).start()
+
+        # The clock starts at the first published frame so model loading is not counted
+        while shared_buffer.latest_frame_id() < 0:
+            time.sleep(0.01)
+        first_id, start = shared_buffer.latest_frame_id(), time.perf_counter()
+        time.sleep(args.duration)
+        published = shared_buffer.latest_frame_id() - first_id
+        elapsed = time.perf_counter() - start
+        stop_event.set()
+        time.sleep(0.5)
+    finally:
+        shared_buffer.close()
+        if tmp is not None:
+            os.unlink(tmp.name)
+
+    return {
+        'frames': published,
+        'fps': published / elapsed,
+        'clients': args.clients,
+        'client_fps': [n / elapsed for n in sent],
+        'jpeg_encodes': encoder.frames_encoded,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(__file__), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path, tolerance):
+    """Prints per-stage deltas against a saved run; returns True if anything regressed."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    regressed = False
+    print(f"\n📊 Compared with {baseline_path} (revision {baseline['meta'].get('revision')})")
+    for stage, stats in current['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if not old:
+            continue
+        delta = stats['p50_ms'] / max(old['p50_ms'], 1e-9) - 1.0
+        flag = '❌' if delta > tolerance else '  '
+        regressed |= delta > tolerance
+        print(f"{flag} {stage:<12} p50 {old['p50_ms']:8.2f} -> {stats['p50_ms']:8.2f} ms ({delta:+.0%})")
+
+    fps_delta = current['fps'] / max(baseline['fps'], 1e-9) - 1.0
+    regressed |= fps_delta < -tolerance
+    print(f"{'❌' if fps_delta < -tolerance else '  '} {'fps':<12}     {baseline['fps']:8.1f} -> {current['fps']:8.1f}    ({fps_delta:+.0%})")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of capture -> detect -> draw -> encode")
+    parser.add_argument('--video', help="local video file (default: synthetic frames from test_frame.jpg)")
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--shape', type=int, nargs=2, default=[480, 640], metavar=('H', 'W'))
+    parser.add_argument('--backend', choices=BACKENDS, default=MODEL_BACKEND)
+    parser.add_argument('--int8', action='store_true', default=MODEL_INT8)
+    parser.add_argument('--tile-size', type=int, default=0, help="benchmark tiled inference with this tile size")
+    parser.add_argument('--end-to-end', action='store_true', help="also run video_processing with stream clients")
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--client-fps', type=float, default=10.0)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help="baseline JSON from an earlier run")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    shape = (args.shape[0], args.shape[1], 3)
+    model = load_model(args.backend, int8=args.int8)
+    model(np.zeros(shape, dtype=np.uint8), verbose=False)  # warm-up
+
+    print(f"⏱️ Timing stages over {args.frames} frames...")
+    report = run_stages(args, model, shape)
+    if args.end_to_end:
+        print(f"🎬 Running video_processing end to end for {args.duration:g}s...")
+        report['end_to_end'] = run_end_to_end(args, shape)
+
+    report['peak_rss_mb'] = peak_rss_mb()
+    report['meta'] = {
+        'revision': git_revision(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'source': args.video or 'synthetic',
+        'shape': list(shape),
+        'tile_size': args.tile_size,
+        'model': MODEL_PATH,
+        'backend': args.backend + ('-int8' if args.int8 else ''),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+    print(f"\n{'stage':<12}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}  (ms)")
+    for stage, s in report['stages'].items():
+        print(f"{stage:<12}{s['mean_ms']:>9.2f}{s['p50_ms']:>9.2f}{s['p90_ms']:>9.2f}{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+    print(f"\nsustained FPS: {report['fps']:.1f}   peak RSS: {report['peak_rss_mb']:.0f} MB")
+    if 'end_to_end' in report:
+        e2e = report['end_to_end']
+        print(f"end-to-end FPS: {e2e['fps']:.1f} with {e2e['clients']} clients, {e2e['jpeg_encodes']} JPEG encodes")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Saved results to {args.output}")
+
+    if args.compare and compare(report, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import sys
+import os
+import argparse
+import glob
+import json
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+import numpy as np
+from app.core.boxes import extract_boxes, match_boxes
+from app.core.model_backend import load_model, BACKENDS
+from config.yolo_config import TARGET_CLASSES
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+MAX_BOXES = 100
+
+
+def load_images(directory):
+    paths = [TEST_FRAME]
+    if directory:
+        for pattern in ('*.jpg', '*.jpeg', '*.png'):
+            paths.extend(sorted(glob.glob(os.path.join(directory, pattern))))
+    images = [(path, cv2.imread(path)) for path in paths]
+    return [(path, image) for path, image in images if image is not None]
+
+
+def run(model, images):
+    model(images[0][1], verbose=False)  # warm-up
+    boxes, latencies = [], []
+    for _, image in images:
+        start = time.perf_counter()
+        results = model(image, verbose=False)
+        latencies.append(time.perf_counter() - start)
+        boxes.append(extract_boxes(results[0], TARGET_CLASSES, MAX_BOXES, 0.0))
+    return boxes, latencies
+
+
+def compare(name, pred_boxes, ref_boxes, latencies):
+    totals = {'pred': 0, 'ref': 0, 'matched': 0}
+    ious, conf_deltas = [], []
+    for pred, ref in zip(pred_boxes, ref_boxes):
+        matches = match_boxes(pred, ref)
+        totals['pred'] += len(pred)
+        totals['ref'] += len(ref)
+        totals['matched'] += len(matches)
+        for p, r, iou in matches:
+            ious.append(iou)
+            conf_deltas.append(abs(float(pred['conf'][p]) - float(ref['conf'][r])))
+
+    ms = np.asarray(latencies) * 1000.0
+    return {
+        'backend': name,
+        'latency_ms_mean': float(ms.mean()),
+        'recall': totals['matched'] / max(totals['ref'], 1),
+        'precision': totals['matched'] / max(totals['pred'], 1),
+        'mean_iou': float(np.mean(ious)) if ious else 0.0,
+        'max_conf_delta': float(np.max(conf_deltas)) if conf_deltas else 0.0,
+        **totals,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check exported backends against the .pt model on reference images")
+    parser.add_argument('--images', help="directory of extra reference images (test_frame.jpg is always used)")
+    parser.add_argument('--backends', nargs='+', default=['onnx', 'openvino'],
+                        choices=[b for b in BACKENDS if b != 'torch'])
+    parser.add_argument('--int8', action='store_true', help="also check the INT8 variant of each backend")
+    parser.add_argument('--min-recall', type=float, default=0.9,
+                        help="fail if a backend finds fewer of the .pt model's boxes than this")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    print(f"🖼️ {len(images)} reference images")
+
+    ref_boxes, ref_latencies = run(load_model('torch'), images)
+    report = [compare('torch', ref_boxes, ref_boxes, ref_latencies)]
+
+    variants = [(b, False) for b in args.backends]
+    if args.int8:
+        variants += [(b, True) for b in args.backends]
+    for backend, int8 in variants:
+        boxes, latencies = run(load_model(backend, int8=int8), images)
+        report.append(compare(backend + ('-int8' if int8 else ''), boxes, ref_boxes, latencies))
+
+    print(f"{'backend':<16}{'mean ms':>9}{'recall':>8}{'prec':>8}{'IoU':>7}{'Δconf':>8}")
+    failed = False
+    for r in report:
+        ok = r['recall'] >= args.min_recall
+        failed |= not ok
+        print(f"{'  ' if ok else '❌'}{r['backend']:<14}{r['latency_ms_mean']:>9.1f}{r['recall']:>8.2f}"
+              f"{r['precision']:>8.2f}{r['mean_iou']:>7.2f}{r['max_conf_delta']:>8.3f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'images': [path for path, _ in images], 'results': report}, f, indent=2)
+        print(f"✅ Saved results to {args.json}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,107 @@
-import matplotlib
-matplotlib.use('TkAgg')
+import sys
+import os
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import torch
-import matplotlib.pyplot as plt
 import numpy as np
 import time
-import tkinter
 import traceback
-from ultralytics import YOLO
-import os
-
-def load_throttle_delay(default=5.0):
-    try:
-        throttle_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.throttle'))
-        if os.path.exists(throttle_path):
-            with open(throttle_path, 'r') as f:
-                return float(f.read().strip())
-    except Exception as e:
-        print(f"⚠️ Failed to read throttle file: {e}")
-        traceback.print_exc()
-    return default
-
-def inspect_weights():
-    print("📦 Weights viewer running... Press Ctrl+C to close.")
-    model = YOLO('yolov8n.pt')  # Optional: make this a config var
-    state_dict = model.model.state_dict()
-    conv_weights = {k: v for k, v in state_dict.items() if "conv" in k and "weight" in k}
-
-    fig = plt.figure(figsize=(16, 3))
-    plt.ion()
-    fig.show()
+from app.core.weight_atlas import get_atlas, layer_page
+from app.core.control_block import attach_control, current_settings
 
-    try:
-        while True:
-            delay = load_throttle_delay()
-            for name, weights in conv_weights.items():
-                try:
-                    weight_tensor = weights.detach().cpu().numpy()
-                    if weight_tensor.ndim != 4:
-                        continue
+def fetch_conv_weights():
+    # Only on an atlas cache miss: weights come from the model server's copy of the PyTorch state_dict
+    from app.core.model_server import connect
+    return connect().weights('conv')
 
-                    num_filters = min(weight_tensor.shape[0], 8)
-                    input_channels = min(weight_tensor.shape[1], 1)
+def export_png(atlas, index, path, scale):
+    import cv2
+    image = np.asarray(atlas)
+    if scale > 1:
+        image = np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
+    cv2.imwrite(path, image)
+    print(f"🖼️ Atlas of {len(index)} layers ({atlas.shape[1]}x{atlas.shape[0]} px) written to {path}")
 
-                    fig.clf()
-                    for i in range(num_filters):
-                        kernel = weight_tensor[i, 0] if input_channels > 0 else weight_tensor[i]
-                        kernel -= kernel.min()
-                        kernel /= kernel.max() + 1e-5
+def inspect_weights(atlas, index, start=0):
+    import matplotlib
+    matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+    import tkinter
 
-                        ax = fig.add_subplot(1, num_filters, i + 1)
-                        ax.imshow(kernel, cmap='gray')
-                        ax.axis('off')
-                        ax.set_title(f'{name.split(".")[0]}\nF{i}')
+    print("📦 Weights viewer running... ←/→ to page, Ctrl+C to close.")
+    # One figure and one image for the whole session; paging only swaps the pixels
+    fig, ax = plt.subplots(figsize=(16, 6))
+    ax.axis('off')
+    image = ax.imshow(layer_page(atlas, index[start]), cmap='gray', vmin=0, vmax=255,
+                      interpolation='nearest', aspect='auto')
+    page = [start]
 
-                    fig.suptitle(f"Conv Weights - {name}")
-                    fig.tight_layout()
-                    fig.canvas.draw()
-                    fig.canvas.flush_events()
+    def show(i):
+        page[0] = i % len(index)
+        record = index[page[0]]
+        data = layer_page(atlas, record)
+        image.set_data(data)
+        image.set_extent((-0.5, data.shape[1] - 0.5, data.shape[0] - 0.5, -0.5))
+        ax.set_xlim(-0.5, data.shape[1] - 0.5)
+        ax.set_ylim(data.shape[0] - 0.5, -0.5)
+        out_channels, in_channels, kh, kw = record['shape']
+        ax.set_title(f"Conv Weights - {record['name']}  [{out_channels} filters x {in_channels} inputs, "
+                     f"{kh}x{kw}]  ({page[0] + 1}/{len(index)})")
+        fig.canvas.draw_idle()
 
-                    time.sleep(delay)
+    def on_key(event):
+        if event.key in ('right', 'down', ' '):
+            show(page[0] + 1)
+        elif event.key in ('left', 'up'):
+            show(page[0] - 1)
 
-                except (tkinter.TclError, RuntimeError) as e:
-                    print(f"❌ Error in weights viewer loop: {e}")
-                    traceback.print_exc()
-                    plt.close('all')
-                    return
+    fig.canvas.mpl_connect('key_press_event', on_key)
+    plt.ion()
+    show(start)
+    fig.show()
 
+    # Paging speed is start.py's 'speed' setting; without a running pipeline, the default
+    control = attach_control()
+    try:
+        while True:
+            shown = page[0]
+            shown_at = time.time()
+            # A new speed applies to the page already on screen
+            while time.time() < shown_at + current_settings(control).viewer_delay:
+                fig.canvas.flush_events()
+                time.sleep(0.05)
+            if page[0] == shown:  # not paged by hand meanwhile
+                show(page[0] + 1)
+    except (tkinter.TclError, RuntimeError) as e:
+        print(f"❌ Error in weights viewer loop: {e}")
+        plt.close('all')
     except KeyboardInterrupt:
         print("🛑 Weights viewer closed.")
     except Exception as e:
         print(f"❌ Fatal error in weights viewer: {e}")
         traceback.print_exc()
 
+def main():
+    parser = argparse.ArgumentParser(description="Page through every conv kernel of the model from a cached atlas")
+    parser.add_argument('--export', metavar='PNG', help="write the whole atlas to a PNG and exit (no display needed)")
+    parser.add_argument('--scale', type=int, default=4, help="pixels per weight in the exported PNG")
+    parser.add_argument('--layer', help="start at the first layer whose name contains this")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the atlas even if it is cached")
+    args = parser.parse_args()
+
+    started = time.time()
+    atlas, index = get_atlas(fetch_conv_weights, rebuild=args.rebuild)
+    print(f"🗂️ Atlas ready: {len(index)} layers, {atlas.nbytes / 1e6:.1f} MB ({time.time() - started:.2f}s)")
+    if not index:
+        print("❌ No 4-D conv weights found")
+        return
+
+    if args.export:
+        export_png(atlas, index, args.export, args.scale)
+        return
+    start = next((i for i, r in enumerate(index) if args.layer and args.layer in r['name']), 0)
+    inspect_weights(atlas, index, start)
+
 if __name__ == "__main__":
-    inspect_weights()
+    main()
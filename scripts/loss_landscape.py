@@ -1,45 +1,133 @@
-import matplotlib
-matplotlib.use('TkAgg')
+import sys
+import os
+import glob
+import argparse
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import matplotlib.pyplot as plt
 import numpy as np
 import time
-import os
-import tkinter
+from app.core.loss_landscape import (
+    IMGSZ, grid_points, cache_dir, CellCache, init_worker, evaluate_cells
+)
+from config.yolo_config import MODEL_PATH
+
+TEST_FRAME = os.path.abspath(os.path.join(os.path.dirname(__file__), '../test_frame.jpg'))
+REDRAW_INTERVAL = 1.0  # at most one redraw per second, and only when cells arrived
+
+def image_set(paths):
+    # Files, directories of images, or the bundled test frame
+    found = []
+    for path in paths or [TEST_FRAME]:
+        if os.path.isdir(path):
+            found += sorted(p for ext in ('jpg', 'jpeg', 'png') for p in glob.glob(os.path.join(path, f'*.{ext}')))
+        else:
+            found.append(path)
+    return found
 
-def plot_loss_landscape():
-    print("⛰️ Loss landscape window running... Press Ctrl+C to close.")
+def draw(fig, ax, cache, levels, span, title):
+    # Surface of the finest complete level, plus the cells of the level being refined
+    ax.clear()
+    complete = None
+    for level in range(levels, -1, -1):
+        complete = cache.surface(level, span)
+        if complete is not None:
+            break
+    if complete is not None:
+        a, b, z = complete
+        X, Y = np.meshgrid(a, b)
+        ax.plot_surface(X, Y, z, cmap='viridis', alpha=0.9)
+    if cache.cells:
+        points = np.array([(a, b, loss) for (a, b), loss in cache.cells.items()])
+        ax.scatter(points[:, 0], points[:, 1], points[:, 2], s=4, c='k')
+    ax.set_xlabel('α (direction 1)')
+    ax.set_ylabel('β (direction 2)')
+    ax.set_zlabel('detection loss')
+    ax.set_title(title)
+
+def plot_loss_landscape(args):
+    import matplotlib
+    if not args.headless:
+        matplotlib.use('TkAgg')
+    import matplotlib.pyplot as plt
+
+    images = image_set(args.images)
+    cache = CellCache(cache_dir(images, args.seed, args.span, args.imgsz),
+                      {'model': MODEL_PATH, 'images': images, 'seed': args.seed, 'span': args.span,
+                       'imgsz': args.imgsz})
+    print(f"⛰️ Loss landscape over {len(images)} images, {len(cache.cells)} cells cached in {cache.path}")
 
     fig = plt.figure()
     ax = fig.add_subplot(111, projection='3d')
-    plt.ion()
-    fig.show()
+    if not args.headless:
+        plt.ion()
+        fig.show()
+    output_path = os.path.join(os.getcwd(), "loss_landscape.png")
+
+    def redraw():
+        total = (2 ** args.levels + 1) ** 2
+        draw(fig, ax, cache, args.levels, args.span, f"Detection Loss Landscape ({len(cache.cells)}/{total} cells)")
+        fig.savefig(output_path)
+        if not args.headless:
+            fig.canvas.draw()
+            fig.canvas.flush_events()
 
+    redraw()
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    executor = ProcessPoolExecutor(max_workers=args.workers, mp_context=mp.get_context('spawn'),
+                                   initializer=init_worker,
+                                   initargs=(MODEL_PATH, args.seed, images, args.imgsz, threads))
     try:
-        while True:
-            try:
-                x = np.linspace(-2, 2, 100)
-                y = np.linspace(-2, 2, 100)
-                X, Y = np.meshgrid(x, y)
-                Z = np.log(1 + X**2 + Y**2)
-
-                ax.clear()
-                ax.plot_surface(X, Y, Z, cmap='viridis')
-                ax.set_title("Synthetic Saddle Loss Landscape")
-
-                output_path = os.path.join(os.getcwd(), "loss_landscape.png")
-                fig.savefig(output_path)
-                print(f"✅ Saved loss landscape to {output_path}")
-
-                fig.canvas.draw()
+        # Coarse to fine: every level only evaluates the cells the previous ones did not
+        for level in range(args.levels + 1):
+            missing = cache.missing(grid_points(level, args.span))
+            if not missing:
+                continue
+            print(f"🔎 Level {level}: {len(missing)} new cells")
+            pending = {executor.submit(evaluate_cells, missing[i:i + args.chunk])
+                       for i in range(0, len(missing), args.chunk)}
+            arrived, last_draw = False, 0.0
+            while pending:
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cache.add(future.result())
+                    arrived = True
+                if arrived and time.time() - last_draw >= REDRAW_INTERVAL:
+                    redraw()
+                    arrived, last_draw = False, time.time()
+                elif not args.headless:
+                    fig.canvas.flush_events()
+            redraw()
+            print(f"✅ Level {level} complete, saved loss landscape to {output_path}")
+
+        if not args.headless:
+            print("🖼️ Landscape complete, close the window or press Ctrl+C to exit.")
+            while plt.fignum_exists(fig.number):
                 fig.canvas.flush_events()
-                time.sleep(5)
-            except (tkinter.TclError, RuntimeError) as e:
-                print(f"❌ Error in loss landscape loop: {e}")
-                plt.close('all')
-                return
+                time.sleep(0.1)
     except KeyboardInterrupt:
-        print("🛑 Loss landscape viewer closed.")
+        print("🛑 Loss landscape stopped, finished cells are cached for the next run.")
+    except Exception as e:
+        print(f"❌ Error in loss landscape loop: {e}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        cache.close()
+        plt.close('all')
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Detection loss of the YOLO model along two filter-normalised random directions")
+    parser.add_argument('--images', nargs='+', help="image files or directories (default: test_frame.jpg)")
+    parser.add_argument('--levels', type=int, default=4, help="refine up to a (2^levels + 1)^2 grid")
+    parser.add_argument('--span', type=float, default=1.0, help="grid covers [-span, span] along both directions")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the random directions")
+    parser.add_argument('--imgsz', type=int, default=IMGSZ)
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 1) // 2)))
+    parser.add_argument('--chunk', type=int, default=4, help="grid cells per task")
+    parser.add_argument('--headless', action='store_true', help="only write loss_landscape.png")
+    plot_loss_landscape(parser.parse_args())
 
 if __name__ == "__main__":
-    plot_loss_landscape()
+    main()
@@ -0,0 +1,73 @@
+import sys
+import os
+import argparse
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cv2
+from app.core.activations import DEFAULT_SPEC, ActivationRecorder
+from app.core.model_backend import load_model
+from app.core.model_server import HostedModel
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Record reduced activations over a video into memory-mapped .npy files (see load_recording)")
+    parser.add_argument('video')
+    parser.add_argument('output', help="directory for <layer>.npy and index.json")
+    parser.add_argument('--layers', nargs='+', help="qualified layer names or patterns, e.g. 'model.2.*'")
+    parser.add_argument('--channels', type=int, default=None, help="first N channels (default: all)")
+    parser.add_argument('--mode', choices=['summary', 'map'], default='summary',
+                        help="per-channel mean/std/max, or downsampled maps")
+    parser.add_argument('--size', type=int, default=DEFAULT_SPEC.size, help="longest map side in map mode")
+    parser.add_argument('--dtype', choices=['float16', 'float32', 'uint8'], default='float16')
+    parser.add_argument('--stride', type=int, default=1, help="record every Nth frame")
+    parser.add_argument('--max-frames', type=int, default=10000)
+    args = parser.parse_args()
+
+    spec = DEFAULT_SPEC._replace(
+        layers=tuple(args.layers) if args.layers else DEFAULT_SPEC.layers,
+        channels=args.channels,
+        size=args.size,
+        dtype=args.dtype,
+        mode=args.mode,
+    )
+
+    cap = cv2.VideoCapture(args.video)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or args.max_frames * args.stride
+    capacity = min(args.max_frames, (total + args.stride - 1) // args.stride)
+    model = HostedModel(load_model('torch'), spec)
+    recorder = ActivationRecorder(args.output, spec, capacity)
+
+    print(f"🎞️ Recording {spec.mode} activations of up to {capacity} frames from {args.video}")
+    started = time.time()
+    index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % args.stride == 0:
+                model.want_activations()
+                model(frame, verbose=False)
+                recorded = model.last_activations()
+                if recorded is None:
+                    print("❌ No layers matched the spec")
+                    break
+                if not recorder.append(recorded[1], index, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0):
+                    break
+                if len(recorder.frames) % 100 == 0:
+                    print(f"⏺️ {len(recorder.frames)} frames ({len(recorder.frames) / (time.time() - started):.1f}/s)")
+            index += 1
+    except KeyboardInterrupt:
+        print("🛑 Stopped early, keeping what was recorded")
+    finally:
+        cap.release()
+        recorder.close()
+
+    print(f"✅ {len(recorder.frames)} frames of {len(recorder.layers)} layers saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
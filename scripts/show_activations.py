@@ -5,52 +5,19 @@ matplotlib.use('TkAgg')
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-import torch
 import matplotlib.pyplot as plt
-import numpy as np
-from ultralytics import YOLO
-import cv2
 import time
 import tkinter
 import traceback
 import matplotlib.patches as patches
 from app.core.memory_buffer import SharedFrameBuffer
-
-def get_activations(model, input_tensor, layer_names=None):
-    activations = {}
-    def hook_fn(module, input, output):
-        layer_name = module._get_name()
-        if (layer_names is None) or (layer_name in layer_names):
-            activations[layer_name] = output.detach().cpu().numpy()
-
-    hooks = []
-    for name, module in model.model.named_modules():
-        if layer_names is None or module.__class__.__name__ in layer_names:
-            hooks.append(module.register_forward_hook(hook_fn))
-
-    model.eval()
-    with torch.no_grad():
-        model(input_tensor)
-
-    for h in hooks:
-        h.remove()
-    return activations
-
-def load_throttle_delay(default=5.0):
-    try:
-        throttle_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../.throttle'))
-        if os.path.exists(throttle_path):
-            with open(throttle_path, 'r') as f:
-                return float(f.read().strip())
-    except Exception as e:
-        print(f"⚠️ Failed to read throttle file: {e}")
-        traceback.print_exc()
-    return default
+from app.core.model_server import connect
+from app.core.control_block import attach_control, current_settings
 
 def visualize_activations(activations, max_channels=8, fig=None, delay=5.0):
     try:
         for layer_name, activation in activations.items():
-            batch_act = activation[0]
+            batch_act = activation
             if batch_act.ndim != 3:
                 continue
 
@@ -92,8 +59,11 @@ def visualize_activations(activations, max_channels=8, fig=None, delay=5.0):
         raise SystemExit()
 
 def main_loop():
-    model = YOLO('yolov8n.pt')
     shared_buffer = SharedFrameBuffer(name="frame_buffer", shape=(480, 640, 3), create=False)
+    # Activations come from the detector's own forward passes via the model server
+    model = connect(shared_buffer)
+    # Update speed is start.py's 'speed' setting, read from the shared control block
+    control = attach_control()
 
     print("🎯 Activations viewer running... Press Ctrl+C to stop.")
     fig = plt.figure(figsize=(16, 3))
@@ -101,14 +71,14 @@ def main_loop():
     fig.show()
 
     while True:
-        delay = load_throttle_delay()
-        frame = shared_buffer.read()
-        img_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        img_resized = cv2.resize(img_rgb, (640, 640))
-        input_tensor = torch.from_numpy(img_resized).permute(2, 0, 1).unsqueeze(0).float() / 255.0
-
-        layers_to_hook = ['Conv', 'Conv2d']
-        activations = get_activations(model, input_tensor, layer_names=layers_to_hook)
+        delay = current_settings(control).viewer_delay
+        try:
+            frame_id, activations = model.activations()
+        except (RuntimeError, LookupError) as e:
+            print(f"⏳ No activations yet: {e}")
+            time.sleep(1)
+            continue
+        print(f"🖼️ Activations of frame {frame_id}")
         visualize_activations(activations, max_channels=8, fig=fig, delay=delay)
 
 if __name__ == "__main__":